@@ -0,0 +1,389 @@
+# benchmarks/concurrency.py
+# Mixed read/write load against gunicorn, per database mode and server. Clients
+# submit dreams and load the user dashboard and the admin dashboard aggregations.
+# Submitted dreams are queued for `run_analysis_worker`, which writes analysis
+# results back, so the database sees concurrent readers and writers; with
+# --analysis inline the web workers analyze them in the request instead.
+#
+#   python benchmarks/concurrency.py                                  # both SQLite modes
+#   python benchmarks/concurrency.py --modes sqlite-wal postgres --duration 30 --json
+#   python benchmarks/concurrency.py --modes sqlite-wal --servers sync asgi \
+#       --analysis inline --standin-size small --clients 64
+#
+# Modes:
+#   sqlite-default  SQLite with its default rollback journal (DREAM_SQLITE_TUNING=0)
+#   sqlite-wal      WAL, busy_timeout, mmap and IMMEDIATE transactions (the default)
+#   postgres        DREAM_DB_ENGINE=postgres with persistent connections, using the
+#                   DREAM_DB_* connection variables from the environment; the run uses a
+#                   throwaway "<DREAM_DB_NAME>_bench" database (needs psycopg)
+#   postgres-pool   the same with DREAM_DB_POOL=1 (needs psycopg[pool])
+#
+# Servers (gunicorn.conf.py):
+#   sync  the Dockerfile setup: sync WSGI workers, one request at a time each
+#   asgi  DREAM_ASGI=1: uvicorn workers running the async views, with inference
+#         coalesced across requests on a bounded thread pool
+# --inference-server moves the models into `run_inference_server` (on a Unix
+# socket) for either server.
+#
+# Each run gets a fresh database seeded with --seed-dreams analyzed dreams.
+# Analysis uses the stand-in models (benchmarks/standin_models.py, tiny by
+# default, so with the worker the load is on the database rather than the models).
+
+import argparse
+import http.client
+import json
+import os
+import random
+import secrets
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlencode
+
+ROOT = Path(__file__).resolve().parent.parent
+MODES = {
+    "sqlite-default": {"DREAM_DB_ENGINE": "sqlite", "DREAM_SQLITE_TUNING": "0"},
+    "sqlite-wal": {"DREAM_DB_ENGINE": "sqlite", "DREAM_SQLITE_TUNING": "1"},
+    "postgres": {"DREAM_DB_ENGINE": "postgres", "DREAM_DB_POOL": "0"},
+    "postgres-pool": {"DREAM_DB_ENGINE": "postgres", "DREAM_DB_POOL": "1"},
+}
+SERVERS = {"sync": {"DREAM_ASGI": "0"}, "asgi": {"DREAM_ASGI": "1"}}
+OPERATIONS = ("submit", "dashboard", "admin_dashboard")
+
+
+# --- Setup (runs in a subprocess with the mode's settings) ---
+def setup_database(users, dreams, seed):
+    """Migrates and seeds the configured database; prints the session keys and URLs as JSON."""
+    import django
+    django.setup()
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.core.management import call_command
+    from django.urls import reverse
+    from dreams import rollups
+    from dreams.models import UserDreamStats
+    from suite import seed_dreams
+
+    call_command("migrate", verbosity=0)
+    User.objects.bulk_create([User(username=f"bench-concurrency-{i}") for i in range(users)])
+    user_ids = list(User.objects.filter(username__startswith="bench-concurrency-").values_list("id", flat=True))
+    seed_dreams(dreams, user_ids, random.Random(seed))
+    UserDreamStats.rebuild()
+    rollups.rebuild()
+
+    def session_for(user):
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    admin = User.objects.create_superuser("bench-concurrency-admin", "admin@example.com", None)
+    print(json.dumps({
+        "sessions": [session_for(user) for user in User.objects.filter(id__in=user_ids)],
+        "admin_session": session_for(admin),
+        "urls": {
+            "submit": reverse("dreams:add_dream"),
+            "dashboard": reverse("dreams:dashboard"),
+            "admin_dashboard": reverse("admin:dreams_dreamnarration_dashboard"),
+        },
+    }))
+
+
+def _create_postgres_database(env, drop=False):
+    """Creates (or drops) the throwaway benchmark database next to DREAM_DB_NAME."""
+    code = (
+        "import django, os; django.setup()\n"
+        "from django.db import connection\n"
+        "name = os.environ['DREAM_DB_NAME']\n"
+        "with connection._nodb_cursor() as cursor:\n"
+        "    cursor.execute(f'DROP DATABASE IF EXISTS \"{name}\"')\n"
+        + ("" if drop else "    cursor.execute(f'CREATE DATABASE \"{name}\"')\n")
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+
+
+# --- Load ---
+def _client(port, urls, session, admin_session, weights, deadline, seed, samples, lock):
+    rng = random.Random(seed)
+    csrf = secrets.token_hex(16)  # 32 characters, accepted as an unmasked CSRF secret
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    while time.monotonic() < deadline:
+        operation = rng.choices(OPERATIONS, weights)[0]
+        cookie = f"sessionid={admin_session if operation == 'admin_dashboard' else session}; csrftoken={csrf}"
+        headers = {"Cookie": cookie}
+        body = None
+        method = "GET"
+        if operation == "submit":
+            method = "POST"
+            words = " ".join(rng.choice(("dark", "house", "water", "flying", "late", "door", "forest")) for _ in range(60))
+            body = urlencode({"dream_text": words, "csrfmiddlewaretoken": csrf})
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+        started = time.perf_counter()
+        try:
+            conn.request(method, urls[operation], body, headers)
+            response = conn.getresponse()
+            payload = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            status, payload = 0, str(e).encode()
+        elapsed = time.perf_counter() - started
+        ok = status in (200, 302)
+        with lock:
+            samples.append((operation, elapsed, ok, b"database is locked" in payload))
+    conn.close()
+
+
+def _summary(samples, wall):
+    def ms(values, q):
+        return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 1) if values else None
+
+    report = {"requests": len(samples), "throughput_rps": round(len(samples) / wall, 1)}
+    for operation in OPERATIONS:
+        done = sorted(elapsed for op, elapsed, ok, _ in samples if op == operation and ok)
+        report[operation] = {
+            "ok": len(done),
+            "errors": sum(1 for op, _, ok, _ in samples if op == operation and not ok),
+            "locked": sum(1 for op, _, _, locked in samples if op == operation and locked),
+            "p50_ms": ms(done, 0.50),
+            "p95_ms": ms(done, 0.95),
+        }
+    return report
+
+
+def _wait_until_serving(port, proc, log, timeout):
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        if proc.poll() is not None:
+            log.seek(0)
+            raise RuntimeError(f"gunicorn exited:\n{log.read()[-2000:]}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            conn.request("GET", "/accounts/login/")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"gunicorn not serving after {timeout}s")
+
+
+def _warm_worker(port, urls, session, worker, log, timeout):
+    """Submits one dream and waits for the worker to analyze it (it loads the models on its first batch)."""
+    csrf = secrets.token_hex(16)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    conn.request(
+        "POST", urls["submit"], urlencode({"dream_text": "A warm-up dream about a door.", "csrfmiddlewaretoken": csrf}),
+        {"Cookie": f"sessionid={session}; csrftoken={csrf}", "Content-Type": "application/x-www-form-urlencoded"},
+    )
+    conn.getresponse().read()
+    conn.close()
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        log.seek(0)
+        output = log.read()
+        if "Processed batch" in output:
+            return len(output)
+        if worker.poll() is not None:
+            raise RuntimeError(f"analysis worker exited:\n{output[-2000:]}")
+        time.sleep(0.2)
+    raise RuntimeError(f"analysis worker idle after {timeout}s")
+
+
+def _wait_for_line(proc, log, text, timeout, count=1):
+    """Waits until `text` appears `count` times in a process's log."""
+    started = time.monotonic()
+    while time.monotonic() - started < timeout:
+        log.seek(0)
+        output = log.read()
+        if output.count(text) >= count:
+            return
+        if proc.poll() is not None:
+            raise RuntimeError(f"{proc.args[2]} exited:\n{output[-2000:]}")
+        time.sleep(0.2)
+    raise RuntimeError(f"no {text!r} from {proc.args[2]} after {timeout}s")
+
+
+def _stop(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def run_mode(mode, server_name, args, models_dir):
+    inline = args.analysis == "inline"
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            **MODES[mode],
+            **SERVERS[server_name],
+            "DJANGO_SETTINGS_MODULE": "dream_analyzer.settings",
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), str(ROOT / "benchmarks"), os.environ.get("PYTHONPATH")])),
+            "DREAM_AI_MODELS_DIR": str(models_dir),
+            "DREAM_INFERENCE_BACKEND": "torch",
+            "DREAM_INFERENCE_SERVER": f"unix://{tmp}/inference.sock" if args.inference_server else "",
+            "DREAM_ANALYSIS_ASYNC": "0" if inline else "1",
+            "DREAM_ANALYSIS_CACHE_DIR": str(Path(tmp) / "cache"),
+            # Web workers only need the models when they analyze in the request
+            "DREAM_WARMUP": "1" if inline else "0",
+            "DREAM_PRELOAD_MODELS": "0",
+            "GUNICORN_WORKERS": str(args.workers),
+            "GUNICORN_BIND": f"127.0.0.1:{args.port}",
+        }
+        if mode.startswith("sqlite"):
+            env["DREAM_DB_NAME"] = str(Path(tmp) / "db.sqlite3")
+        else:
+            env["DREAM_DB_NAME"] = f"{os.environ.get('DREAM_DB_NAME', 'dream_analyzer')}_bench"
+            _create_postgres_database(env)
+
+        try:
+            setup = subprocess.run(
+                [sys.executable, str(Path(__file__).resolve()), "--setup", "--users", str(args.users),
+                 "--seed-dreams", str(args.seed_dreams), "--seed", str(args.seed)],
+                cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+            )
+            fixtures = json.loads(setup.stdout.strip().splitlines()[-1])
+
+            with open(Path(tmp) / "gunicorn.log", "w+") as server_log, open(Path(tmp) / "worker.log", "w+") as worker_log, \
+                    open(Path(tmp) / "inference.log", "w+") as inference_log:
+                inference = None
+                if args.inference_server:
+                    inference = subprocess.Popen(
+                        [sys.executable, "manage.py", "run_inference_server"],
+                        cwd=ROOT, env={**env, "PYTHONUNBUFFERED": "1"}, stdout=inference_log, stderr=subprocess.STDOUT,
+                    )
+                    _wait_for_line(inference, inference_log, "listening on", args.startup_timeout)
+                # The app (WSGI or ASGI) comes from gunicorn.conf.py
+                server = subprocess.Popen(
+                    [sys.executable, "-m", "gunicorn", "-c", str(ROOT / "gunicorn.conf.py")],
+                    cwd=ROOT, env=env, stdout=server_log, stderr=subprocess.STDOUT,
+                )
+                worker = None if inline else subprocess.Popen(
+                    [sys.executable, "manage.py", "run_analysis_worker", "--poll-interval", "0.2"],
+                    cwd=ROOT, env={**env, "PYTHONUNBUFFERED": "1"}, stdout=worker_log, stderr=subprocess.STDOUT,
+                )
+                try:
+                    _wait_until_serving(args.port, server, server_log, args.startup_timeout)
+                    if inline:
+                        # Each gunicorn worker logs its warmup (gunicorn.conf.py)
+                        _wait_for_line(server, server_log, " warm in ", args.startup_timeout, count=args.workers)
+                        warmed = 0
+                    else:
+                        warmed = _warm_worker(
+                            args.port, fixtures["urls"], fixtures["sessions"][0], worker, worker_log, args.startup_timeout,
+                        )
+                    samples, lock = [], threading.Lock()
+                    deadline = time.monotonic() + args.duration
+                    weights = (args.write_ratio, (1 - args.write_ratio) * 0.8, (1 - args.write_ratio) * 0.2)
+                    threads = [
+                        threading.Thread(target=_client, args=(
+                            args.port, fixtures["urls"], fixtures["sessions"][i % len(fixtures["sessions"])],
+                            fixtures["admin_session"], weights, deadline, args.seed + i, samples, lock,
+                        ))
+                        for i in range(args.clients)
+                    ]
+                    started = time.perf_counter()
+                    for thread in threads:
+                        thread.start()
+                    for thread in threads:
+                        thread.join()
+                    wall = time.perf_counter() - started
+                finally:
+                    _stop(server)
+                    for proc in (worker, inference):
+                        if proc is not None:
+                            _stop(proc)
+                worker_log.seek(warmed)
+                worker_output = worker_log.read()
+        finally:
+            if not mode.startswith("sqlite"):
+                _create_postgres_database(env, drop=True)
+
+    analyzed = sum(
+        int(line.split(": ")[1].split()[0]) for line in worker_output.splitlines() if line.startswith("Processed batch")
+    )
+    return {
+        "mode": mode,
+        "server": server_name,
+        "analysis": args.analysis,
+        "inference_server": args.inference_server,
+        **_summary(samples, wall),
+        "worker_analyzed": analyzed,
+        "worker_locked_errors": worker_output.count("database is locked"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed dream submission / dashboard load per database mode and server.")
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=["sqlite-default", "sqlite-wal"])
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=["sync"])
+    parser.add_argument("--analysis", choices=["worker", "inline"], default="worker",
+                        help="Analyze submitted dreams in run_analysis_worker or in the web request.")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load per mode.")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers.")
+    parser.add_argument("--write-ratio", type=float, default=0.3, help="Share of requests that submit a dream.")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--seed-dreams", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    parser.add_argument("--inference-server", action="store_true",
+                        help="Run the models in run_inference_server instead of the web and analysis workers.")
+    parser.add_argument("--standin-size", choices=["tiny", "small", "base"], default="tiny")
+    parser.add_argument("--standin-dir", default=str(Path(tempfile.gettempdir()) / "dream-standin-models"))
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    parser.add_argument("--setup", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setup:
+        sys.path.insert(0, str(ROOT))
+        setup_database(args.users, args.seed_dreams, args.seed)
+        return
+
+    sys.path.insert(0, str(ROOT / "benchmarks"))
+    from standin_models import build_standin_models
+
+    models_dir = build_standin_models(args.standin_dir, args.standin_size)
+    results = []
+    for mode in args.modes:
+        for server_name in args.servers:
+            try:
+                results.append(run_mode(mode, server_name, args, models_dir))
+            except (RuntimeError, subprocess.CalledProcessError) as e:
+                detail = getattr(e, "stderr", None) or str(e)
+                results.append({
+                    "mode": mode, "server": server_name,
+                    "error": detail.strip().splitlines()[-1] if detail.strip() else repr(e),
+                })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode/server':<20} {'req/s':>6}  " + "  ".join(f"{op + ' p50/p95 ms (err)':>32}" for op in OPERATIONS)
+          + f"  {'analyzed':>8}")
+    for row in results:
+        label = f"{row['mode']}/{row['server']}"
+        if "error" in row:
+            print(f"{label:<20} error: {row['error']}")
+            continue
+        cells = [
+            f"{row[op]['p50_ms']}/{row[op]['p95_ms']} ({row[op]['errors']})" for op in OPERATIONS
+        ]
+        print(f"{label:<20} {row['throughput_rps']:>6}  " + "  ".join(f"{cell:>32}" for cell in cells)
+              + f"  {row['worker_analyzed']:>8}")
+
+
+if __name__ == "__main__":
+    main()
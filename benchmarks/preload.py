@@ -0,0 +1,231 @@
+# benchmarks/preload.py
+# Memory and throughput of the two gunicorn model-loading modes (see
+# gunicorn.conf.py): every worker loading its own models vs. the master
+# preloading them before fork. Linux only (memory is read from /proc).
+#
+#   python benchmarks/preload.py                       # 1, 2, 4 and 8 workers
+#   python benchmarks/preload.py --workers 1 2 --duration 5 --json
+#
+# Memory is the summed PSS of the master and its workers, which splits shared
+# copy-on-write pages between the processes that map them, so it is the real
+# footprint. It is sampled after warmup and again after the load test, to show
+# how many shared pages the workers dirtied while serving requests.
+#
+# The app served is the project's WSGI application plus one extra endpoint,
+# POST /__bench__/analyze, which analyzes the request body in the worker
+# (bypassing the result cache, the inference server and the login-protected views).
+
+import argparse
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import http.client
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BENCH_PATH = "/__bench__/analyze"
+
+WORDS = (
+    "house night dark running falling water door stairs mother school forest "
+    "chased flying lost teeth ocean train late exam friend dog voice light "
+    "storm window mirror city empty road screaming laughing quiet warm cold"
+).split()
+
+
+# --- WSGI app served by the workers ---
+def _django_app():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dream_analyzer.settings")
+    from dream_analyzer.wsgi import application as django_application
+    return django_application
+
+
+_django = None
+
+
+def application(environ, start_response):
+    global _django
+    if _django is None:
+        _django = _django_app()
+    if environ.get("PATH_INFO") != BENCH_PATH or environ.get("REQUEST_METHOD") != "POST":
+        return _django(environ, start_response)
+
+    from dreams import ai_pipeline
+
+    length = int(environ.get("CONTENT_LENGTH") or 0)
+    text = environ["wsgi.input"].read(length).decode("utf-8")
+    result = ai_pipeline.run_inference([text])[0]
+    body = json.dumps({"ok": "error" not in result, "pid": os.getpid()}).encode("utf-8")
+    start_response("200 OK", [("Content-Type", "application/json"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+# Preloading imports this module in the master, so load Django there too
+if os.environ.get("DREAM_PRELOAD_MODELS") == "1" and "gunicorn" in sys.modules:
+    _django = _django_app()
+
+
+# --- Measurement ---
+def _children(pid):
+    children = []
+    for task in Path(f"/proc/{pid}/task").iterdir():
+        try:
+            children += [int(c) for c in (task / "children").read_text().split()]
+        except OSError:
+            pass
+    return children
+
+
+def _pss_kb(pid):
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def memory_mb(master_pid):
+    """(total PSS of master + workers, master PSS) in MB."""
+    master = _pss_kb(master_pid)
+    workers = sum(_pss_kb(pid) for pid in _children(master_pid))
+    return round((master + workers) / 1024, 1), round(master / 1024, 1)
+
+
+def random_text(rng, words=120):
+    return " ".join(rng.choice(WORDS) for _ in range(words)) + "."
+
+
+def load_test(port, clients, duration, seed=0):
+    """Closed-loop load: `clients` threads posting back to back for `duration` seconds."""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(seed + index)
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request("POST", BENCH_PATH, random_text(rng).encode("utf-8"))
+                payload = json.loads(conn.getresponse().read())
+                ok = payload["ok"]
+            except Exception as e:
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+                ok = False
+                payload = str(e)
+            elapsed = time.perf_counter() - started
+            with lock:
+                (latencies if ok else errors).append(elapsed if ok else payload)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(0.95 * (len(latencies) - 1))] * 1000, 1) if latencies else None,
+    }
+
+
+def run_mode(preload, workers, port, duration, clients_per_worker, startup_timeout):
+    env = {
+        **os.environ,
+        "DREAM_PRELOAD_MODELS": "1" if preload else "0",
+        "DREAM_WARMUP": "1",
+        # The workers run inference themselves, so warmup loads the models
+        "DREAM_ANALYSIS_ASYNC": "0",
+        "GUNICORN_WORKERS": str(workers),
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "DREAM_INFERENCE_SERVER": "",
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])),
+    }
+    with tempfile.TemporaryFile(mode="w+") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "benchmarks.preload:application", "-c", str(ROOT / "gunicorn.conf.py")],
+            cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        try:
+            started = time.monotonic()
+            # Every worker logs "warm in" once its models are loaded
+            while True:
+                log.seek(0)
+                output = log.read()
+                if output.count(" warm in ") >= workers:
+                    break
+                if "warmup failed" in output.lower() or proc.poll() is not None:
+                    raise RuntimeError(f"gunicorn did not start cleanly:\n{output[-2000:]}")
+                if time.monotonic() - started > startup_timeout:
+                    raise RuntimeError(f"workers not warm after {startup_timeout}s:\n{output[-2000:]}")
+                time.sleep(0.2)
+            ready_s = round(time.monotonic() - started, 2)
+            idle_total, master = memory_mb(proc.pid)
+            stats = load_test(port, clients_per_worker * workers, duration)
+            loaded_total, _ = memory_mb(proc.pid)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+    return {
+        "mode": "preload" if preload else "per-worker",
+        "workers": workers,
+        "ready_s": ready_s,
+        "master_pss_mb": master,
+        "idle_pss_mb": idle_total,
+        "loaded_pss_mb": loaded_total,
+        **stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-worker and preloaded model loading under gunicorn.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=15.0, help="Seconds of load per configuration.")
+    parser.add_argument("--clients-per-worker", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    results = []
+    for workers in args.workers:
+        for preload in (False, True):
+            try:
+                results.append(run_mode(preload, workers, args.port, args.duration,
+                                        args.clients_per_worker, args.startup_timeout))
+            except RuntimeError as e:
+                results.append({"mode": "preload" if preload else "per-worker", "workers": workers, "error": str(e)})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<11} {'workers':>7} {'ready':>7} {'idle MB':>8} {'loaded MB':>9} {'req/s':>7} {'p50 ms':>7} {'p95 ms':>7}")
+    for row in results:
+        if "error" in row:
+            print(f"{row['mode']:<11} {row['workers']:>7}  error: {row['error'].splitlines()[0]}")
+            continue
+        print(f"{row['mode']:<11} {row['workers']:>7} {row['ready_s']:>6}s {row['idle_pss_mb']:>8} "
+              f"{row['loaded_pss_mb']:>9} {row['throughput_rps']:>7} {row['p50_ms']:>7} {row['p95_ms']:>7}")
+
+
+if __name__ == "__main__":
+    main()
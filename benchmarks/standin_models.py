@@ -0,0 +1,113 @@
+# benchmarks/standin_models.py
+# Randomly initialized stand-ins for the sentiment and emotion models, built
+# entirely offline. They have the real models' architecture family (RoBERTa),
+# label sets and on-disk layout, so ai_pipeline loads them unchanged when
+# DREAM_AI_MODELS_DIR points at the output directory. Their scores are noise:
+# use them for timing and plumbing, never for accuracy.
+#
+#   python benchmarks/standin_models.py /tmp/standin-models           # tiny, fast
+#   python benchmarks/standin_models.py /tmp/standin-models --size base  # roberta-base shape
+
+import argparse
+import random
+from pathlib import Path
+
+SENTIMENT_LABELS = ["negative", "neutral", "positive"]
+# The 28 GoEmotions labels of SamLowe/roberta-base-go_emotions
+EMOTION_LABELS = (
+    "admiration amusement anger annoyance approval caring confusion curiosity desire "
+    "disappointment disapproval disgust embarrassment excitement fear gratitude grief joy "
+    "love nervousness optimism pride realization relief remorse sadness surprise neutral"
+).split()
+
+SIZES = {
+    # name: (hidden size, layers, attention heads, intermediate size, vocab size)
+    "tiny": (64, 2, 2, 128, 2000),
+    "small": (256, 4, 4, 1024, 8000),
+    # Same compute per token as the real models (weights are random)
+    "base": (768, 12, 12, 3072, 50265),
+}
+
+CORPUS_WORDS = (
+    "i was in my childhood house and the lights went out suddenly someone was chasing me "
+    "through a dark forest at night my teeth started falling out while i tried to scream "
+    "i could fly over the city and the ocean below was calm and warm my mother called "
+    "my name from far away i was late for an exam i had never studied for the stairs "
+    "kept going down forever a dog followed me home and then it turned into a wolf "
+    "i felt happy and free then afraid and lost the water rose quickly and i woke up"
+).split()
+
+
+def _training_corpus(lines=2000, seed=0):
+    rng = random.Random(seed)
+    for _ in range(lines):
+        yield " ".join(rng.choice(CORPUS_WORDS) for _ in range(rng.randint(5, 40)))
+
+
+def build_tokenizer(vocab_size):
+    """Byte-level BPE tokenizer trained on a small built-in corpus, wrapped like roberta-base's."""
+    from tokenizers import ByteLevelBPETokenizer
+    from tokenizers.processors import RobertaProcessing
+    from transformers import RobertaTokenizerFast
+
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(
+        _training_corpus(), vocab_size=vocab_size, show_progress=False,
+        special_tokens=["<s>", "<pad>", "</s>", "<unk>", "<mask>"],
+    )
+    bpe._tokenizer.post_processor = RobertaProcessing(
+        ("</s>", bpe.token_to_id("</s>")), ("<s>", bpe.token_to_id("<s>")),
+    )
+    return RobertaTokenizerFast(
+        tokenizer_object=bpe._tokenizer, bos_token="<s>", eos_token="</s>", sep_token="</s>",
+        cls_token="<s>", pad_token="<pad>", unk_token="<unk>", mask_token="<mask>",
+        model_max_length=512,
+    )
+
+
+def build_standin_models(directory, size="tiny", seed=0):
+    """
+    Writes sentiment_model/ and emotion_model/ under `directory` and returns it.
+    Existing stand-ins of the same size are reused.
+    """
+    import torch
+    from transformers import RobertaConfig, RobertaForSequenceClassification
+
+    directory = Path(directory)
+    marker = directory / f".standin-{size}"
+    if marker.exists():
+        return directory
+
+    hidden, layers, heads, intermediate, vocab_size = SIZES[size]
+    tokenizer = build_tokenizer(vocab_size)
+    torch.manual_seed(seed)
+    for name, labels, problem_type in (
+        ("sentiment_model", SENTIMENT_LABELS, "single_label_classification"),
+        ("emotion_model", EMOTION_LABELS, "multi_label_classification"),
+    ):
+        config = RobertaConfig(
+            vocab_size=len(tokenizer), hidden_size=hidden, num_hidden_layers=layers,
+            num_attention_heads=heads, intermediate_size=intermediate, max_position_embeddings=514,
+            pad_token_id=tokenizer.pad_token_id, bos_token_id=tokenizer.bos_token_id,
+            eos_token_id=tokenizer.eos_token_id, type_vocab_size=1, num_labels=len(labels),
+            id2label=dict(enumerate(labels)), label2id={label: i for i, label in enumerate(labels)},
+            problem_type=problem_type,
+        )
+        model = RobertaForSequenceClassification(config).eval()
+        model.save_pretrained(directory / name)
+        tokenizer.save_pretrained(directory / name)
+    marker.touch()
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build randomly initialized stand-in models for offline benchmarks.")
+    parser.add_argument("directory", help="Output directory (use it as DREAM_AI_MODELS_DIR).")
+    parser.add_argument("--size", choices=sorted(SIZES), default="tiny")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(f"Stand-in models written to {build_standin_models(args.directory, args.size, args.seed)}")
+
+
+if __name__ == "__main__":
+    main()
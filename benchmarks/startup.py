@@ -0,0 +1,94 @@
+# benchmarks/startup.py
+# Cold-start timings for the ways the project gets started. Each case runs in a
+# fresh interpreter, so module caches from earlier runs don't hide import costs.
+#
+#   python benchmarks/startup.py            # all cases, 5 runs each
+#   python benchmarks/startup.py --runs 3 --skip-warmup
+#
+# Besides wall time, each case reports which heavy libraries ended up imported:
+# only the warmup case should load transformers/torch.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["transformers", "torch", "onnxruntime", "plotly", "whisper", "nltk", "sklearn"]
+
+SETUP = "import django; django.setup()\n"
+REPORT = (
+    "import json, sys\n"
+    f"print('HEAVY=' + json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+)
+
+CASES = [
+    # (name, python code run after django.setup())
+    ("django.setup", ""),
+    ("import dreams.models", "import dreams.models\n"),
+    ("admin + urls", "import dreams.admin, dream_analyzer.urls\n"),
+    ("manage.py check", "from django.core.management import call_command\ncall_command('check')\n"),
+    ("wsgi application", "from dream_analyzer.wsgi import application\n"),
+]
+WARMUP_CASE = ("warmup (models + first inference)", "from dreams import ai_pipeline\nai_pipeline.warmup(models=True)\n")
+
+
+def run_case(code):
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")]))}
+    env.setdefault("DJANGO_SETTINGS_MODULE", "dream_analyzer.settings")
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", SETUP + code + REPORT], cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed")
+    heavy = []
+    for line in proc.stdout.splitlines():
+        if line.startswith("HEAVY="):
+            heavy = json.loads(line[len("HEAVY="):])
+    return elapsed, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start timings for Django startup paths.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per case (median is reported).")
+    parser.add_argument("--skip-warmup", action="store_true", help="Skip the case that loads the AI models.")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    cases = CASES if args.skip_warmup else CASES + [WARMUP_CASE]
+    results = []
+    for name, code in cases:
+        runs = 1 if name == WARMUP_CASE[0] else max(1, args.runs)
+        try:
+            samples = [run_case(code) for _ in range(runs)]
+        except RuntimeError as e:
+            results.append({"case": name, "error": str(e)})
+            continue
+        times = [elapsed for elapsed, _ in samples]
+        results.append({
+            "case": name,
+            "runs": runs,
+            "median_s": round(statistics.median(times), 3),
+            "min_s": round(min(times), 3),
+            "heavy_modules": samples[-1][1],
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'case':<36} {'median':>8} {'min':>8}  heavy modules imported")
+    for row in results:
+        if "error" in row:
+            print(f"{row['case']:<36} {'error':>8}           {row['error']}")
+        else:
+            print(f"{row['case']:<36} {row['median_s']:>7.3f}s {row['min_s']:>7.3f}s  {', '.join(row['heavy_modules']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
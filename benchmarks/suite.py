@@ -0,0 +1,510 @@
+# benchmarks/suite.py
+# Micro-benchmarks and load tests for the analysis path, run against a throwaway
+# test database. Results are written as JSON so runs can be compared.
+#
+#   python benchmarks/suite.py --standin tiny                      # offline, all benchmarks
+#   python benchmarks/suite.py --only analyze keywords             # the installed models
+#   python benchmarks/suite.py --only dashboard --sizes 1000 100000 1000000
+#   python benchmarks/suite.py --standin tiny --compare old.json --fail-on-regression
+#
+# Benchmarks:
+#   analyze    analyze_dream() latency percentiles by text length (result cache and
+#              micro-batcher off), plus batched analyze_dreams() throughput
+#   keywords   extract_keywords() / extract_keywords_batch() throughput, count and tfidf
+#   add_dream  POST to add_dream_view through the Django test client, sync and async
+#   ingest     --ingest-dreams dreams POSTed as NDJSON to the bulk ingestion API (queued
+#              for the worker), in requests of DREAM_INGEST_MAX_ITEMS
+#   dashboard  admin dashboard (cold and cached) and user dashboard latency and query
+#              counts after seeding each of --sizes dream rows
+#   similar    similar-dream search latency (per user, global exact and global IVF)
+#              and IVF recall@10 over --similar-rows synthetic embeddings
+#
+# With --standin the randomly initialized models from standin_models.py are used
+# (scores are noise, timings are real for the chosen size).
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BENCHMARKS = ("analyze", "keywords", "add_dream", "ingest", "dashboard", "similar")
+DEFAULT_LENGTHS = (25, 100, 400, 1500)
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DEFAULT_SIMILAR_ROWS = (100000, 1000000)
+# Metrics checked by --compare; tail percentiles of a few samples are too noisy
+COMPARED_METRICS = ("p50_ms", "p95_ms", "per_s", "queries")
+RISK_LEVELS = (("Low", 70), ("Moderate", 22), ("High", 8))
+SENTIMENTS = ("Negative", "Neutral", "Positive")
+
+DREAM_WORDS = (
+    "i was walking through my old school when the hallway started to stretch and the "
+    "lights flickered someone behind me kept calling my name but when i turned there "
+    "was only water rising up the stairs my teeth felt loose and i could not scream "
+    "then i was flying above a quiet city at night the wind was warm and i felt free "
+    "my brother was there laughing a dog ran beside us into the forest where the trees "
+    "whispered and i got lost looking for the door home i was late for an exam again"
+).split()
+
+
+def dream_text(rng, words):
+    return " ".join(rng.choice(DREAM_WORDS) for _ in range(words)).capitalize() + "."
+
+
+# --- Statistics ---
+def _percentile(ordered, q):
+    # Nearest-rank percentile of an already sorted list
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))]
+
+
+def summarize(seconds):
+    """Latency summary in milliseconds."""
+    ordered = sorted(seconds)
+    ms = lambda value: round(value * 1000, 3)
+    return {
+        "count": len(ordered),
+        "mean_ms": ms(statistics.fmean(ordered)),
+        "p50_ms": ms(_percentile(ordered, 50)),
+        "p90_ms": ms(_percentile(ordered, 90)),
+        "p95_ms": ms(_percentile(ordered, 95)),
+        "p99_ms": ms(_percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1]),
+    }
+
+
+def _timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - started, result
+
+
+# --- Benchmarks ---
+def bench_analyze(args, rng):
+    from django.test import override_settings
+    from dreams import ai_pipeline
+
+    results = {}
+    with override_settings(DREAM_CACHE_ENABLED=False, DREAM_BATCH_WINDOW_MS=0, DREAM_INFERENCE_SERVER=""):
+        results["warmup_s"] = round(sum(ai_pipeline.warmup(models=True).values()), 3)
+        for words in args.lengths:
+            samples = []
+            for _ in range(args.iterations):
+                elapsed, result = _timed(ai_pipeline.analyze_dream, dream_text(rng, words))
+                if "error" in result:
+                    raise RuntimeError(result["error"])
+                samples.append(elapsed)
+            results[f"analyze_dream_{words}_words"] = summarize(samples)
+
+        texts = [dream_text(rng, 100) for _ in range(args.batch_size * max(1, args.iterations // 4))]
+        elapsed, _ = _timed(ai_pipeline.analyze_dreams, texts)
+        results["analyze_dreams_100_words"] = {
+            "texts": len(texts), "batch_size": args.batch_size, "texts_per_s": round(len(texts) / elapsed, 2),
+        }
+    return results
+
+
+def bench_keywords(args, rng):
+    from django.test import override_settings
+    from dreams import keywords
+
+    texts = [dream_text(rng, 100) for _ in range(args.keyword_texts)]
+    # Give the tfidf path document frequencies to look up
+    keywords.observe_documents(texts[: len(texts) // 2])
+    keywords.stopwords()
+
+    results = {}
+    for scoring in ("count", "tfidf"):
+        with override_settings(DREAM_KEYWORD_SCORING=scoring):
+            elapsed, _ = _timed(lambda: [keywords.extract_keywords(text) for text in texts])
+            results[f"extract_keywords_{scoring}"] = {"texts": len(texts), "texts_per_s": round(len(texts) / elapsed, 1)}
+            elapsed, _ = _timed(lambda: [
+                keywords.extract_keywords_batch(texts[start:start + 64]) for start in range(0, len(texts), 64)
+            ])
+            results[f"extract_keywords_batch64_{scoring}"] = {
+                "texts": len(texts), "texts_per_s": round(len(texts) / elapsed, 1),
+            }
+    return results
+
+
+def _request(client, method, url, data=None, expect=(200,)):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as captured:
+        elapsed, response = _timed(getattr(client, method), url, data or {})
+    if response.status_code not in expect:
+        raise RuntimeError(f"{method.upper()} {url} returned HTTP {response.status_code}")
+    return elapsed, len(captured.captured_queries)
+
+
+def bench_add_dream(args, rng):
+    from django.contrib.auth.models import User
+    from django.test import Client, override_settings
+    from django.urls import reverse
+
+    client = Client()
+    client.force_login(User.objects.create_user("bench-add-dream"))
+    url = reverse("dreams:add_dream")
+
+    results = {}
+    for mode, run_async in (("sync", False), ("async", True)):
+        with override_settings(DREAM_ANALYSIS_ASYNC=run_async, DREAM_CACHE_ENABLED=False,
+                               DREAM_BATCH_WINDOW_MS=0, DREAM_INFERENCE_SERVER=""):
+            samples, queries = [], []
+            for _ in range(args.iterations):
+                elapsed, count = _request(client, "post", url, {"dream_text": dream_text(rng, 100)}, expect=(302,))
+                samples.append(elapsed)
+                queries.append(count)
+        results[f"add_dream_{mode}"] = {**summarize(samples), "queries": statistics.median(queries)}
+    return results
+
+
+def bench_ingest(args, rng):
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from rest_framework.authtoken.models import Token
+
+    token = Token.objects.create(user=User.objects.create_user("bench-ingest"))
+    client = Client(HTTP_AUTHORIZATION=f"Token {token.key}")
+    url = reverse("dreams:api_bulk_ingest")
+    per_request = settings.DREAM_INGEST_MAX_ITEMS
+    texts = [dream_text(rng, 100) for _ in range(min(args.ingest_dreams, 1000))]
+
+    samples = []
+    with override_settings(DREAM_ANALYSIS_ASYNC=True):
+        for start in range(0, args.ingest_dreams, per_request):
+            count = min(per_request, args.ingest_dreams - start)
+            body = "\n".join(
+                json.dumps({"dream_text": texts[i % len(texts)], "ref": start + i}) for i in range(count)
+            )
+            elapsed, response = _timed(client.post, url, body, content_type="application/x-ndjson")
+            if response.status_code != 201 or response.json()["created"] != count:
+                raise RuntimeError(f"POST {url} returned HTTP {response.status_code}")
+            samples.append(elapsed)
+    return {
+        "bulk_ndjson": {
+            "dreams": args.ingest_dreams,
+            "requests": len(samples),
+            "items_per_request": per_request,
+            "dreams_per_s": round(args.ingest_dreams / sum(samples), 1),
+            "request_p50_ms": round(statistics.median(samples) * 1000, 1),
+        },
+    }
+
+
+@contextmanager
+def _explicit_created_at():
+    # Seeded rows are spread over two years, so auto_now_add must not overwrite them
+    from dreams.models import DreamNarration
+
+    field = DreamNarration._meta.get_field("created_at")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def seed_dreams(count, user_ids, rng, batch_size=5000):
+    """Bulk-inserts `count` already-analyzed dreams with plausible field distributions."""
+    from django.utils import timezone
+    from dreams import emotion_vectors
+    from dreams.models import DreamNarration, hash_dream_text
+    from standin_models import EMOTION_LABELS
+
+    now = timezone.now()
+    levels, weights = zip(*RISK_LEVELS)
+    with _explicit_created_at():
+        for start in range(0, count, batch_size):
+            rows = []
+            for _ in range(min(batch_size, count - start)):
+                text = dream_text(rng, 30)
+                scores = {label: round(rng.random(), 4) for label in EMOTION_LABELS}
+                label_set, vector = emotion_vectors.pack(scores)
+                primary = max(scores, key=scores.get)
+                rows.append(DreamNarration(
+                    user_id=rng.choice(user_ids), dream_text=text, text_hash=hash_dream_text(text),
+                    sentiment=rng.choice(SENTIMENTS), emotion=primary.capitalize(), primary_emotion=primary,
+                    emotion_labels=label_set, emotion_vector=vector,
+                    risk_level=rng.choices(levels, weights)[0], potential_condition="None",
+                    analysis_json={},
+                    created_at=now - timedelta(seconds=rng.randrange(730 * 86400)),
+                ))
+            DreamNarration.objects.bulk_create(rows, batch_size=1000)
+
+
+def bench_dashboard(args, rng):
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.db.models import Count
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+    from django.utils import timezone
+    from dreams import dashboard, rollups
+    from dreams.models import DreamNarration, UserDreamStats
+
+    sizes = sorted(args.sizes)
+    User.objects.bulk_create(
+        [User(username=f"bench-dashboard-{i}") for i in range(max(1, sizes[-1] // 1000))]
+    )
+    user_ids = list(User.objects.filter(username__startswith="bench-dashboard-").values_list("id", flat=True))
+    admin_client = Client()
+    admin_client.force_login(User.objects.create_superuser("bench-admin", "admin@example.com", None))
+    admin_url = reverse("admin:dreams_dreamnarration_dashboard")
+    recent = timezone.now() - timedelta(days=30)
+
+    results = {}
+    seeded = DreamNarration.objects.count()
+    for size in sizes:
+        seed_seconds, _ = _timed(seed_dreams, size - seeded, user_ids, rng)
+        seeded = size
+        rebuild_seconds, _ = _timed(lambda: (UserDreamStats.rebuild(), rollups.rebuild()))
+
+        busiest = (
+            DreamNarration.objects.order_by().values("user_id").annotate(n=Count("id")).order_by("-n").first()
+        )
+        user_client = Client()
+        user_client.force_login(User.objects.get(pk=busiest["user_id"]))
+
+        cold, cold_queries, cold_range = [], [], []
+        for _ in range(args.repeats):
+            dashboard._cache().clear()
+            with CaptureQueriesContext(connection) as captured:
+                elapsed, _ = _timed(dashboard.dashboard_context)
+            cold.append(elapsed)
+            cold_queries.append(len(captured.captured_queries))
+            dashboard._cache().clear()
+            elapsed, _ = _timed(dashboard.dashboard_context, recent, None)
+            cold_range.append(elapsed)
+
+        admin_cached, admin_queries, user_view, user_queries = [], [], [], []
+        _request(admin_client, "get", admin_url)  # fill the cache
+        for _ in range(args.repeats):
+            elapsed, count = _request(admin_client, "get", admin_url)
+            admin_cached.append(elapsed)
+            admin_queries.append(count)
+            elapsed, count = _request(user_client, "get", reverse("dreams:dashboard"))
+            user_view.append(elapsed)
+            user_queries.append(count)
+
+        results[f"{size}_rows"] = {
+            "seed_s": round(seed_seconds, 2),
+            "rebuild_aggregates_s": round(rebuild_seconds, 2),
+            "admin_context_cold": {**summarize(cold), "queries": statistics.median(cold_queries)},
+            "admin_context_cold_last_30_days": summarize(cold_range),
+            "admin_view_cached": {**summarize(admin_cached), "queries": statistics.median(admin_queries)},
+            "user_dashboard_view": {
+                **summarize(user_view), "queries": statistics.median(user_queries), "user_dreams": busiest["n"],
+            },
+        }
+        print(f"  dashboard @ {size} rows: cold p50 {results[f'{size}_rows']['admin_context_cold']['p50_ms']} ms")
+    return results
+
+
+def _synthetic_embeddings(rng, count, dim, centers):
+    # Clustered like real sentence embeddings, unlike uniform noise
+    return centers[rng.integers(0, len(centers), count)] + 0.5 * rng.standard_normal((count, dim), dtype=np.float32)
+
+
+def bench_similar(args, rng):
+    from dreams import embeddings
+
+    np_rng = np.random.default_rng(rng.randrange(2 ** 32))
+    dim, users = args.similar_dim, 1000
+    centers = np_rng.standard_normal((256, dim), dtype=np.float32)
+    results = {}
+    for size in sorted(args.similar_rows):
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp) / "index"
+            started = time.perf_counter()
+            for start in range(0, size, 50000):
+                count = min(50000, size - start)
+                vectors = _synthetic_embeddings(np_rng, count, dim, centers)
+                embeddings.append(zip(range(start, start + count), np_rng.integers(0, users, count).tolist(), vectors), directory)
+            build_seconds = time.perf_counter() - started
+
+            queries = _synthetic_embeddings(np_rng, args.repeats * 4, dim, centers)
+            query_users = np_rng.integers(0, users, len(queries)).tolist()
+            index = embeddings.EmbeddingIndex(directory)
+            # One untimed pass first: latencies are for an index in the page cache
+            for query, user_id in zip(queries, query_users):
+                index.search(query, 10, user_id=user_id)
+                index.search(query, 10)
+            per_user = [_timed(index.search, query, 10, user_id=user_id)[0] for query, user_id in zip(queries, query_users)]
+            exact, exact_ids = [], []
+            for query in queries:
+                elapsed, (ids, _) = _timed(index.search, query, 10)
+                exact.append(elapsed)
+                exact_ids.append(set(ids.tolist()))
+
+            elapsed, meta = _timed(embeddings.compact, directory)
+            row = {
+                "dim": dim,
+                "append_rows_per_s": round(size / build_seconds),
+                "train_ivf_s": round(elapsed, 2),
+                "lists": meta["lists"],
+                "per_user_search": summarize(per_user),
+                "global_exact_search": summarize(exact),
+            }
+            if meta["lists"]:
+                index = embeddings.EmbeddingIndex(directory)
+                for query in queries:
+                    index.search(query, 10)
+                ivf, recall = [], []
+                for query, expected in zip(queries, exact_ids):
+                    elapsed, (ids, _) = _timed(index.search, query, 10)
+                    ivf.append(elapsed)
+                    recall.append(len(expected & set(ids.tolist())) / len(expected))
+                row["global_ivf_search"] = {**summarize(ivf), "recall_at_10": round(statistics.fmean(recall), 3)}
+            results[f"{size}_rows"] = row
+            print(f"  similar @ {size} rows: per-user p50 {row['per_user_search']['p50_ms']} ms, "
+                  f"global p50 {row.get('global_ivf_search', row['global_exact_search'])['p50_ms']} ms")
+    return results
+
+
+# --- Runner ---
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+def _metadata(args):
+    import django
+    from django.conf import settings
+    from django.db import connection
+
+    try:
+        import torch
+        torch_version, torch_threads = torch.__version__, torch.get_num_threads()
+    except ImportError:
+        torch_version = torch_threads = None
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "django": django.get_version(),
+        "torch": torch_version,
+        "torch_threads": torch_threads,
+        "database": connection.vendor,
+        "models": f"standin:{args.standin}" if args.standin else str(settings.DREAM_AI_MODELS_DIR or "ai_models"),
+        "settings": {
+            name: getattr(settings, name, None) for name in (
+                "DREAM_INFERENCE_BACKEND", "DREAM_SHARED_TOKENIZATION", "DREAM_CHUNKING",
+                "DREAM_MAX_TOKENS", "DREAM_BATCH_MAX_SIZE", "DREAM_KEYWORD_SCORING", "DREAM_EMBEDDING_NPROBE",
+            )
+        },
+        "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+    }
+
+
+def _flatten(tree, prefix=""):
+    for key, value in tree.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, path + ".")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield path, value
+
+
+def compare(previous, current, threshold):
+    """Prints metrics that moved by more than `threshold` (a fraction). Returns regressed metric names."""
+    old = dict(_flatten(previous.get("results", {})))
+    regressions = []
+    for key, value in _flatten(current["results"]):
+        before = old.get(key)
+        if not before or not key.endswith(COMPARED_METRICS):
+            continue
+        # Throughput is better when higher; latencies, durations and query counts when lower
+        change = (value - before) / before
+        worse = -change if key.endswith("per_s") else change
+        if abs(change) >= threshold:
+            flag = "REGRESSION" if worse > 0 else "improved"
+            print(f"  {flag:<10} {key}: {before} -> {value} ({change:+.1%})")
+            if worse > 0:
+                regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dream analysis path; results are written as JSON.")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--standin", choices=["tiny", "small", "base"],
+                        help="Use randomly initialized stand-in models of this size (offline).")
+    parser.add_argument("--standin-dir", default=str(Path(tempfile.gettempdir()) / "dream-standin-models"))
+    parser.add_argument("--iterations", type=int, default=50, help="Samples per latency measurement.")
+    parser.add_argument("--lengths", type=int, nargs="+", default=list(DEFAULT_LENGTHS), help="Text lengths in words.")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--keyword-texts", type=int, default=2000)
+    parser.add_argument("--ingest-dreams", type=int, default=100000, help="Dreams sent by the ingest benchmark.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Seeded dream rows.")
+    parser.add_argument("--repeats", type=int, default=5, help="Samples per dashboard measurement.")
+    parser.add_argument("--similar-rows", type=int, nargs="+", default=list(DEFAULT_SIMILAR_ROWS),
+                        help="Synthetic embeddings indexed by the similar benchmark.")
+    parser.add_argument("--similar-dim", type=int, default=768, help="Embedding size (roberta-base: 768).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="Earlier results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change reported by --compare.")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    if args.standin:
+        from standin_models import build_standin_models
+
+        os.environ["DREAM_AI_MODELS_DIR"] = str(build_standin_models(args.standin_dir, args.standin))
+        os.environ["DREAM_INFERENCE_BACKEND"] = "torch"
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "dream_analyzer.settings")
+    import django
+    django.setup()
+
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    output = {"meta": _metadata(args), "results": {}}
+    try:
+        for name in BENCHMARKS:
+            if name in args.only:
+                print(f"Running {name}...")
+                rng = random.Random(f"{args.seed}-{name}")
+                output["results"][name] = globals()[f"bench_{name}"](args, rng)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    Path(args.output).write_text(json.dumps(output, indent=2) + "\n")
+    print(f"Results written to {args.output}")
+    for key, value in _flatten(output["results"]):
+        if key.endswith(COMPARED_METRICS):
+            print(f"  {key}: {value}")
+
+    if args.compare:
+        print(f"Compared with {args.compare}:")
+        regressions = compare(json.loads(Path(args.compare).read_text()), output, args.threshold)
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
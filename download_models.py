@@ -2,10 +2,11 @@
 # A one-time script to download and save the upgraded Hugging Face models.
 
 from transformers import pipeline
+import argparse
 import os
 
 # Define the target directory for the models
-MODELS_BASE_DIR = "./ai_models"
+MODELS_BASE_DIR = os.environ.get("DREAM_AI_MODELS_DIR") or "./ai_models"
 
 def download_and_save_models():
     """
@@ -47,5 +48,79 @@ def download_and_save_models():
     print("\n--- All models have been downloaded successfully. ---")
     print("Your project is now ready to use the local AI models.")
 
+def export_to_onnx(model_dir, quantize=False):
+    """
+    Exports a saved model to '<model_dir>/onnx/model.onnx' for the onnx inference
+    backend and, with quantize=True, also writes a dynamically int8-quantized
+    'model-int8.onnx' for the onnx-int8 backend.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    onnx_dir = os.path.join(model_dir, "onnx")
+    os.makedirs(onnx_dir, exist_ok=True)
+    onnx_path = os.path.join(onnx_dir, "model.onnx")
+
+    print(f"\nExporting '{model_dir}' to ONNX...")
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+    sample = tokenizer(["An example dream narration.", "Another one."], padding=True, return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (sample["input_ids"], sample["attention_mask"]),
+            onnx_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=17,
+            dynamo=False,
+        )
+    print(f"ONNX model saved to '{onnx_path}'")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(onnx_dir, "model-int8.onnx")
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+        print(f"Quantized int8 model saved to '{int8_path}'")
+
+
+def download_whisper_model(name="base"):
+    """
+    Downloads a Whisper checkpoint to 'ai_models/whisper/<name>.pt', where
+    dreams/audio.py loads it from (see DREAM_WHISPER_MODEL).
+    """
+    import whisper
+
+    whisper_dir = os.path.join(MODELS_BASE_DIR, "whisper")
+    print(f"\nDownloading Whisper model: '{name}'...")
+    # load_model() fetches the checkpoint into download_root when it is missing
+    whisper.load_model(name, device="cpu", download_root=whisper_dir)
+    print(f"Whisper model saved to '{os.path.join(whisper_dir, name + '.pt')}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the AI models and optionally export them to ONNX.")
+    parser.add_argument("--skip-download", action="store_true", help="Reuse the models already in ai_models/.")
+    parser.add_argument("--onnx", action="store_true", help="Export both models to ONNX for DREAM_INFERENCE_BACKEND=onnx.")
+    parser.add_argument("--quantize", action="store_true", help="Also write int8-quantized models (DREAM_INFERENCE_BACKEND=onnx-int8).")
+    parser.add_argument("--whisper", metavar="NAME", nargs="?", const="base", help="Also download a Whisper model (default: base).")
+    args = parser.parse_args()
+
+    if not args.skip_download:
+        download_and_save_models()
+    if args.onnx or args.quantize:
+        for name in ("sentiment_model", "emotion_model"):
+            export_to_onnx(os.path.join(MODELS_BASE_DIR, name), quantize=args.quantize)
+        print("\nCheck the exported models with `python manage.py check_backend_parity --backend onnx`.")
+    if args.whisper:
+        download_whisper_model(args.whisper)
+
 if __name__ == "__main__":
-    download_and_save_models()
\ No newline at end of file
+    main()
\ No newline at end of file
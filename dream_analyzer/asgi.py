@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'dream_analyzer.settings')
+# Serve the async views. Persistent connections don't carry over between the threads
+# that run sync ORM code under ASGI, so close them after each request (use
+# DREAM_DB_POOL=1 with PostgreSQL for reuse).
+os.environ.setdefault('DREAM_ASYNC_VIEWS', '1')
+os.environ.setdefault('DREAM_DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
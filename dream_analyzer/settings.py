@@ -2,6 +2,7 @@
 
 import os
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -28,6 +29,7 @@ INSTALLED_APPS = [
     'dreams',
     # Third-party apps
     'rest_framework',
+    'rest_framework.authtoken',
 ]
 
 MIDDLEWARE = [
@@ -63,11 +65,86 @@ WSGI_APPLICATION = 'dream_analyzer.wsgi.application'
 
 
 # Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DREAM_DB_ENGINE is "sqlite" (default; DREAM_DB_NAME is the file path) or "postgres"
+# (needs psycopg 3, see requirements.txt; DREAM_DB_NAME/USER/PASSWORD/HOST/PORT).
+# Connections are kept open for DREAM_DB_CONN_MAX_AGE seconds and checked before reuse.
+DREAM_DB_ENGINE = os.environ.get('DREAM_DB_ENGINE', 'sqlite')
+DREAM_DB_CONN_MAX_AGE = int(os.environ.get('DREAM_DB_CONN_MAX_AGE', '60'))
+# PostgreSQL: DREAM_DB_POOL=1 uses psycopg's connection pool (one per process) instead
+# of persistent connections
+DREAM_DB_POOL = os.environ.get('DREAM_DB_POOL', '0') == '1'
+# SQLite: WAL journal so dashboard reads don't wait for analysis writes (set once in the
+# database file by migration dreams.0013) plus the per-connection pragmas below;
+# DREAM_SQLITE_TUNING=0 leaves SQLite's defaults
+DREAM_SQLITE_TUNING = os.environ.get('DREAM_SQLITE_TUNING', '1') == '1'
+DREAM_SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('DREAM_SQLITE_BUSY_TIMEOUT_MS', '5000'))
+DREAM_SQLITE_MMAP_MB = int(os.environ.get('DREAM_SQLITE_MMAP_MB', '256'))
+
+if DREAM_DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DREAM_DB_NAME', 'dream_analyzer'),
+            'USER': os.environ.get('DREAM_DB_USER', ''),
+            'PASSWORD': os.environ.get('DREAM_DB_PASSWORD', ''),
+            'HOST': os.environ.get('DREAM_DB_HOST', ''),
+            'PORT': os.environ.get('DREAM_DB_PORT', ''),
+            # Django requires CONN_MAX_AGE=0 when the pool manages connections
+            'CONN_MAX_AGE': 0 if DREAM_DB_POOL else DREAM_DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DREAM_DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.environ.get('DREAM_DB_POOL_MAX_SIZE', '10')),
+                    'timeout': float(os.environ.get('DREAM_DB_POOL_TIMEOUT', '10')),
+                },
+            } if DREAM_DB_POOL else {},
+        }
+    }
+elif DREAM_DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DREAM_DB_NAME', '') or BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': DREAM_DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                # synchronous=NORMAL is safe in WAL mode (a power loss can drop the last
+                # commits, never corrupt the file)
+                'init_command': ';'.join([
+                    'PRAGMA synchronous=NORMAL',
+                    f'PRAGMA busy_timeout={DREAM_SQLITE_BUSY_TIMEOUT_MS}',
+                    f'PRAGMA mmap_size={DREAM_SQLITE_MMAP_MB * 1024 * 1024}',
+                    'PRAGMA cache_size=-20000',
+                    'PRAGMA temp_store=MEMORY',
+                ]),
+                # Take the write lock when a transaction begins: a deferred transaction
+                # that upgrades from read to write fails with "database is locked" at
+                # once instead of waiting for busy_timeout
+                'transaction_mode': 'IMMEDIATE',
+            } if DREAM_SQLITE_TUNING else {},
+        }
     }
+else:
+    raise ImproperlyConfigured(f"Unknown DREAM_DB_ENGINE {DREAM_DB_ENGINE!r}; expected 'sqlite' or 'postgres'.")
+
+
+# Caches
+# "dream_analysis" is the persistent tier of the analysis result cache.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # A table in its own SQLite file (dreams/sqlite_cache.py), so storing a batch of
+    # results is an indexed write rather than a scan of a cache directory
+    'dream_analysis': {
+        'BACKEND': 'dreams.sqlite_cache.SQLiteCache',
+        'LOCATION': os.path.join(
+            os.environ.get('DREAM_ANALYSIS_CACHE_DIR', str(BASE_DIR / 'cache' / 'dream_analysis')), 'results.sqlite3',
+        ),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
 
 
@@ -103,4 +180,93 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 
 
 # Default primary key field type
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Dream analysis pipeline
+# Concurrent analyze_dream() calls are coalesced for up to this many milliseconds
+# into one batched forward pass (0 disables coalescing).
+DREAM_BATCH_WINDOW_MS = float(os.environ.get('DREAM_BATCH_WINDOW_MS', '10'))
+DREAM_BATCH_MAX_SIZE = int(os.environ.get('DREAM_BATCH_MAX_SIZE', '16'))
+# When enabled, submitted dreams are saved as Pending and analyzed by
+# `python manage.py run_analysis_worker` instead of inside the web request.
+DREAM_ANALYSIS_ASYNC = os.environ.get('DREAM_ANALYSIS_ASYNC', '1') == '1'
+# Optional shared model server (`python manage.py run_inference_server`). When set,
+# e.g. "http://127.0.0.1:8765" or "unix:///tmp/dream-inference.sock", web workers
+# send analysis requests there instead of loading the models themselves.
+DREAM_INFERENCE_SERVER = os.environ.get('DREAM_INFERENCE_SERVER', '')
+DREAM_INFERENCE_TIMEOUT = float(os.environ.get('DREAM_INFERENCE_TIMEOUT', '30'))
+# Long narrations are split into overlapping windows of DREAM_MAX_TOKENS tokens
+# that are analyzed in one batch and aggregated ("mean" = token-weighted mean,
+# or "max"). With chunking off, texts are truncated to DREAM_MAX_TOKENS.
+DREAM_MAX_TOKENS = int(os.environ.get('DREAM_MAX_TOKENS', '512'))
+DREAM_CHUNKING = os.environ.get('DREAM_CHUNKING', '1') == '1'
+DREAM_CHUNK_STRIDE = int(os.environ.get('DREAM_CHUNK_STRIDE', '64'))
+DREAM_CHUNK_AGGREGATION = os.environ.get('DREAM_CHUNK_AGGREGATION', 'mean')
+# analyze_dream() results are cached by normalized text + model version in a
+# per-process LRU and in the DREAM_ANALYSIS_CACHE cache alias ('' disables it).
+DREAM_CACHE_ENABLED = os.environ.get('DREAM_CACHE_ENABLED', '1') == '1'
+DREAM_CACHE_MEMORY_SIZE = int(os.environ.get('DREAM_CACHE_MEMORY_SIZE', '1024'))
+DREAM_ANALYSIS_CACHE = os.environ.get('DREAM_ANALYSIS_CACHE', 'dream_analysis')
+# Inference backend: "torch" (default), or "onnx" / "onnx-int8" after running
+# `python download_models.py --onnx --quantize` (requires onnxruntime).
+DREAM_INFERENCE_BACKEND = os.environ.get('DREAM_INFERENCE_BACKEND', 'torch')
+# Tokenize each dream once and run the sentiment and emotion models on the same
+# input ids concurrently (only used when both models share a vocabulary).
+DREAM_SHARED_TOKENIZATION = os.environ.get('DREAM_SHARED_TOKENIZATION', '1') == '1'
+# Optional JSON file overriding the risk rules and thresholds in dreams/risk.py:
+# {"rules": {"PTSD": {"fear": 0.6, ...}, ...}, "thresholds": {"high": 0.5, ...}}
+DREAM_RISK_RULES_FILE = os.environ.get('DREAM_RISK_RULES_FILE', '')
+# Admin dashboard: cache alias for the rendered charts and their maximum age (seconds)
+DREAM_ADMIN_DASHBOARD_CACHE = os.environ.get('DREAM_ADMIN_DASHBOARD_CACHE', 'default')
+DREAM_ADMIN_DASHBOARD_TTL = int(os.environ.get('DREAM_ADMIN_DASHBOARD_TTL', '300'))
+# Days of daily trend rollups to keep; older periods are only kept as weekly rows
+DREAM_ROLLUP_DAILY_DAYS = int(os.environ.get('DREAM_ROLLUP_DAILY_DAYS', '90'))
+# Audio dreams: Whisper model name (ai_models/whisper/<name>.pt) or path to a .pt file,
+# optional language code, segment length and limits for uploaded recordings
+DREAM_WHISPER_MODEL = os.environ.get('DREAM_WHISPER_MODEL', 'base')
+DREAM_WHISPER_LANGUAGE = os.environ.get('DREAM_WHISPER_LANGUAGE', '')
+DREAM_AUDIO_SEGMENT_SECONDS = float(os.environ.get('DREAM_AUDIO_SEGMENT_SECONDS', '30'))
+DREAM_AUDIO_MAX_SECONDS = float(os.environ.get('DREAM_AUDIO_MAX_SECONDS', '1800'))
+DREAM_AUDIO_MAX_UPLOAD_MB = int(os.environ.get('DREAM_AUDIO_MAX_UPLOAD_MB', '50'))
+# Keyword ranking in analysis results: "tfidf" (weighted by how rare a term is across
+# all analyzed dreams) or "count"
+DREAM_KEYWORD_SCORING = os.environ.get('DREAM_KEYWORD_SCORING', 'tfidf')
+# Seconds between reloads of the in-memory copy of the keyword document frequencies
+# used by the inference threads
+DREAM_KEYWORD_DF_TTL = float(os.environ.get('DREAM_KEYWORD_DF_TTL', '300'))
+# Torch intra-op threads per process (0 = torch default, one per core). gunicorn.conf.py
+# sets it to cores / workers unless given; DREAM_PRELOAD_MODELS=1 loads the models in
+# the gunicorn master so workers share them copy-on-write.
+DREAM_TORCH_THREADS = int(os.environ.get('DREAM_TORCH_THREADS', '0'))
+# Directory holding sentiment_model/, emotion_model/ and whisper/ (default: BASE_DIR/ai_models),
+# e.g. to point a benchmark run at the stand-in models from benchmarks/standin_models.py
+DREAM_AI_MODELS_DIR = os.environ.get('DREAM_AI_MODELS_DIR', '')
+# Prometheus metrics for the analysis pipeline at /dreams/metrics/ (per process), optionally
+# protected by a bearer token
+DREAM_METRICS_ENABLED = os.environ.get('DREAM_METRICS_ENABLED', '0') == '1'
+DREAM_METRICS_TOKEN = os.environ.get('DREAM_METRICS_TOKEN', '')
+# Precision of the packed per-dream emotion score vectors: "float16" (2 bytes per label)
+# or "float32". Applies to newly analyzed dreams; existing vectors keep their dtype.
+DREAM_EMOTION_VECTOR_DTYPE = os.environ.get('DREAM_EMOTION_VECTOR_DTYPE', 'float16')
+# Similar-dream search: with DREAM_EMBEDDINGS_ENABLED the analysis pass also emits a sentence
+# embedding from the emotion model's encoder (torch backend with shared tokenization) and
+# appends it to the index in DREAM_EMBEDDING_INDEX_DIR (default: BASE_DIR/embedding_index).
+# Global searches probe DREAM_EMBEDDING_NPROBE IVF lists once `rebuild_embedding_index` has
+# trained them.
+DREAM_EMBEDDINGS_ENABLED = os.environ.get('DREAM_EMBEDDINGS_ENABLED', '0') == '1'
+DREAM_EMBEDDING_INDEX_DIR = os.environ.get('DREAM_EMBEDDING_INDEX_DIR', '')
+DREAM_EMBEDDING_NPROBE = int(os.environ.get('DREAM_EMBEDDING_NPROBE', '16'))
+# Bulk ingestion API (dreams/api.py): items accepted per request, and dreams inserted (and,
+# without the background worker, analyzed) per bulk_create chunk
+DREAM_INGEST_MAX_ITEMS = int(os.environ.get('DREAM_INGEST_MAX_ITEMS', '25000'))
+DREAM_INGEST_CHUNK_SIZE = int(os.environ.get('DREAM_INGEST_CHUNK_SIZE', '1000'))
+# Async views for the dashboard, add-dream and results pages on the async ORM; on when
+# serving dream_analyzer.asgi. Their inference runs on DREAM_ASYNC_INFERENCE_THREADS threads
+# per process, with at most DREAM_ASYNC_MAX_PENDING texts queued (batched per
+# DREAM_BATCH_WINDOW_MS / DREAM_BATCH_MAX_SIZE like the micro-batcher).
+DREAM_ASYNC_VIEWS = os.environ.get('DREAM_ASYNC_VIEWS', '0') == '1'
+DREAM_ASYNC_INFERENCE_THREADS = int(os.environ.get('DREAM_ASYNC_INFERENCE_THREADS', '1'))
+DREAM_ASYNC_MAX_PENDING = int(os.environ.get('DREAM_ASYNC_MAX_PENDING', '1024'))
+# Dream saves in flight per async worker. SQLite takes one writer at a time, so more only
+# wait in its busy handler (and fail after DREAM_SQLITE_BUSY_TIMEOUT_MS)
+DREAM_ASYNC_DB_WRITERS = int(os.environ.get('DREAM_ASYNC_DB_WRITERS', '1' if DREAM_DB_ENGINE == 'sqlite' else '16'))
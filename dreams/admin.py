@@ -1,15 +1,16 @@
 # dreams/admin.py
 
+from datetime import datetime, time
 from django.contrib import admin
 from django.urls import path
 from django.shortcuts import render, redirect
-from django.db.models import Count
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.utils.html import format_html
 from django.urls import reverse
 from .models import DreamNarration
-import plotly.express as px
-import pandas as pd
-from collections import Counter
+from .ai_pipeline import analyze_dreams
+from .dashboard import dashboard_context
 
 @admin.register(DreamNarration)
 class DreamNarrationAdmin(admin.ModelAdmin):
@@ -17,10 +18,20 @@ class DreamNarrationAdmin(admin.ModelAdmin):
     This class configures the admin pages and includes the
     integrated dashboard with robust, crash-proof charting.
     """
-    list_display = ('user', 'sentiment', 'emotion', 'risk_level', 'created_at')
-    list_filter = ('risk_level', 'sentiment', 'emotion')
+    list_display = ('user', 'sentiment', 'primary_emotion', 'risk_level', 'created_at')
+    list_filter = ('risk_level', 'sentiment', 'primary_emotion')
     search_fields = ('dream_text', 'user__username')
     readonly_fields = ('analysis_json', 'created_at')
+    actions = ['reanalyze_dreams']
+
+    @admin.action(description="Re-run AI analysis on selected dreams")
+    def reanalyze_dreams(self, request, queryset):
+        """Explicitly re-analyzes the selection in one batched pass."""
+        dreams = list(queryset)
+        results = analyze_dreams([dream.dream_text for dream in dreams])
+        for dream, result in zip(dreams, results):
+            dream.save(analysis=result)
+        self.message_user(request, f"Re-analyzed {len(dreams)} dream(s).")
 
     def get_urls(self):
         urls = super().get_urls()
@@ -34,49 +45,30 @@ class DreamNarrationAdmin(admin.ModelAdmin):
         ]
         return custom_urls + urls
 
+    def _date_param(self, request, name, end_of_day=False):
+        try:
+            day = parse_date(request.GET.get(name) or "")
+        except ValueError:
+            # Well formed but impossible, e.g. 2024-02-30
+            day = None
+        if day is None:
+            return None
+        return timezone.make_aware(datetime.combine(day, time.max if end_of_day else time.min))
+
     def dashboard_view(self, request):
         """
-        This view renders the dashboard and is robust against bad data.
+        Renders the dashboard from SQL-side GROUP BY counts; the chart HTML is
+        cached (see dreams/dashboard.py). Accepts optional ?start= and ?end= dates.
         """
-        total_dreams = DreamNarration.objects.count()
-        risk_stats = DreamNarration.objects.values("risk_level").annotate(count=Count("id")).order_by('-count')
-        sentiment_stats = DreamNarration.objects.values("sentiment").annotate(count=Count("id")).order_by('-count')
-        
-        all_emotions_raw = DreamNarration.objects.values_list('emotion', flat=True)
-        clean_emotions = [str(e) for e in all_emotions_raw if isinstance(e, str)]
-        emotion_counts = Counter(clean_emotions)
-        emotion_stats = [{'emotion': emo, 'count': count} for emo, count in emotion_counts.items()]
-
-        # Chart Generation
-        risk_df = pd.DataFrame(list(risk_stats))
-        risk_chart = None
-        if not risk_df.empty and 'risk_level' in risk_df.columns:
-            fig = px.pie(risk_df, names='risk_level', values='count', title='Risk Level Distribution')
-            fig.update_layout(margin=dict(l=10, r=10, t=40, b=10))
-            risk_chart = fig.to_html(full_html=False, include_plotlyjs='cdn')
-
-        sentiment_df = pd.DataFrame(list(sentiment_stats))
-        sentiment_chart = None
-        if not sentiment_df.empty and 'sentiment' in sentiment_df.columns:
-            fig = px.bar(sentiment_df, x='sentiment', y='count', title='Sentiment Distribution', color='sentiment')
-            fig.update_layout(margin=dict(l=10, r=10, t=40, b=10))
-            sentiment_chart = fig.to_html(full_html=False, include_plotlyjs='cdn')
-            
-        emotion_df = pd.DataFrame(emotion_stats)
-        emotion_chart = None
-        if not emotion_df.empty and 'emotion' in emotion_df.columns:
-            fig = px.bar(emotion_df, x='emotion', y='count', title='Top Emotions', color='emotion')
-            fig.update_layout(margin=dict(l=10, r=10, t=40, b=10))
-            emotion_chart = fig.to_html(full_html=False, include_plotlyjs='cdn')
-
+        start = self._date_param(request, "start")
+        end = self._date_param(request, "end", end_of_day=True)
         context = {
             "title": "Dream Analysis Dashboard",
-            "total_dreams": total_dreams,
-            "risk_chart": risk_chart,
-            "sentiment_chart": sentiment_chart,
-            "emotion_chart": emotion_chart,
+            # Dates that were ignored are not shown as if they applied
+            "start": request.GET.get("start", "") if start else "",
+            "end": request.GET.get("end", "") if end else "",
+            **dashboard_context(start, end),
         }
-        
         return render(request, "admin/dreams/dashboard.html", context)
 
     def changelist_view(self, request, extra_context=None):
@@ -1,127 +1,1046 @@
 # dreams/ai_pipeline.py
+# Importing this module is cheap: transformers, torch, onnxruntime and the NLTK
+# data are only loaded on first use (or by warmup()), so manage.py commands and
+# the admin start without them.
 
-import re
-import nltk
-from collections import Counter
-from transformers import pipeline
+import asyncio
+import os
+import json
+import hashlib
+import queue
+import socket
+import threading
+import time
+import weakref
+import http.client
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlsplit
 from django.conf import settings
-
-# --- Pre-download NLTK data on module load ---
-try:
-    nltk.data.find('tokenizers/punkt')
-except LookupError:
-    print("NLTK 'punkt' tokenizer not found. Downloading...")
-    nltk.download('punkt', quiet=True)
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    print("NLTK 'stopwords' not found. Downloading...")
-    nltk.download('stopwords', quiet=True)
-# -----------------------------------------------
+from . import analysis_cache, embeddings, keywords, metrics, risk
 
 # --- Model Loading Configuration ---
-AI_MODELS_DIR = settings.BASE_DIR / 'ai_models'
+AI_MODELS_DIR = Path(getattr(settings, "DREAM_AI_MODELS_DIR", "") or settings.BASE_DIR / 'ai_models')
 SENTIMENT_MODEL_PATH = AI_MODELS_DIR / 'sentiment_model'
 EMOTION_MODEL_PATH = AI_MODELS_DIR / 'emotion_model'
 
+BACKENDS = ("torch", "onnx", "onnx-int8")
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model-int8.onnx"}
+
+def _backend():
+    return getattr(settings, "DREAM_INFERENCE_BACKEND", "torch")
+
+def _uses_sigmoid(config):
+    # Same rule transformers uses to pick a text-classification output activation
+    return config.problem_type == "multi_label_classification" or config.num_labels == 1
+
+def _activate(logits, sigmoid):
+    logits = logits.astype(np.float64)
+    if sigmoid:
+        return 1.0 / (1.0 + np.exp(-logits))
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return shifted / shifted.sum(axis=-1, keepdims=True)
+
+def _model_labels(config):
+    return [config.id2label[i] for i in range(config.num_labels)]
+
+def _emotion_labels(emotion_pipe):
+    config = emotion_pipe.model.config if hasattr(emotion_pipe, "model") else emotion_pipe.config
+    return [label.lower() for label in _model_labels(config)]
+
+class OnnxTextClassifier:
+    """
+    Runs a model exported by `download_models.py --onnx` with onnxruntime.
+
+    Called like a transformers text-classification pipeline and returns the same
+    [{"label", "score"}, ...] lists, so the rest of the analysis code does not care
+    which backend produced the scores.
+    """
+    def __init__(self, model_dir, onnx_path, top_k=1):
+        import onnxruntime
+        from transformers import AutoConfig, AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.config = AutoConfig.from_pretrained(model_dir)
+        options = onnxruntime.SessionOptions()
+        if _torch_threads() > 0:
+            options.intra_op_num_threads = _torch_threads()
+        self.session = onnxruntime.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.top_k = top_k
+        self.labels = _model_labels(self.config)
+
+    def scores_for(self, encoded):
+        """Class probabilities (batch x labels) for already-tokenized numpy inputs."""
+        feeds = {name: encoded[name].astype(np.int64) for name in self.input_names}
+        return _activate(self.session.run(None, feeds)[0], _uses_sigmoid(self.config))
+
+    def __call__(self, inputs, batch_size=8, truncation=True, max_length=512, top_k="default"):
+        top_k = self.top_k if top_k == "default" else top_k
+        single = isinstance(inputs, str)
+        texts = [inputs] if single else list(inputs)
+        outputs = []
+        for start in range(0, len(texts), max(1, batch_size)):
+            encoded = self.tokenizer(
+                texts[start:start + batch_size], padding=True, truncation=truncation,
+                max_length=max_length, return_tensors="np",
+            )
+            for row in self.scores_for(encoded):
+                ranked = sorted(
+                    ({"label": label, "score": float(score)} for label, score in zip(self.labels, row)),
+                    key=lambda d: d["score"], reverse=True,
+                )
+                if top_k is None:
+                    outputs.append(ranked)
+                elif top_k == 1:
+                    outputs.append(ranked[0])
+                else:
+                    outputs.append(ranked[:top_k])
+        return outputs[0] if single else outputs
+
+def _load_classifier(task, model_path, backend, top_k):
+    if backend == "torch":
+        from transformers import pipeline
+        if top_k == 1:
+            return pipeline(task, model=model_path)
+        return pipeline(task, model=model_path, top_k=top_k)
+    if backend in ONNX_FILES:
+        onnx_path = Path(model_path) / "onnx" / ONNX_FILES[backend]
+        if not onnx_path.exists():
+            raise FileNotFoundError(f"{onnx_path} not found; run `python download_models.py --onnx --quantize` first.")
+        return OnnxTextClassifier(model_path, onnx_path, top_k=top_k)
+    raise ValueError(f"Unknown inference backend {backend!r}; expected one of {', '.join(BACKENDS)}.")
+
+def _torch_threads():
+    return int(getattr(settings, "DREAM_TORCH_THREADS", 0))
+
+def configure_threads():
+    """
+    Caps torch's intra-op threads at DREAM_TORCH_THREADS (0 keeps torch's default of
+    one per core), so several worker processes don't oversubscribe the CPU.
+    """
+    if _torch_threads() > 0 and _backend() == "torch":
+        import torch
+        torch.set_num_threads(_torch_threads())
+
+def load_pipelines(backend):
+    """
+    Loads a fresh (sentiment, emotion) pair for the given backend. Raises on failure.
+    """
+    print(f"Loading sentiment model ({backend}) from local path: {SENTIMENT_MODEL_PATH}")
+    sentiment_pipe = _load_classifier("sentiment-analysis", SENTIMENT_MODEL_PATH, backend, top_k=1)
+    print(f"Loading emotion model ({backend}) from local path: {EMOTION_MODEL_PATH}")
+    emotion_pipe = _load_classifier("text-classification", EMOTION_MODEL_PATH, backend, top_k=None)
+    return sentiment_pipe, emotion_pipe
+
 # --- Lazy Loading of Models ---
 _sentiment_pipe = None
 _emotion_pipe = None
 
 def get_pipelines():
     """
-    Loads the Hugging Face pipelines from the specified local model paths.
+    Loads the pipelines for DREAM_INFERENCE_BACKEND ("torch", "onnx" or "onnx-int8")
+    from the specified local model paths.
     """
     global _sentiment_pipe, _emotion_pipe
     try:
-        if _sentiment_pipe is None:
-            print(f"Loading sentiment model from local path: {SENTIMENT_MODEL_PATH}")
-            _sentiment_pipe = pipeline("sentiment-analysis", model=SENTIMENT_MODEL_PATH)
-        
-        if _emotion_pipe is None:
-            print(f"Loading emotion model from local path: {EMOTION_MODEL_PATH}")
-            _emotion_pipe = pipeline("text-classification", model=EMOTION_MODEL_PATH, top_k=None)
-            
+        if _sentiment_pipe is None or _emotion_pipe is None:
+            configure_threads()
+            _sentiment_pipe, _emotion_pipe = load_pipelines(_backend())
         return _sentiment_pipe, _emotion_pipe
     except Exception as e:
-        print(f"CRITICAL ERROR: Could not load AI models from 'ai_models' directory. {e}")
+        print(f"CRITICAL ERROR: Could not load AI models from {AI_MODELS_DIR}. {e}")
         return None, None
 
+# --- Preloading ---
+# With DREAM_PRELOAD_MODELS the gunicorn master loads the models once before
+# forking (see gunicorn.conf.py). Workers then share the weight pages copy-on-write
+# as long as nothing writes to them: inference only reads the tensors, and
+# gc.freeze() keeps the collector from touching the model objects' headers.
+_preloaded = False
+
+def preload():
+    """
+    Loads the models in the parent process before workers are forked. Torch is held
+    to one thread here so no OpenMP pool exists at fork time; each worker sets its
+    own count in after_fork(). Only the torch backend is preloaded, since
+    onnxruntime sessions own threads that don't survive a fork.
+    """
+    global _preloaded, _sentiment_pipe, _emotion_pipe
+    if get_inference_client() is not None:
+        print("DREAM_INFERENCE_SERVER is set; models are not loaded in the web processes.")
+        return False
+    if _backend() != "torch":
+        print(f"Preloading is only supported for the torch backend; {_backend()} workers load their own models.")
+        return False
+    import gc
+    import torch
+    torch.set_num_threads(1)
+    try:
+        sentiment_pipe, emotion_pipe = load_pipelines("torch")
+    except Exception as e:
+        print(f"CRITICAL ERROR: Could not preload AI models. {e}")
+        return False
+    _sentiment_pipe, _emotion_pipe = sentiment_pipe, emotion_pipe
+    # Tokenizer comparison is cached here rather than redone in every worker
+    _shared_tokenizer(sentiment_pipe, emotion_pipe)
+    gc.collect()
+    gc.freeze()
+    _preloaded = True
+    return True
+
+def after_fork():
+    """Per-worker setup after forking from a preloading parent."""
+    if _preloaded:
+        configure_threads()
+
+WARMUP_TEXT = "I was walking through a quiet house at night when the lights went out and I woke up."
+
+def warmup(whisper=False, models=None):
+    """
+    Loads the models and runs one throwaway inference so the first real request
+    doesn't pay for imports, weight loading and lazy kernel initialization.
+    Bypasses the result cache and the micro-batcher. Returns seconds taken per step.
+
+    By default the models are only loaded when this process analyzes dreams itself:
+    with DREAM_ANALYSIS_ASYNC on, web processes queue the work for
+    run_analysis_worker and would otherwise hold a copy they never use.
+    Pass models=True to load them regardless.
+    """
+    if models is None:
+        models = not getattr(settings, "DREAM_ANALYSIS_ASYNC", True)
+    timings = {}
+    started = time.perf_counter()
+    if models and get_inference_client() is None:
+        sentiment_pipe, emotion_pipe = get_pipelines()
+        if not sentiment_pipe or not emotion_pipe:
+            raise RuntimeError("AI models could not be loaded; see the error above.")
+        timings["load_models"] = time.perf_counter() - started
+        started = time.perf_counter()
+        result = run_inference([WARMUP_TEXT])[0]
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        timings["first_inference"] = time.perf_counter() - started
+    else:
+        # Models live in the inference server or the analysis worker; only the
+        # local helpers need loading
+        keywords.stopwords()
+        risk.get_risk_model()
+        timings["keywords_and_risk"] = time.perf_counter() - started
+    if whisper:
+        from . import audio
+        started = time.perf_counter()
+        audio.get_whisper_model()
+        timings["load_whisper"] = time.perf_counter() - started
+    return timings
+
 # --- Risk Rules ---
-RISK_RULES = {
-    "PTSD": {"fear": 0.6, "sadness": 0.3, "surprise": 0.2, "disgust": 0.1},
-    "Depression": {"sadness": 0.7, "grief": 0.4, "remorse": 0.2, "neutral": 0.1},
-    "Anxiety": {"fear": 0.7, "nervousness": 0.5, "confusion": 0.2, "surprise": 0.1},
-}
+# Kept importable from here; the rules and thresholds now live in dreams/risk.py
+RISK_RULES = risk.RISK_RULES
+
+# --- Model Versioning ---
+_version_lock = threading.Lock()
+_version = None
+_version_checked_at = 0.0
+
+def _files_signature(root):
+    entries = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((os.path.relpath(path, root), stat.st_size, stat.st_mtime_ns))
+    return sorted(entries)
+
+def model_version():
+    """
+    Short fingerprint of everything that determines an analysis result: the model
+    files under ai_models/, the chunking settings, RISK_RULES and whether an
+    embedding is emitted. Re-checked at most
+    every DREAM_MODEL_VERSION_TTL seconds, so replacing a model invalidates cached
+    results without a restart.
+    """
+    global _version, _version_checked_at
+    ttl = float(getattr(settings, "DREAM_MODEL_VERSION_TTL", 30))
+    with _version_lock:
+        if _version is None or time.monotonic() - _version_checked_at > ttl:
+            signature = {
+                "sentiment": _files_signature(SENTIMENT_MODEL_PATH),
+                "emotion": _files_signature(EMOTION_MODEL_PATH),
+                "backend": _backend(),
+                "shared_tokenization": bool(getattr(settings, "DREAM_SHARED_TOKENIZATION", True)),
+                "chunking": [_chunking_enabled(), _max_tokens(),
+                             getattr(settings, "DREAM_CHUNK_STRIDE", 64),
+                             getattr(settings, "DREAM_CHUNK_AGGREGATION", "mean")],
+                "risk_rules": risk.get_risk_model().fingerprint,
+                "keyword_scoring": getattr(settings, "DREAM_KEYWORD_SCORING", "tfidf"),
+                # Cached results from before embeddings were turned on have none to index
+                "embeddings": embeddings.SOURCE if embeddings.enabled() else None,
+            }
+            blob = json.dumps(signature, sort_keys=True).encode("utf-8")
+            _version = hashlib.sha256(blob).hexdigest()[:16]
+            _version_checked_at = time.monotonic()
+        return _version
 
 # --- Keyword Extraction ---
 def extract_keywords(text, top_k=10):
+    """Top keywords of one text; see dreams.keywords for the batch API."""
+    return extract_keywords_batch([text], top_k)[0]
+
+def extract_keywords_batch(texts, top_k=10):
     try:
-        stop_words = set(nltk.corpus.stopwords.words("english"))
-        text = re.sub(r"[^a-zA-Z\s]", "", text.lower())
-        tokens = nltk.word_tokenize(text)
-        meaningful_tokens = [t for t in tokens if t not in stop_words and len(t) > 2]
-        counts = Counter(meaningful_tokens)
-        return [w for w, _ in counts.most_common(top_k)]
+        return keywords.extract_keywords_batch(texts, top_k)
     except Exception as e:
         print(f"Error during keyword extraction: {e}")
-        return []
+        return [[] for _ in texts]
 
-# --- MAIN ANALYSIS FUNCTION ---
-def analyze_dream(text: str) -> dict:
+# --- Result Builders ---
+def _unavailable_result(reason="models_unavailable"):
+    metrics.ERRORS.inc(reason=reason)
+    return {
+        "error": "AI models are not available. Please check server logs.",
+        "sentiment_label": "Error", "emotion_summary": {}, "analysis_json": {},
+        "potential_condition": "Error", "risk_level": "Unknown",
+    }
+
+def error_result(e):
+    """The result reported in place of an analysis that raised `e` (never cached)."""
+    metrics.ERRORS.inc(reason="exception")
+    return {
+        "error": f"An error occurred during analysis: {e}",
+        "sentiment_label": "Error", "emotion_summary": {}, "analysis_json": {"error": str(e)},
+        "potential_condition": "Error", "risk_level": "Unknown",
+    }
+
+def _build_result(sentiment_scores, emo_scores, coverage, risk_details, extracted_keywords, embedding=None):
+    """
+    Turns the (aggregated) sentiment and emotion scores for a single text, plus its
+    risk scores from dreams.risk and keywords, into the analysis result dict.
+    The text's embedding, when there is one, is carried base64-encoded under
+    "embedding" (it is indexed, not stored on the dream).
+    """
+    sentiment_mapping = {'LABEL_0': 'Negative', 'LABEL_1': 'Neutral', 'LABEL_2': 'Positive'}
+    raw_label = max(sentiment_scores, key=sentiment_scores.get)
+    sentiment_label = sentiment_mapping.get(raw_label, raw_label)
+
+    analysis_details = {
+        "sentiment_details": {'label': sentiment_label, 'score': sentiment_scores[raw_label]},
+        "emotion_scores": emo_scores,
+        "risk_scores_by_condition": risk_details["risk_scores_by_condition"],
+        "top_condition_details": risk_details["top_condition_details"],
+        "extracted_keywords": extracted_keywords,
+    }
+    if coverage:
+        analysis_details["coverage"] = coverage
+    analysis_details["model_version"] = model_version()
+    # Lets reanalyze_dreams --risk-only --outdated find dreams scored with older rules
+    analysis_details["risk_version"] = risk.get_risk_model().fingerprint
+
+    result = {
+        "sentiment_label": sentiment_label,
+        "emotion_summary": emo_scores,
+        "analysis_json": analysis_details,
+        "potential_condition": risk_details["potential_condition"],
+        "risk_level": risk_details["risk_level"],
+    }
+    if embedding is not None:
+        result["embedding"] = embeddings.encode(embedding)
+    return result
+
+def primary_emotion(emotion_summary):
+    """Returns the highest-scoring emotion label, or "N/A" when there are no scores."""
+    if isinstance(emotion_summary, dict) and emotion_summary:
+        return max(emotion_summary, key=emotion_summary.get)
+    return "N/A"
+
+# --- Batched Inference ---
+def _max_batch_size():
+    return max(1, int(getattr(settings, "DREAM_BATCH_MAX_SIZE", 16)))
+
+def _chunking_enabled():
+    return bool(getattr(settings, "DREAM_CHUNKING", True))
+
+def _max_tokens():
+    return int(getattr(settings, "DREAM_MAX_TOKENS", 512))
+
+def _window_spans(n_tokens, max_tokens, stride):
+    """(start, end) token ranges of the overlapping windows covering n_tokens tokens."""
+    if n_tokens <= max_tokens:
+        return [(0, n_tokens)]
+    spans, start = [], 0
+    while True:
+        end = min(start + max_tokens, n_tokens)
+        spans.append((start, end))
+        if end == n_tokens:
+            return spans
+        start = end - stride
+
+def _window_limits(tokenizer):
+    max_tokens = _max_tokens() - tokenizer.num_special_tokens_to_add()
+    stride = min(int(getattr(settings, "DREAM_CHUNK_STRIDE", 64)), max_tokens // 2)
+    return max_tokens, stride
+
+def _split_into_windows(tokenizer, texts):
+    """
+    Tokenizes all texts once and cuts each into overlapping windows of at most
+    DREAM_MAX_TOKENS tokens (special tokens included), overlapping by
+    DREAM_CHUNK_STRIDE tokens.
+
+    Returns (windows, owners, weights): the window strings, the index of the text
+    each window came from, and each window's token count.
+    """
+    max_tokens, stride = _window_limits(tokenizer)
+    encodings = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True)
+
+    windows, owners, weights = [], [], []
+    for index, (text, offsets) in enumerate(zip(texts, encodings["offset_mapping"])):
+        spans = _window_spans(len(offsets), max_tokens, stride)
+        for start, end in spans:
+            windows.append(text if len(spans) == 1 else text[offsets[start][0]:offsets[end - 1][1]])
+            owners.append(index)
+            weights.append(max(end - start, 1))
+    return windows, owners, weights
+
+def _split_into_token_windows(tokenizer, texts):
+    """
+    Like _split_into_windows, but returns the token ids of each window instead of
+    its text, so the ids can be fed to both models without tokenizing again.
+    Without DREAM_CHUNKING each text becomes a single truncated window.
+    """
+    max_tokens, stride = _window_limits(tokenizer)
+    encodings = tokenizer(texts, add_special_tokens=False)["input_ids"]
+
+    windows, owners, weights = [], [], []
+    for index, ids in enumerate(encodings):
+        spans = _window_spans(len(ids), max_tokens, stride) if _chunking_enabled() else [(0, min(len(ids), max_tokens))]
+        for start, end in spans:
+            windows.append(ids[start:end])
+            owners.append(index)
+            weights.append(max(end - start, 1))
+    return windows, owners, weights
+
+def _aggregate_scores(score_lists, weights, how):
+    """
+    Combines per-window [{label, score}, ...] outputs into one {label: score} dict,
+    using a token-weighted mean or the per-label maximum.
+    """
+    if len(score_lists) == 1:
+        return {d["label"]: d["score"] for d in score_lists[0]}
+    combined = {}
+    if how == "max":
+        for scores in score_lists:
+            for d in scores:
+                combined[d["label"]] = max(combined.get(d["label"], 0.0), d["score"])
+        return combined
+    total = float(sum(weights))
+    for scores, weight in zip(score_lists, weights):
+        for d in scores:
+            combined[d["label"]] = combined.get(d["label"], 0.0) + d["score"] * weight / total
+    return combined
+
+# --- Shared Tokenization ---
+_executor = None
+_executor_pid = None
+_compatible_tokenizers = {}
+
+def _get_executor():
+    """Two-thread pool that runs the sentiment and emotion models side by side."""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="dream-inference")
+        _executor_pid = os.getpid()
+    return _executor
+
+def _shared_tokenizer(sentiment_pipe, emotion_pipe):
+    """
+    Returns the tokenizer both models can share (identical vocabularies), or None.
+    Both default models are roberta-base fine-tunes, so they normally match.
+    """
+    if not getattr(settings, "DREAM_SHARED_TOKENIZATION", True):
+        return None
+    key = (id(sentiment_pipe.tokenizer), id(emotion_pipe.tokenizer))
+    if key not in _compatible_tokenizers:
+        a, b = sentiment_pipe.tokenizer, emotion_pipe.tokenizer
+        _compatible_tokenizers[key] = (
+            getattr(b, "is_fast", False)
+            and a.get_vocab() == b.get_vocab()
+            and a.pad_token_id == b.pad_token_id
+            and _special_tokens(a) == _special_tokens(b)
+        )
+    return emotion_pipe.tokenizer if _compatible_tokenizers[key] else None
+
+def _special_tokens(tokenizer):
+    """(prefix, suffix) ids the tokenizer wraps around a single sequence, e.g. <s> ... </s>."""
+    ids = tokenizer("")["input_ids"]
+    if ids and ids[0] == tokenizer.cls_token_id:
+        return ids[:1], ids[1:]
+    return [], ids
+
+def _pad_batch(tokenizer, batch_ids):
+    prefix, suffix = _special_tokens(tokenizer)
+    inputs = [prefix + ids + suffix for ids in batch_ids]
+    input_ids = np.full((len(inputs), max(len(ids) for ids in inputs)), tokenizer.pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros_like(input_ids)
+    for row, ids in enumerate(inputs):
+        input_ids[row, :len(ids)] = ids
+        attention_mask[row, :len(ids)] = 1
+    return {"input_ids": input_ids, "attention_mask": attention_mask}
+
+def _encoded_scores(pipe, encoded, pooled=False):
+    """
+    Class probabilities (batch x labels) for one padded batch of token ids. With
+    `pooled`, returns (probabilities, embeddings): the encoder's last hidden state
+    mean-pooled over each row's tokens, from the same forward pass (None for ONNX,
+    whose exported graph only outputs logits).
+    """
+    if isinstance(pipe, OnnxTextClassifier):
+        scores = pipe.scores_for(encoded)
+        return (scores, None) if pooled else scores
+    import torch
+    with torch.inference_mode():
+        inputs = {name: torch.from_numpy(array).to(pipe.device) for name, array in encoded.items()}
+        outputs = pipe.model(**inputs, output_hidden_states=pooled)
+        if pooled:
+            mask = inputs["attention_mask"].unsqueeze(-1).to(outputs.hidden_states[-1].dtype)
+            summed = (outputs.hidden_states[-1] * mask).sum(dim=1)
+            hidden = (summed / mask.sum(dim=1).clamp(min=1)).float().cpu().numpy()
+    scores = _activate(outputs.logits.float().cpu().numpy(), _uses_sigmoid(pipe.model.config))
+    return (scores, hidden) if pooled else scores
+
+def _classify_batches(pipe, batches, pooled=False):
+    """
+    [{label, score}, ...] per row of the batches; with `pooled`, returns
+    (outputs, embeddings) where embeddings holds one vector (or None) per row.
+    """
+    labels = _model_labels(pipe.model.config if hasattr(pipe, "model") else pipe.config)
+    outputs, pooled_rows = [], []
+    for encoded in batches:
+        scores, hidden = _encoded_scores(pipe, encoded, pooled=True) if pooled else (_encoded_scores(pipe, encoded), None)
+        for i, row in enumerate(scores):
+            outputs.append([{"label": label, "score": float(score)} for label, score in zip(labels, row)])
+            pooled_rows.append(hidden[i] if hidden is not None else None)
+    return (outputs, pooled_rows) if pooled else outputs
+
+def _timed_call(timer, stage, fn, *args, **kwargs):
+    with timer.stage(stage):
+        return fn(*args, **kwargs)
+
+def _length_sorted_batches(tokenizer, windows):
+    """(order, batches): window indexes sorted by length and their padded batches."""
+    order = sorted(range(len(windows)), key=lambda i: len(windows[i]))
+    batch_size = _max_batch_size()
+    batches = [
+        _pad_batch(tokenizer, [windows[i] for i in order[start:start + batch_size]])
+        for start in range(0, len(order), batch_size)
+    ]
+    return order, batches
+
+def _run_shared(sentiment_pipe, emotion_pipe, tokenizer, windows, timer):
+    """
+    Pads the already-tokenized windows into length-sorted batches once and runs
+    both models over the same input ids concurrently. With DREAM_EMBEDDINGS_ENABLED
+    the emotion pass also returns each window's pooled embedding.
+    """
+    with timer.stage("tokenize"):
+        order, batches = _length_sorted_batches(tokenizer, windows)
+    pooled = embeddings.enabled()
+    executor = _get_executor()
+    sentiment_future = executor.submit(_timed_call, timer, "sentiment", _classify_batches, sentiment_pipe, batches)
+    emotion_future = executor.submit(
+        _timed_call, timer, "emotion", _classify_batches, emotion_pipe, batches, pooled=pooled,
+    )
+    emotion_output = emotion_future.result()
+    emotion_rows, pooled_rows = emotion_output if pooled else (emotion_output, [None] * len(windows))
+    sentiments, emotions, window_embeddings = [None] * len(windows), [None] * len(windows), [None] * len(windows)
+    for position, sent, emo, vector in zip(order, sentiment_future.result(), emotion_rows, pooled_rows):
+        sentiments[position] = sent
+        emotions[position] = emo
+        window_embeddings[position] = vector
+    return sentiments, emotions, window_embeddings
+
+def _run_separate(sentiment_pipe, emotion_pipe, windows, timer):
+    """
+    Runs each pipeline (with its own tokenizer) on the window texts, concurrently.
+    Each model's stage time includes its own tokenization here. No embeddings are
+    produced on this path (the pipelines don't expose hidden states).
+    """
+    batch_size = min(len(windows), _max_batch_size())
+    tokenizer_kwargs = {"truncation": True, "max_length": _max_tokens()}
+    executor = _get_executor()
+    sentiment_future = executor.submit(
+        _timed_call, timer, "sentiment", sentiment_pipe, windows, batch_size=batch_size, top_k=None, **tokenizer_kwargs,
+    )
+    emotion_future = executor.submit(
+        _timed_call, timer, "emotion", emotion_pipe, windows, batch_size=batch_size, **tokenizer_kwargs,
+    )
+    return sentiment_future.result(), emotion_future.result(), [None] * len(windows)
+
+def _pool_windows(vectors, weights):
+    """Token-weighted mean of a text's window embeddings, or None if any is missing."""
+    if not vectors or any(vector is None for vector in vectors):
+        return None
+    if len(vectors) == 1:
+        return vectors[0]
+    return np.average(np.stack(vectors), axis=0, weights=weights)
+
+def _score_texts(sentiment_pipe, emotion_pipe, texts, timer=None):
+    """
+    Runs both classifiers over the texts (chunked or truncated) and returns one
+    (sentiment_scores, emotion_scores, coverage, embedding) tuple per text.
+
+    When the two models share a vocabulary (DREAM_SHARED_TOKENIZATION), texts are
+    tokenized once and the same input ids are fed to both models. Only that path
+    yields embeddings; otherwise (or with DREAM_EMBEDDINGS_ENABLED off) they are None.
+    """
+    timer = timer or metrics.StageTimer()
+    tokenizer = _shared_tokenizer(sentiment_pipe, emotion_pipe)
+    if tokenizer is not None:
+        with timer.stage("tokenize"):
+            windows, owners, weights = _split_into_token_windows(tokenizer, texts)
+        sentiments, emotions, window_embeddings = _run_shared(sentiment_pipe, emotion_pipe, tokenizer, windows, timer)
+    else:
+        with timer.stage("tokenize"):
+            if _chunking_enabled() and getattr(emotion_pipe.tokenizer, "is_fast", False):
+                windows, owners, weights = _split_into_windows(emotion_pipe.tokenizer, texts)
+            else:
+                windows, owners, weights = texts, list(range(len(texts))), [1] * len(texts)
+        sentiments, emotions, window_embeddings = _run_separate(sentiment_pipe, emotion_pipe, windows, timer)
+
+    grouped = [([], [], [], []) for _ in texts]
+    for owner, weight, sent, emo, vector in zip(owners, weights, sentiments, emotions, window_embeddings):
+        grouped[owner][0].append(sent)
+        grouped[owner][1].append(emo)
+        grouped[owner][2].append(weight)
+        grouped[owner][3].append(vector)
+
+    how = getattr(settings, "DREAM_CHUNK_AGGREGATION", "mean")
+    scored = []
+    for sents, emos, text_weights, vectors in grouped:
+        sentiment_scores = _aggregate_scores(sents, text_weights, how)
+        emo_scores = {label.lower(): score for label, score in _aggregate_scores(emos, text_weights, how).items()}
+        coverage = {"windows": len(text_weights), "aggregation": how} if len(text_weights) > 1 else None
+        scored.append((sentiment_scores, emo_scores, coverage, _pool_windows(vectors, text_weights)))
+    return scored
+
+def run_inference(texts):
+    """
+    Runs both pipelines once over the whole list of texts (padded batches of up to
+    DREAM_BATCH_MAX_SIZE) and returns one result dict per text, in input order.
+
+    With DREAM_CHUNKING on, long texts are split into overlapping token windows
+    that are batched together and their scores aggregated per text
+    (DREAM_CHUNK_AGGREGATION: "mean" or "max"), so the whole narration is analyzed.
+    Otherwise each text is truncated to DREAM_MAX_TOKENS tokens.
+
+    Each result's analysis_json["timings_ms"] holds the per-stage breakdown of
+    the batch it was computed in (see dreams.metrics).
+    """
+    texts = list(texts)
+    if not texts:
+        return []
     sentiment_pipe, emotion_pipe = get_pipelines()
     if not sentiment_pipe or not emotion_pipe:
-        return {
-            "error": "AI models are not available. Please check server logs.",
-            "sentiment_label": "Error", "emotion_summary": {}, "analysis_json": {},
-            "potential_condition": "Error", "risk_level": "Unknown",
-        }
+        return [_unavailable_result() for _ in texts]
+    metrics.TEXTS.inc(len(texts))
+    metrics.BATCH_SIZE.observe(len(texts), source="inference")
+    timer = metrics.StageTimer()
     try:
-        text_short = text[:512]
-        sent = sentiment_pipe(text_short)[0]
-        emotions_raw = emotion_pipe(text_short)
-        
-        if isinstance(emotions_raw, list) and isinstance(emotions_raw[0], list):
-            emotions_raw = emotions_raw[0]
-        emo_scores = {d["label"].lower(): d["score"] for d in emotions_raw}
-
-        sentiment_mapping = {'LABEL_0': 'Negative', 'LABEL_1': 'Neutral', 'LABEL_2': 'Positive'}
-        sentiment_label = sentiment_mapping.get(sent.get('label'), sent.get('label'))
-
-        risks = {}
-        for cond, weights in RISK_RULES.items():
-            score = 0.0
-            for emo, w in weights.items():
-                score += emo_scores.get(emo, 0.0) * w
-            risks[cond] = round(score, 4)
-        top_condition = max(risks.items(), key=lambda kv: kv[1])[0]
-        top_score = risks[top_condition]
-
-        if top_score >= 0.5: risk_level = "High"
-        elif top_score >= 0.25: risk_level = "Moderate"
-        else: risk_level = "Low"
-        potential_condition = top_condition if top_score > 0.25 else "None"
-
-        analysis_details = {
-            "sentiment_details": {'label': sentiment_label, 'score': sent.get('score')},
-            "emotion_scores": emo_scores,
-            "risk_scores_by_condition": risks,
-            "top_condition_details": {"name": top_condition, "score": top_score},
-            "extracted_keywords": extract_keywords(text),
-        }
-
-        return {
-            "sentiment_label": sentiment_label,
-            "emotion_summary": emo_scores,
-            "analysis_json": analysis_details,
-            "potential_condition": potential_condition,
-            "risk_level": risk_level,
-        }
+        scored = _score_texts(sentiment_pipe, emotion_pipe, texts, timer)
+        with timer.stage("risk"):
+            risk_model = risk.get_risk_model(_emotion_labels(emotion_pipe))
+            risks = risk_model.classify([emo_scores for _, emo_scores, _, _ in scored])
+        with timer.stage("keywords"):
+            batch_keywords = extract_keywords_batch(texts)
+        results = [
+            _build_result(sentiment_scores, emo_scores, coverage, risk_details, text_keywords, embedding)
+            for (sentiment_scores, emo_scores, coverage, embedding), risk_details, text_keywords
+            in zip(scored, risks, batch_keywords)
+        ]
+        timings = timer.finish(batch_size=len(texts))
+        for result in results:
+            result["analysis_json"]["timings_ms"] = dict(timings)
+        return results
     except Exception as e:
         print(f"An error occurred during analysis: {e}")
-        return {
-            "error": f"An error occurred during analysis: {e}",
-            "sentiment_label": "Error", "emotion_summary": {}, "analysis_json": {"error": str(e)},
-            "potential_condition": "Error", "risk_level": "Unknown",
-        }
\ No newline at end of file
+        return [error_result(e) for _ in texts]
+
+def compare_backends(texts, backend, reference="torch"):
+    """
+    Scores the texts with two backends and reports the largest absolute difference
+    in any sentiment or emotion score, plus how often the top labels disagree.
+    """
+    texts = list(texts)
+    expected = _score_texts(*load_pipelines(reference), texts)
+    actual = _score_texts(*load_pipelines(backend), texts)
+    report = {"texts": len(texts), "max_sentiment_deviation": 0.0, "max_emotion_deviation": 0.0,
+              "sentiment_label_mismatches": 0, "primary_emotion_mismatches": 0}
+    for (exp_sent, exp_emo, _, _), (act_sent, act_emo, _, _) in zip(expected, actual):
+        for label, score in exp_sent.items():
+            report["max_sentiment_deviation"] = max(report["max_sentiment_deviation"], abs(score - act_sent.get(label, 0.0)))
+        for label, score in exp_emo.items():
+            report["max_emotion_deviation"] = max(report["max_emotion_deviation"], abs(score - act_emo.get(label, 0.0)))
+        if max(exp_sent, key=exp_sent.get) != max(act_sent, key=act_sent.get):
+            report["sentiment_label_mismatches"] += 1
+        if primary_emotion(exp_emo) != primary_emotion(act_emo):
+            report["primary_emotion_mismatches"] += 1
+    return report
+
+def embed_texts(texts):
+    """
+    Embeddings of the texts from the emotion model's encoder alone (no sentiment
+    model, risk or keywords), pooled exactly as during analysis. Used by
+    `rebuild_embedding_index`; needs the torch backend. Returns a float32 matrix.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    _, emotion_pipe = get_pipelines()
+    if emotion_pipe is None:
+        raise RuntimeError("AI models could not be loaded; see the error above.")
+    if isinstance(emotion_pipe, OnnxTextClassifier):
+        raise RuntimeError("Embeddings need the torch backend (ONNX exports only output logits).")
+    windows, owners, weights = _split_into_token_windows(emotion_pipe.tokenizer, texts)
+    order, batches = _length_sorted_batches(emotion_pipe.tokenizer, windows)
+    _, pooled_rows = _classify_batches(emotion_pipe, batches, pooled=True)
+    grouped = [([], []) for _ in texts]
+    for position, vector in zip(order, pooled_rows):
+        grouped[owners[position]][0].append(vector)
+        grouped[owners[position]][1].append(weights[position])
+    return embeddings.normalize(np.stack([_pool_windows(vectors, text_weights) for vectors, text_weights in grouped]))
+
+class MicroBatcher:
+    """
+    Coalesces concurrent analyze_dream() calls into batched run_inference() calls.
+
+    Callers block on a Future while a background thread collects requests for up to
+    `window_ms` milliseconds (or until `max_batch_size` requests are waiting) and then
+    runs the pipelines once for the whole batch.
+    """
+    def __init__(self, handler, window_ms, max_batch_size):
+        self.handler = handler
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+
+    def submit(self, text):
+        """Queues a single text and blocks until its result dict is ready."""
+        future = Future()
+        self._ensure_worker().put((text, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        # The worker thread does not survive a fork (e.g. gunicorn workers), so
+        # each process starts its own on first use.
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name="dream-micro-batcher", daemon=True
+                )
+                self._thread.start()
+            return self._queue
+
+    def _collect(self, q):
+        batch = [q.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def queue_depth(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _run(self, q):
+        while True:
+            batch = self._collect(q)
+            metrics.BATCH_SIZE.observe(len(batch), source="micro_batcher")
+            try:
+                results = self.handler([text for text, _ in batch])
+            except Exception as e:
+                results = [error_result(e) for _ in batch]
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    """
+    Returns the process-wide MicroBatcher, or None when DREAM_BATCH_WINDOW_MS is 0.
+    """
+    global _batcher
+    window_ms = float(getattr(settings, "DREAM_BATCH_WINDOW_MS", 10))
+    if window_ms <= 0:
+        return None
+    with _batcher_lock:
+        if _batcher is None:
+            _batcher = MicroBatcher(run_inference, window_ms, _max_batch_size())
+        return _batcher
+
+# --- Asyncio Interface ---
+class AsyncBatcher:
+    """
+    asyncio counterpart of MicroBatcher, used by the async views. Awaiting callers
+    queue their text (waiting when `max_pending` are already queued); up to
+    `workers` consumer tasks collect batches of at most `max_batch_size` texts and
+    run each on a bounded thread pool, so the event loop keeps serving requests
+    while the models run. Texts that arrive during a forward pass make the next
+    batch bigger, and identical texts in a batch are analyzed once.
+    """
+    def __init__(self, handler, window_ms, max_batch_size, workers, max_pending):
+        self.handler = handler
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, max_batch_size)
+        self.workers = max(1, workers)
+        self._queue = asyncio.Queue(maxsize=max(1, max_pending))
+        self._running = 0
+        self._tasks = set()
+
+    async def submit(self, text):
+        """Queues a single text and waits for its result dict."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((text, future))
+        if self._running < self.workers:
+            self._running += 1
+            task = loop.create_task(self._consume())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return await future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    async def _collect(self):
+        if self.window and self._queue.qsize() < self.max_batch_size:
+            await asyncio.sleep(self.window)
+        batch = []
+        while self._queue.qsize() and len(batch) < self.max_batch_size:
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _consume(self):
+        # Runs until the queue is drained; submit() starts a new consumer when needed
+        try:
+            while self._queue.qsize():
+                batch = await self._collect()
+                texts = list(dict.fromkeys(text for text, _ in batch))
+                metrics.BATCH_SIZE.observe(len(texts), source="async_batcher")
+                try:
+                    results = await asyncio.get_running_loop().run_in_executor(
+                        _get_async_executor(), self.handler, texts
+                    )
+                except Exception as e:
+                    results = [error_result(e) for _ in texts]
+                by_text = dict(zip(texts, results))
+                for text, future in batch:
+                    if not future.done():
+                        future.set_result(by_text[text])
+        finally:
+            self._running -= 1
+
+_async_batchers = weakref.WeakKeyDictionary()
+_async_executor = None
+_async_executor_pid = None
+
+def _get_async_executor():
+    """Bounded pool the async batchers run model passes on (DREAM_ASYNC_INFERENCE_THREADS)."""
+    global _async_executor, _async_executor_pid
+    with _batcher_lock:
+        if _async_executor is None or _async_executor_pid != os.getpid():
+            threads = max(1, int(getattr(settings, "DREAM_ASYNC_INFERENCE_THREADS", 1)))
+            _async_executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="dream-async-inference")
+            _async_executor_pid = os.getpid()
+        return _async_executor
+
+def _analyze_collected(texts):
+    """analyze_dreams() for texts the AsyncBatcher already coalesced (skips the MicroBatcher)."""
+    def compute(texts):
+        client = get_inference_client()
+        if client is not None:
+            return _analyze_remote(client, texts)
+        return run_inference(texts)
+
+    if getattr(settings, "DREAM_CACHE_ENABLED", True):
+        return analysis_cache.get_or_compute(texts, model_version(), compute)
+    return compute(texts)
+
+def get_async_batcher():
+    """The AsyncBatcher of the running event loop (one per loop, created on first use)."""
+    loop = asyncio.get_running_loop()
+    with _batcher_lock:
+        batcher = _async_batchers.get(loop)
+        if batcher is None:
+            batcher = _async_batchers[loop] = AsyncBatcher(
+                _analyze_collected,
+                float(getattr(settings, "DREAM_BATCH_WINDOW_MS", 10)),
+                _max_batch_size(),
+                int(getattr(settings, "DREAM_ASYNC_INFERENCE_THREADS", 1)),
+                int(getattr(settings, "DREAM_ASYNC_MAX_PENDING", 1024)),
+            )
+        return batcher
+
+async def aanalyze_dream(text: str) -> dict:
+    """Async analyze_dream(): concurrent callers on this event loop share forward passes."""
+    return await get_async_batcher().submit(text)
+
+async def aanalyze_dreams(texts) -> list:
+    """Async analyze_dreams(), one result dict per text in order."""
+    batcher = get_async_batcher()
+    return list(await asyncio.gather(*(batcher.submit(text) for text in texts)))
+
+# --- Remote Inference Client ---
+class InferenceServerError(Exception):
+    pass
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that talks to a server listening on a Unix domain socket."""
+    def __init__(self, socket_path, timeout):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+class InferenceClient:
+    """
+    Client for `manage.py run_inference_server`.
+
+    `address` is either "http://host:port" or "unix:///path/to/socket". Each thread
+    keeps one keep-alive connection open and reuses it across calls.
+    """
+    def __init__(self, address, timeout):
+        self.address = address
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _new_connection(self):
+        parts = urlsplit(self.address)
+        if parts.scheme == "unix":
+            return _UnixHTTPConnection(parts.path, self.timeout)
+        return http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=self.timeout)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = self._new_connection()
+            self._local.pid = os.getpid()
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def analyze(self, texts):
+        body = json.dumps({"texts": list(texts)}).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request("POST", "/analyze", body, headers)
+                response = conn.getresponse()
+                payload = response.read()
+            except socket.timeout:
+                self._reset()
+                raise
+            except (http.client.HTTPException, ConnectionError):
+                # The server may have closed an idle keep-alive connection; retry once
+                self._reset()
+                if attempt:
+                    raise
+                continue
+            if response.status != 200:
+                raise InferenceServerError(f"Inference server returned HTTP {response.status}: {payload[:200]!r}")
+            return json.loads(payload)["results"]
+
+_client = None
+
+def get_inference_client():
+    """
+    Returns the shared InferenceClient when DREAM_INFERENCE_SERVER is set, else None
+    (models are then loaded in this process).
+    """
+    global _client
+    address = getattr(settings, "DREAM_INFERENCE_SERVER", "")
+    if not address:
+        return None
+    if _client is None or _client.address != address:
+        _client = InferenceClient(address, float(getattr(settings, "DREAM_INFERENCE_TIMEOUT", 30)))
+    return _client
+
+def _analyze_remote(client, texts):
+    try:
+        return client.analyze(texts)
+    except Exception as e:
+        print(f"CRITICAL ERROR: Inference server at {client.address} is unavailable. {e}")
+        return [_unavailable_result("inference_server_unavailable") for _ in texts]
+
+# --- Metrics Collectors ---
+def _collect_batcher_depth():
+    depth = {("thread",): _batcher.queue_depth() if _batcher is not None else 0}
+    depth[("async",)] = sum(batcher.queue_depth() for batcher in list(_async_batchers.values()))
+    return depth
+
+def _collect_cache_events():
+    stats = analysis_cache.stats()
+    return {(event,): stats[event] for event in ("memory_hits", "persistent_hits", "misses", "stores")}
+
+metrics.register_collector(
+    "dream_analysis_batcher_queue_depth", "Texts waiting for the micro-batcher.", "gauge", ["batcher"],
+    _collect_batcher_depth,
+)
+metrics.register_collector(
+    "dream_analysis_cache_events_total", "Result cache lookups and stores.", "counter", ["event"], _collect_cache_events,
+)
+
+# --- MAIN ANALYSIS FUNCTIONS ---
+def analyze_local(texts) -> list:
+    """
+    Analyzes texts with the models loaded in this process. Single texts go through
+    the micro-batcher so concurrent callers share a forward pass.
+    """
+    texts = list(texts)
+    batcher = get_batcher()
+    if len(texts) == 1 and batcher is not None:
+        return [batcher.submit(texts[0])]
+    return run_inference(texts)
+
+def analyze_dream(text: str) -> dict:
+    return analyze_dreams([text])[0]
+
+def _analyze_uncached(texts):
+    client = get_inference_client()
+    if client is not None:
+        return _analyze_remote(client, texts)
+    return analyze_local(texts)
+
+def analyze_dreams(texts) -> list:
+    """
+    Bulk API: analyzes many dreams in padded batches and returns one result dict
+    per text, in the same order as `texts`. Texts analyzed before with the same
+    model version are served from the result cache (DREAM_CACHE_ENABLED).
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    if getattr(settings, "DREAM_CACHE_ENABLED", True):
+        return analysis_cache.get_or_compute(texts, model_version(), _analyze_uncached)
+    return _analyze_uncached(texts)
@@ -0,0 +1,144 @@
+# dreams/analysis_cache.py
+# Content-addressed cache of analyze_dream() results: a bounded in-process LRU in
+# front of a persistent Django cache (see the "dream_analysis" entry in CACHES).
+
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.base import InvalidCacheBackendError
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Canonical form of a narration used for cache keys (NFC, collapsed whitespace)."""
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def cache_key(text, version):
+    digest = hashlib.sha256(f"{version}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+    return f"dream-analysis:{digest}"
+
+
+class LRUCache:
+    """Thread-safe, size-bounded mapping that evicts the least recently used entry."""
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+_memory = LRUCache(int(getattr(settings, "DREAM_CACHE_MEMORY_SIZE", 1024)))
+_stats_lock = threading.Lock()
+_stats = {"memory_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0}
+
+
+def _count(name, amount=1):
+    if amount:
+        with _stats_lock:
+            _stats[name] += amount
+
+
+def stats():
+    """Hit/miss counters for this process, plus the current LRU size."""
+    with _stats_lock:
+        snapshot = dict(_stats)
+    snapshot["memory_entries"] = len(_memory)
+    return snapshot
+
+
+def _persistent():
+    alias = getattr(settings, "DREAM_ANALYSIS_CACHE", "")
+    if not alias:
+        return None
+    try:
+        return caches[alias]
+    except InvalidCacheBackendError:
+        return None
+
+
+def get_or_compute(texts, version, compute):
+    """
+    Returns one analysis result per text, calling `compute(list_of_texts)` only for
+    texts whose (normalized text, model version) has not been seen before.
+
+    Results are stored as JSON so every caller gets its own copy. Error results
+    are never cached. Cached results' timings_ms breakdown is replaced by the
+    cache layer that served them.
+    """
+    keys = [cache_key(text, version) for text in texts]
+    payloads = [_memory.get(key) for key in keys]
+    sources = ["memory" if payload is not None else None for payload in payloads]
+    _count("memory_hits", sum(p is not None for p in payloads))
+
+    persistent = _persistent()
+    missing_keys = [key for key, payload in zip(keys, payloads) if payload is None]
+    if persistent is not None and missing_keys:
+        try:
+            found = persistent.get_many(missing_keys)
+        except Exception as e:
+            print(f"Analysis cache read failed: {e}")
+            found = {}
+        _count("persistent_hits", len(found))
+        for i, key in enumerate(keys):
+            if payloads[i] is None and key in found:
+                payloads[i] = found[key]
+                sources[i] = "persistent"
+                _memory.set(key, found[key])
+
+    # Identical texts within one call are only computed once
+    todo = OrderedDict()
+    for i, (key, payload) in enumerate(zip(keys, payloads)):
+        if payload is None:
+            todo.setdefault(key, []).append(i)
+    _count("misses", len(todo))
+    if todo:
+        computed = compute([texts[indexes[0]] for indexes in todo.values()])
+        to_store = {}
+        for (key, indexes), result in zip(todo.items(), computed):
+            payload = json.dumps(result)
+            for i in indexes:
+                payloads[i] = payload
+            if "error" not in result:
+                _memory.set(key, payload)
+                to_store[key] = payload
+        if persistent is not None and to_store:
+            try:
+                persistent.set_many(to_store, timeout=None)
+            except Exception as e:
+                print(f"Analysis cache write failed: {e}")
+        _count("stores", len(to_store))
+
+    results = [json.loads(payload) for payload in payloads]
+    for result, source in zip(results, sources):
+        if source and isinstance(result.get("analysis_json"), dict) and "timings_ms" in result["analysis_json"]:
+            result["analysis_json"]["timings_ms"] = {"cache_hit": source}
+    return results
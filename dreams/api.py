@@ -0,0 +1,266 @@
+# dreams/api.py
+# Bulk dream ingestion for partner apps, on Django REST framework with token
+# authentication (create a key with `manage.py drf_create_token <username>`).
+#
+#   POST /dreams/api/dreams/bulk/   one {"dream_text": ..., "ref": ...} object per line
+#                                   (Content-Type: application/x-ndjson) or a JSON array
+#                                   of them (application/json)
+#   GET  /dreams/api/batches/<id>/  analysis progress of an earlier POST
+#
+# The body is parsed as a stream, so the request is never held in memory whole.
+# Dreams are inserted in chunks of DREAM_INGEST_CHUNK_SIZE with bulk_create and
+# queued for the analysis worker, or analyzed chunk by chunk in the request when
+# DREAM_ANALYSIS_ASYNC is off. Up to DREAM_INGEST_MAX_ITEMS items are taken per
+# request; the response says where to resume when a body holds more.
+
+import codecs
+import json
+import re
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.decorators import api_view, authentication_classes, parser_classes, permission_classes
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from .jobs import analyze_saved_dreams, enqueue_analysis_bulk
+from .models import AnalysisJob, DreamNarration, IngestBatch, record_changes
+
+READ_SIZE = 64 * 1024
+MAX_REF_LENGTH = 100
+RESULTS_PAGE_SIZE = 1000
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+# --- Streaming parsers ---
+class NDJSONParser(BaseParser):
+    """
+    Newline-delimited JSON. request.data is an iterator with one decoded object
+    per non-empty line; a line that is not valid JSON yields a ParseError in its
+    place, so the other lines are still ingested.
+    """
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return _iter_ndjson(stream)
+
+
+class JSONArrayParser(BaseParser):
+    """
+    A JSON array of objects, decoded one element at a time. request.data is an
+    iterator; malformed JSON raises ParseError from it once reached.
+    """
+    media_type = "application/json"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return _iter_json_array(stream)
+
+
+def _iter_ndjson(stream):
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield ParseError(f"Line {number} is not valid JSON: {e}")
+
+
+def _iter_json_array(stream):
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer, pos, eof = "", 0, False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        chunk = stream.read(READ_SIZE)
+        eof = not chunk
+        try:
+            buffer = buffer[pos:] + utf8.decode(chunk, final=eof)
+        except UnicodeDecodeError as e:
+            raise ParseError(f"Body is not valid UTF-8: {e}")
+        pos = 0
+        return True
+
+    # What comes next: "[", the first element or "]", "," or "]", an element, or nothing
+    expect = "["
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if read_more():
+                continue
+            if expect == "end":
+                return
+            raise ParseError("Empty body." if expect == "[" else "Unexpected end of the JSON array.")
+        char = buffer[pos]
+        if expect == "[":
+            if char != "[":
+                raise ParseError("Expected a JSON array of dreams.")
+            pos += 1
+            expect = "first"
+        elif expect in ("first", ",") and char == "]":
+            pos += 1
+            expect = "end"
+        elif expect == "," and char == ",":
+            pos += 1
+            expect = "item"
+        elif expect in ("first", "item"):
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # Usually an element split across reads
+                if read_more():
+                    continue
+                raise ParseError(f"Invalid JSON: {e}")
+            if end == len(buffer) and read_more():
+                # A number could continue in the next read
+                continue
+            pos = end
+            expect = ","
+            yield item
+        else:
+            raise ParseError(f"Unexpected {char!r} in the JSON array.")
+
+
+# --- Ingestion ---
+def _validate(item):
+    """An error message for an unusable item, else None."""
+    if isinstance(item, ParseError):
+        return str(item.detail)
+    if not isinstance(item, dict):
+        return "Each item must be a JSON object."
+    text = item.get("dream_text")
+    if not isinstance(text, str) or not text.strip():
+        return "dream_text must be a non-empty string."
+    ref = item.get("ref")
+    if ref is not None and (not isinstance(ref, (str, int)) or isinstance(ref, bool) or len(str(ref)) > MAX_REF_LENGTH):
+        return f"ref must be a string or integer of at most {MAX_REF_LENGTH} characters."
+    return None
+
+
+def _insert(pending, user, batch):
+    """Creates the dreams for a chunk of (index, item) pairs and queues or runs their analysis."""
+    if not pending:
+        return []
+    dreams = [
+        DreamNarration(user=user, dream_text=item["dream_text"], risk_level="Pending", ingest_batch=batch)
+        for _, item in pending
+    ]
+    with transaction.atomic():
+        DreamNarration.objects.bulk_create(dreams)
+        # bulk_create bypasses save(), which keeps the dashboard counters in step
+        record_changes(dreams)
+        if settings.DREAM_ANALYSIS_ASYNC:
+            enqueue_analysis_bulk(dreams)
+    if not settings.DREAM_ANALYSIS_ASYNC:
+        analyze_saved_dreams(dreams)
+    return [
+        {"index": index, "ref": item.get("ref"), "dream_id": dream.id}
+        for (index, item), dream in zip(pending, dreams)
+    ]
+
+
+@api_view(["POST"])
+@authentication_classes([TokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+@parser_classes([NDJSONParser, JSONArrayParser])
+def bulk_ingest_view(request):
+    """
+    Ingests the dreams in an NDJSON or JSON-array body for the authenticated
+    user. Invalid items are reported by index and skipped; the rest are created.
+    """
+    items = request.data
+    if isinstance(items, dict):
+        # DRF hands over an empty dict when there is no body
+        raise ParseError("Empty body.")
+
+    max_items = getattr(settings, "DREAM_INGEST_MAX_ITEMS", 25000)
+    chunk_size = getattr(settings, "DREAM_INGEST_CHUNK_SIZE", 1000)
+    batch = IngestBatch.objects.create(user=request.user)
+    created, rejected, pending = [], [], []
+    received, next_index, error = 0, None, None
+    try:
+        for index, item in enumerate(items):
+            if index == max_items:
+                next_index = index
+                break
+            received += 1
+            problem = _validate(item)
+            if problem:
+                rejected.append({"index": index, "ref": item.get("ref") if isinstance(item, dict) else None, "error": problem})
+                continue
+            pending.append((index, item))
+            if len(pending) == chunk_size:
+                created += _insert(pending, request.user, batch)
+                pending = []
+    except ParseError as e:
+        # A malformed JSON array: keep what was read before the error
+        error = str(e.detail)
+    created += _insert(pending, request.user, batch)
+
+    batch.received, batch.created, batch.rejected = received, len(created), len(rejected)
+    batch.save(update_fields=["received", "created", "rejected"])
+    body = {
+        "batch_id": batch.id,
+        "status_url": request.build_absolute_uri(reverse("dreams:api_ingest_batch", args=[batch.id])),
+        "received": received,
+        "created": len(created),
+        "rejected": rejected,
+        "items": created,
+    }
+    if next_index is not None:
+        # Only the first DREAM_INGEST_MAX_ITEMS items were read; resend the rest
+        body["next_index"] = next_index
+    if error:
+        body["error"] = error
+    return Response(body, status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["GET"])
+@authentication_classes([TokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def ingest_batch_view(request, batch_id):
+    """
+    Analysis progress of an ingest batch. With ?results=1 it also lists the
+    analyzed dreams, RESULTS_PAGE_SIZE at a time from ?after=<dream_id>.
+    """
+    batch = get_object_or_404(IngestBatch, id=batch_id, user=request.user)
+    dreams = DreamNarration.objects.filter(ingest_batch=batch)
+    jobs = dict.fromkeys((value for value, _ in AnalysisJob.STATUS_CHOICES), 0)
+    jobs.update(
+        AnalysisJob.objects.filter(dream__ingest_batch=batch, kind=AnalysisJob.ANALYZE)
+        .order_by().values_list("status").annotate(n=Count("id"))
+    )
+    total = dreams.count()
+    pending = dreams.filter(risk_level="Pending").count()
+    body = {
+        "batch_id": batch.id,
+        "created_at": batch.created_at.isoformat(),
+        "received": batch.received,
+        "created": batch.created,
+        "rejected": batch.rejected,
+        "dreams": total,
+        "analyzed": total - pending,
+        "complete": pending == 0,
+        "jobs": jobs,
+    }
+    if request.query_params.get("results") == "1":
+        try:
+            after = int(request.query_params.get("after", 0))
+        except ValueError:
+            raise ParseError("after must be a dream id.")
+        rows = list(
+            dreams.exclude(risk_level="Pending").filter(id__gt=after).order_by("id")
+            .values("id", "sentiment", "primary_emotion", "potential_condition", "risk_level")[:RESULTS_PAGE_SIZE]
+        )
+        body["results"] = [{"dream_id": row.pop("id"), **row} for row in rows]
+        if len(rows) == RESULTS_PAGE_SIZE:
+            body["next"] = f"{request.build_absolute_uri(request.path)}?results=1&after={body['results'][-1]['dream_id']}"
+    return Response(body)
@@ -0,0 +1,114 @@
+# dreams/audio.py
+# Decoding and Whisper transcription of uploaded dream recordings. Recordings are
+# split into fixed-length segments that are decoded and transcribed independently
+# (see the transcription jobs in jobs.py), so memory stays bounded by one segment.
+
+import os
+import threading
+import numpy as np
+from pathlib import Path
+from django.conf import settings
+
+# Whisper works on 16 kHz mono audio in 30 second windows
+SAMPLE_RATE = 16000
+WHISPER_DIR = Path(getattr(settings, "DREAM_AI_MODELS_DIR", "") or settings.BASE_DIR / 'ai_models') / 'whisper'
+
+
+def _segment_seconds():
+    return max(5.0, float(getattr(settings, "DREAM_AUDIO_SEGMENT_SECONDS", 30)))
+
+
+def _max_seconds():
+    return float(getattr(settings, "DREAM_AUDIO_MAX_SECONDS", 1800))
+
+
+# --- Decoding ---
+def probe_duration(path):
+    """Length of a recording in seconds, read from its container without decoding it."""
+    try:
+        import ffmpeg
+        return float(ffmpeg.probe(str(path))["format"]["duration"])
+    except (ImportError, FileNotFoundError):
+        # No ffmpeg binary: formats libsndfile understands still work through librosa
+        import librosa
+        return float(librosa.get_duration(path=str(path)))
+
+
+def decode_segment(path, start, duration):
+    """
+    Decodes and resamples [start, start + duration) seconds of a recording to
+    16 kHz mono float32 samples.
+    """
+    try:
+        import ffmpeg
+        out, _ = (
+            ffmpeg.input(str(path), ss=start, t=duration)
+            .output("-", format="s16le", acodec="pcm_s16le", ac=1, ar=SAMPLE_RATE)
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+    except (ImportError, FileNotFoundError):
+        import librosa
+        samples, _ = librosa.load(str(path), sr=SAMPLE_RATE, mono=True, offset=start, duration=duration)
+        return samples.astype(np.float32)
+
+
+def segment_bounds(duration):
+    """[(start, end), ...] covering a recording in DREAM_AUDIO_SEGMENT_SECONDS pieces."""
+    if duration > _max_seconds():
+        raise ValueError(f"Recording is {duration:.0f}s long; the limit is {_max_seconds():.0f}s.")
+    step = _segment_seconds()
+    bounds = []
+    start = 0.0
+    while start < duration:
+        end = min(duration, start + step)
+        # Fold a short tail into the previous segment instead of transcribing a blip
+        if bounds and end - start < 1.0:
+            bounds[-1] = (bounds[-1][0], end)
+        else:
+            bounds.append((start, end))
+        start = end
+    return bounds
+
+
+# --- Whisper Model ---
+_model = None
+_model_pid = None
+_model_lock = threading.Lock()
+
+
+def _model_path():
+    name = getattr(settings, "DREAM_WHISPER_MODEL", "base")
+    path = Path(name)
+    if path.suffix != ".pt":
+        path = WHISPER_DIR / f"{name}.pt"
+    return path
+
+
+def get_whisper_model():
+    """Loads the locally stored Whisper model once per process."""
+    global _model, _model_pid
+    with _model_lock:
+        if _model is None or _model_pid != os.getpid():
+            import whisper
+
+            path = _model_path()
+            if not path.exists():
+                raise FileNotFoundError(f"Whisper model {path} not found. Run `python download_models.py --whisper`.")
+            print(f"Loading Whisper model from: {path}")
+            _model = whisper.load_model(str(path), device="cpu")
+            _model_pid = os.getpid()
+        return _model
+
+
+def transcribe_segment(path, start, end):
+    """Transcribes one segment of a recording and returns its text."""
+    samples = decode_segment(path, start, end - start)
+    if not samples.size:
+        return ""
+    language = getattr(settings, "DREAM_WHISPER_LANGUAGE", "") or None
+    # Segments are independent, so don't carry text over between windows
+    result = get_whisper_model().transcribe(
+        samples, language=language, fp16=False, condition_on_previous_text=False, verbose=None,
+    )
+    return result["text"].strip()
@@ -0,0 +1,130 @@
+# dreams/dashboard.py
+# Data behind the admin dashboard: distributions are counted in SQL and the
+# rendered chart fragments are cached until the underlying data changes.
+# Plotly is only imported when a chart is actually rendered (a cache miss).
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, Max, Sum
+from .models import DreamNarration, UserDreamStats
+from .rollups import trend
+
+# (column, chart title, chart kind)
+DISTRIBUTIONS = [
+    ("risk_level", "Risk Level Distribution", "pie"),
+    ("sentiment", "Sentiment Distribution", "bar"),
+    ("primary_emotion", "Top Emotions", "bar"),
+]
+TOP_EMOTIONS = 15
+# Weekly rollups shown in the trend charts, and emotions plotted as mean-score lines
+TREND_WEEKS = 52
+TREND_EMOTIONS = 6
+
+
+def _cache():
+    return caches[getattr(settings, "DREAM_ADMIN_DASHBOARD_CACHE", "default")]
+
+
+def data_version():
+    """
+    Cheap fingerprint of the dream table: UserDreamStats is touched whenever a
+    dream is added or deleted or its counted fields change, and has one row per
+    user rather than per dream. Other edits show up once the cache TTL expires.
+    """
+    stamp = UserDreamStats.objects.aggregate(updated=Max("updated_at"), total=Sum("total_dreams"))
+    updated = stamp["updated"].isoformat() if stamp["updated"] else "-"
+    return f"{updated}:{stamp['total'] or 0}"
+
+
+def distribution(field, start=None, end=None, limit=None):
+    """[(value, count), ...] for one column, counted with a single GROUP BY."""
+    queryset = DreamNarration.objects.order_by()
+    if start:
+        queryset = queryset.filter(created_at__gte=start)
+    if end:
+        queryset = queryset.filter(created_at__lte=end)
+    rows = queryset.values_list(field).annotate(count=Count("id")).order_by("-count")
+    if limit:
+        rows = rows[:limit]
+    return [(value or "Unknown", count) for value, count in rows]
+
+
+def _render_chart(rows, field, title, kind):
+    if not rows:
+        return None
+    import plotly.express as px
+
+    names = [str(value) for value, _ in rows]
+    counts = [count for _, count in rows]
+    if kind == "pie":
+        fig = px.pie(names=names, values=counts, title=title)
+    else:
+        fig = px.bar(x=names, y=counts, title=title, color=names, labels={"x": field, "y": "count"})
+    fig.update_layout(margin=dict(l=10, r=10, t=40, b=10))
+    return fig.to_html(full_html=False, include_plotlyjs="cdn")
+
+
+def _render_trends(weeks):
+    """Risk-level mix and mean emotion scores per week, from the global rollups."""
+    if not weeks:
+        return []
+    import plotly.express as px
+
+    x, risk_levels, risk_counts = [], [], []
+    for week in weeks:
+        for level, count in week["risk_counts"].items():
+            x.append(week["period_start"])
+            risk_levels.append(level)
+            risk_counts.append(count)
+    risk_fig = px.bar(x=x, y=risk_counts, color=risk_levels, title="Risk Levels per Week",
+                      labels={"x": "week", "y": "dreams", "color": "risk_level"})
+
+    totals = {}
+    for week in weeks:
+        for label, score in week["mean_emotion_scores"].items():
+            totals[label] = totals.get(label, 0) + score
+    top = sorted(totals, key=totals.get, reverse=True)[:TREND_EMOTIONS]
+    x, labels, scores = [], [], []
+    for week in weeks:
+        for label in top:
+            if label in week["mean_emotion_scores"]:
+                x.append(week["period_start"])
+                labels.append(label)
+                scores.append(week["mean_emotion_scores"][label])
+    emotion_fig = px.line(x=x, y=scores, color=labels, markers=True, title="Mean Emotion Scores per Week",
+                          labels={"x": "week", "y": "mean score", "color": "emotion"})
+
+    charts = []
+    for fig in (risk_fig, emotion_fig):
+        fig.update_layout(margin=dict(l=10, r=10, t=40, b=10))
+        charts.append(fig.to_html(full_html=False, include_plotlyjs="cdn"))
+    return charts
+
+
+def dashboard_context(start=None, end=None):
+    """
+    Totals and chart HTML for the admin dashboard, cached per (data version,
+    date range) and for at most DREAM_ADMIN_DASHBOARD_TTL seconds.
+    """
+    key = f"admin-dashboard:{data_version()}:{start.isoformat() if start else ''}:{end.isoformat() if end else ''}"
+    cache = _cache()
+    context = cache.get(key)
+    if context is not None:
+        return context
+
+    context = {"charts": []}
+    for field, title, kind in DISTRIBUTIONS:
+        rows = distribution(field, start, end, TOP_EMOTIONS if field == "primary_emotion" else None)
+        if field == "risk_level":
+            # Every dream has exactly one risk level (or NULL), so this is the total
+            context["total_dreams"] = sum(count for _, count in rows)
+        context[f"{field}_rows"] = rows
+        chart = _render_chart(rows, field, title, kind)
+        if chart:
+            context["charts"].append(chart)
+    # Trends come from the weekly rollups (one row per week), not the dreams table
+    context["charts"].extend(_render_trends(trend(
+        since=start.date() if start else None, until=end.date() if end else None, limit=TREND_WEEKS,
+    )))
+    cache.set(key, context, int(getattr(settings, "DREAM_ADMIN_DASHBOARD_TTL", 300)))
+    return context
@@ -0,0 +1,461 @@
+# dreams/embeddings.py
+# Similar-dream search over sentence embeddings from the emotion model's encoder
+# (last hidden state mean-pooled over the tokens, scaled to unit length). With
+# DREAM_EMBEDDINGS_ENABLED the analysis pass emits them from its own forward pass
+# and they are appended here when the dream is saved.
+#
+# The index is a directory of append-only files (DREAM_EMBEDDING_INDEX_DIR):
+#   vectors.f32    float32 rows, one per indexed version of a dream
+#   rows.bin       (dream id, user id, IVF list) of each row
+#   centroids.f32  IVF centroids, once `rebuild_embedding_index` has trained them
+#   meta.json      dimension, generation and IVF layout
+# Readers memory-map the files, so worker processes share them through the page
+# cache. A re-analyzed dream appends a new row and the latest row per dream wins;
+# deleted dreams keep their rows until the next rebuild, so callers re-check the
+# returned ids against the database.
+#
+# Per-user queries are exact. Global queries scan everything until the index has
+# an IVF coarse quantizer: the rebuild clusters the vectors with k-means and
+# rewrites them grouped by list, so a query only reads the DREAM_EMBEDDING_NPROBE
+# closest lists (contiguous ranges) plus the rows appended since the rebuild.
+
+import base64
+import fcntl
+import json
+import os
+import shutil
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from django.conf import settings
+
+VECTORS_FILE = "vectors.f32"
+ROWS_FILE = "rows.bin"
+CENTROIDS_FILE = "centroids.f32"
+META_FILE = "meta.json"
+ROW_DTYPE = np.dtype([("dream_id", "<i8"), ("user_id", "<i8"), ("list", "<i4")])
+SCAN_CHUNK_ROWS = 16384
+# Which model and pooling produce the vectors; part of the analysis model version
+SOURCE = "emotion_model/last_hidden_state/mean"
+
+
+def enabled():
+    return bool(getattr(settings, "DREAM_EMBEDDINGS_ENABLED", False))
+
+
+def index_dir():
+    return Path(getattr(settings, "DREAM_EMBEDDING_INDEX_DIR", "") or settings.BASE_DIR / "embedding_index")
+
+
+def _nprobe():
+    return max(1, int(getattr(settings, "DREAM_EMBEDDING_NPROBE", 16)))
+
+
+# --- Vectors ---
+def normalize(vectors):
+    """Scales vectors (or one vector) to unit length, so dot products are cosine similarities."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def encode(vector):
+    """Unit-length float32 vector -> base64 text, to carry it in JSON results."""
+    return base64.b64encode(normalize(vector).astype("<f4").tobytes()).decode("ascii")
+
+
+def decode(text):
+    return np.frombuffer(base64.b64decode(text), dtype="<f4")
+
+
+# --- Files ---
+@contextmanager
+def _locked(directory):
+    # One writer at a time per index; the lock file sits next to the directory so
+    # it survives a rebuild swapping the directory out
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    with open(directory.parent / f".{directory.name}.lock", "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def read_meta(directory):
+    try:
+        return json.loads((Path(directory) / META_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(directory, meta):
+    tmp = directory / f"{META_FILE}.tmp"
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, directory / META_FILE)
+
+
+def _new_meta(dim):
+    return {"dim": int(dim), "generation": uuid.uuid4().hex, "lists": 0, "sorted_rows": 0}
+
+
+def row_count(directory, meta):
+    """Rows present in both files (a writer that died mid-append can leave one longer)."""
+    def size(name):
+        try:
+            return os.path.getsize(directory / name)
+        except OSError:
+            return 0
+    return min(size(VECTORS_FILE) // (4 * meta["dim"]), size(ROWS_FILE) // ROW_DTYPE.itemsize)
+
+
+def _load_centroids(directory, meta):
+    return np.fromfile(directory / CENTROIDS_FILE, dtype="<f4").reshape(meta["lists"], meta["dim"])
+
+
+def _open(directory, meta, count):
+    """(vectors, rows) memory maps of the first `count` rows."""
+    if not count:
+        return np.zeros((0, meta["dim"]), dtype=np.float32), np.zeros(0, dtype=ROW_DTYPE)
+    vectors = np.memmap(directory / VECTORS_FILE, dtype="<f4", mode="r", shape=(count, meta["dim"]))
+    rows = np.memmap(directory / ROWS_FILE, dtype=ROW_DTYPE, mode="r", shape=(count,))
+    return vectors, rows
+
+
+def append(entries, directory=None):
+    """
+    Adds (dream_id, user_id, vector) entries to the index, creating it on first
+    use. New rows go to their nearest IVF list when the index has one. Returns
+    the number of rows written.
+    """
+    entries = [(dream_id, user_id, vector) for dream_id, user_id, vector in entries if vector is not None]
+    if not entries:
+        return 0
+    directory = Path(directory or index_dir())
+    vectors = normalize(np.stack([vector for _, _, vector in entries])).astype("<f4")
+    with _locked(directory):
+        directory.mkdir(parents=True, exist_ok=True)
+        meta = read_meta(directory)
+        if meta is None:
+            meta = _new_meta(vectors.shape[1])
+            _write_meta(directory, meta)
+        if vectors.shape[1] != meta["dim"]:
+            print(f"Embedding index at {directory} holds {meta['dim']}-d vectors, got {vectors.shape[1]}-d; "
+                  "run `manage.py rebuild_embedding_index`.")
+            return 0
+        lists = assign(vectors, _load_centroids(directory, meta)) if meta["lists"] else np.full(len(entries), -1)
+        rows = np.array(
+            [(dream_id, user_id, list_id) for (dream_id, user_id, _), list_id in zip(entries, lists)], dtype=ROW_DTYPE,
+        )
+        count = row_count(directory, meta)
+        # Vectors first: readers only see a row once both files hold it
+        for name, array, width in ((VECTORS_FILE, vectors, 4 * meta["dim"]), (ROWS_FILE, rows, ROW_DTYPE.itemsize)):
+            with open(directory / name, "ab") as handle:
+                handle.truncate(count * width)
+                handle.write(array.tobytes())
+    return len(entries)
+
+
+def record(dreams):
+    """
+    Indexes the embeddings carried by analyses just applied to these (saved)
+    dreams; see DreamNarration.apply_analysis. Index errors are logged, never raised.
+    """
+    entries = []
+    for dream in dreams:
+        blob = getattr(dream, "_embedding", None)
+        if blob and dream.pk:
+            entries.append((dream.pk, dream.user_id, decode(blob)))
+            dream._embedding = None
+    if not entries or not enabled():
+        return 0
+    try:
+        return append(entries)
+    except OSError as e:
+        print(f"Could not update the embedding index: {e}")
+        return 0
+
+
+# --- IVF Coarse Quantizer ---
+def assign(vectors, centroids, rows=None, chunk_size=4096):
+    """
+    Index of the closest (highest dot product) centroid for each vector, or for
+    each of `rows` of a (memory-mapped) matrix, read a chunk at a time.
+    """
+    total = len(vectors) if rows is None else len(rows)
+    lists = np.empty(total, dtype=np.int32)
+    for start in range(0, total, chunk_size):
+        block = vectors[start:start + chunk_size] if rows is None else vectors[rows[start:start + chunk_size]]
+        lists[start:start + chunk_size] = np.argmax(np.asarray(block, dtype=np.float32) @ centroids.T, axis=1)
+    return lists
+
+
+def train_centroids(vectors, lists, rows=None, iterations=10, sample_per_list=64, seed=0):
+    """
+    Spherical k-means on a random sample of the vectors (or of `rows` of them);
+    returns unit-length centroids.
+    """
+    rng = np.random.default_rng(seed)
+    population = np.arange(len(vectors)) if rows is None else np.asarray(rows)
+    sample_size = min(len(population), lists * sample_per_list)
+    sample = np.asarray(vectors[np.sort(rng.choice(population, sample_size, replace=False))], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        labels = assign(sample, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=lists)
+        filled = counts > 0
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.empty_like(centroids)
+        sums[filled] = np.add.reduceat(sample[order], starts[filled], axis=0)
+        # Empty lists restart from random sample rows
+        sums[~filled] = sample[rng.choice(len(sample), int((~filled).sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+
+def default_lists(rows):
+    """About sqrt(rows) lists, and none for indexes small enough to scan."""
+    return int(np.sqrt(rows)) if rows >= 20000 else 0
+
+
+def _latest_rows(dream_ids):
+    """Boolean mask of the last row of each dream id."""
+    live = np.zeros(len(dream_ids), dtype=bool)
+    if len(dream_ids):
+        _, last = np.unique(dream_ids[::-1], return_index=True)
+        live[len(dream_ids) - 1 - last] = True
+    return live
+
+
+def compact(directory, lists=None, keep=None, iterations=10):
+    """
+    Rewrites the index in place without superseded rows (and without dreams not
+    in `keep`, an optional array of dream ids), grouped by IVF list when `lists`
+    (default: default_lists()) is non-zero. Meant for a copy that no other
+    process writes to, as in `rebuild_embedding_index`.
+    """
+    directory = Path(directory)
+    meta = read_meta(directory)
+    if meta is None:
+        return None
+    vectors, rows = _open(directory, meta, row_count(directory, meta))
+    live = _latest_rows(np.asarray(rows["dream_id"]))
+    if keep is not None:
+        live &= np.isin(rows["dream_id"], keep)
+    kept = np.flatnonzero(live)
+    lists = default_lists(len(kept)) if lists is None else min(lists, len(kept))
+
+    new_meta = {**_new_meta(meta["dim"]), "lists": lists, "sorted_rows": len(kept) if lists else 0}
+    if lists:
+        centroids = train_centroids(vectors, lists, kept, iterations)
+        assigned = assign(vectors, centroids, kept)
+        order = np.argsort(assigned, kind="stable")
+        kept, assigned = kept[order], assigned[order]
+        centroids.astype("<f4").tofile(directory / f"{CENTROIDS_FILE}.tmp")
+    else:
+        assigned = np.full(len(kept), -1, dtype=np.int32)
+
+    with open(directory / f"{VECTORS_FILE}.tmp", "wb") as vector_file, open(directory / f"{ROWS_FILE}.tmp", "wb") as row_file:
+        for start in range(0, len(kept), SCAN_CHUNK_ROWS):
+            chunk = kept[start:start + SCAN_CHUNK_ROWS]
+            vector_file.write(np.asarray(vectors[chunk], dtype="<f4").tobytes())
+            block = np.array(rows[chunk])
+            block["list"] = assigned[start:start + SCAN_CHUNK_ROWS]
+            row_file.write(block.tobytes())
+    del vectors, rows
+    for name in (VECTORS_FILE, ROWS_FILE) + ((CENTROIDS_FILE,) if lists else ()):
+        os.replace(directory / f"{name}.tmp", directory / name)
+    if not lists:
+        (directory / CENTROIDS_FILE).unlink(missing_ok=True)
+    _write_meta(directory, new_meta)
+    return new_meta
+
+
+def swap_in(new_directory, directory=None, since=None):
+    """
+    Replaces the live index with `new_directory`. Rows appended to the live index
+    after `since` (its (generation, row count) when the rebuild started) are
+    carried over, so dreams analyzed during a rebuild stay searchable.
+    """
+    directory = Path(directory or index_dir())
+    new_directory = Path(new_directory)
+    with _locked(directory):
+        meta = read_meta(directory)
+        if meta is not None and since is not None and meta["generation"] == since[0]:
+            vectors, rows = _open(directory, meta, row_count(directory, meta))
+            tail = range(since[1], len(rows))
+            for start in range(tail.start, tail.stop, SCAN_CHUNK_ROWS):
+                block = rows[start:start + SCAN_CHUNK_ROWS]
+                append(zip(block["dream_id"].tolist(), block["user_id"].tolist(),
+                           vectors[start:start + SCAN_CHUNK_ROWS]), new_directory)
+            del vectors, rows
+        old = directory.with_name(f"{directory.name}.old")
+        shutil.rmtree(old, ignore_errors=True)
+        if directory.exists():
+            os.replace(directory, old)
+        os.replace(new_directory, directory)
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def clone(target, directory=None):
+    """
+    Copies the live index into `target` (replacing it) and returns the snapshot
+    it was taken at, for swap_in().
+    """
+    directory, target = Path(directory or index_dir()), Path(target)
+    shutil.rmtree(target, ignore_errors=True)
+    target.mkdir(parents=True)
+    with _locked(directory):
+        meta = read_meta(directory)
+        if meta is None:
+            return None
+        count = row_count(directory, meta)
+        for name, width in ((VECTORS_FILE, 4 * meta["dim"]), (ROWS_FILE, ROW_DTYPE.itemsize)):
+            shutil.copyfile(directory / name, target / name)
+            os.truncate(target / name, count * width)
+        if meta["lists"]:
+            shutil.copyfile(directory / CENTROIDS_FILE, target / CENTROIDS_FILE)
+        _write_meta(target, meta)
+    return meta["generation"], count
+
+
+def snapshot(directory=None):
+    """(generation, row count) of the live index, or None when there is none."""
+    directory = Path(directory or index_dir())
+    meta = read_meta(directory)
+    return (meta["generation"], row_count(directory, meta)) if meta else None
+
+
+# --- Search ---
+class EmbeddingIndex:
+    """
+    Read side of the index. Each query first checks whether the files grew or a
+    rebuild replaced them and maps the new rows; superseded rows are tracked
+    incrementally in `live`.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.meta = None
+        self.count = 0
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.rows = np.zeros(0, dtype=ROW_DTYPE)
+        self.live = np.zeros(0, dtype=bool)
+        self.centroids = None
+        self.offsets = None
+
+    def refresh(self):
+        meta = read_meta(self.directory)
+        if meta is None:
+            self._reset()
+            return
+        if self.meta is None or meta["generation"] != self.meta["generation"]:
+            self._reset()
+            self.meta = meta
+            if meta["lists"]:
+                self.centroids = _load_centroids(self.directory, meta)
+        count = row_count(self.directory, self.meta)
+        if count <= self.count:
+            return
+        vectors, rows = _open(self.directory, self.meta, count)
+        new_ids = np.asarray(rows["dream_id"][self.count:])
+        live = np.empty(count, dtype=bool)
+        # The latest row of each dream wins
+        live[:self.count] = self.live & ~np.isin(self.rows["dream_id"], new_ids)
+        live[self.count:] = _latest_rows(new_ids)
+        if self.meta["lists"] and self.offsets is None and count >= self.meta["sorted_rows"]:
+            sorted_lists = rows["list"][:self.meta["sorted_rows"]]
+            self.offsets = np.searchsorted(sorted_lists, np.arange(self.meta["lists"] + 1))
+        self.vectors, self.rows, self.live, self.count = vectors, rows, live, count
+
+    def __len__(self):
+        with self._lock:
+            self.refresh()
+            return int(self.live.sum())
+
+    def vector_for(self, dream_id):
+        """The dream's current embedding, or None when it isn't indexed."""
+        with self._lock:
+            self.refresh()
+            matches = np.flatnonzero(self.rows["dream_id"] == dream_id)
+            return np.array(self.vectors[matches[-1]]) if len(matches) else None
+
+    def search(self, vector, k=10, user_id=None, exclude=(), nprobe=None):
+        """
+        (dream_ids, scores) of the k live rows most similar to `vector`, best first.
+        With `user_id`, only that user's dreams are searched (exactly); otherwise
+        the IVF lists are probed when the index has them.
+        """
+        query = normalize(vector)
+        with self._lock:
+            self.refresh()
+            vectors, rows, live, offsets, centroids = self.vectors, self.rows, self.live, self.offsets, self.centroids
+        if not len(rows):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if user_id is not None:
+            candidates = np.flatnonzero((rows["user_id"] == user_id) & live)
+            scores = np.asarray(vectors[candidates]) @ query
+        elif offsets is not None:
+            probe = np.argsort(-(centroids @ query))[:nprobe or _nprobe()]
+            parts, part_scores = [], []
+            for list_id in probe:
+                start, end = offsets[list_id], offsets[list_id + 1]
+                parts.append(np.arange(start, end))
+                part_scores.append(vectors[start:end] @ query)
+            sorted_rows = self.meta["sorted_rows"]
+            tail = sorted_rows + np.flatnonzero(np.isin(rows["list"][sorted_rows:], probe))
+            parts.append(tail)
+            part_scores.append(np.asarray(vectors[tail]) @ query)
+            candidates, scores = np.concatenate(parts), np.concatenate(part_scores)
+            keep = live[candidates]
+            candidates, scores = candidates[keep], scores[keep]
+        else:
+            scores = np.empty(len(rows), dtype=np.float32)
+            for start in range(0, len(rows), SCAN_CHUNK_ROWS):
+                scores[start:start + SCAN_CHUNK_ROWS] = vectors[start:start + SCAN_CHUNK_ROWS] @ query
+            candidates = np.flatnonzero(live)
+            scores = scores[candidates]
+
+        dream_ids = np.asarray(rows["dream_id"][candidates])
+        if len(exclude):
+            keep = ~np.isin(dream_ids, list(exclude))
+            dream_ids, scores = dream_ids[keep], scores[keep]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k)[:k]
+            dream_ids, scores = dream_ids[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return dream_ids[order], scores[order]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """The process-wide EmbeddingIndex for DREAM_EMBEDDING_INDEX_DIR."""
+    global _index
+    with _index_lock:
+        if _index is None or _index.directory != index_dir():
+            _index = EmbeddingIndex(index_dir())
+        return _index
+
+
+def similar_dreams(dream, k=10, scope="user"):
+    """
+    [(dream_id, score), ...] of the dreams most similar to `dream`: among the
+    same user's dreams, or everyone's with scope="all". None when the dream has
+    no embedding yet.
+    """
+    index = get_index()
+    vector = index.vector_for(dream.pk)
+    if vector is None:
+        return None
+    dream_ids, scores = index.search(vector, k, user_id=dream.user_id if scope == "user" else None, exclude=[dream.pk])
+    return [(int(dream_id), round(float(score), 4)) for dream_id, score in zip(dream_ids, scores)]
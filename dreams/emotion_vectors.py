@@ -0,0 +1,166 @@
+# dreams/emotion_vectors.py
+# Packed storage for per-dream emotion scores. Each dream keeps its scores as one
+# little-endian float16 (or float32) blob in DreamNarration.emotion_vector, in the
+# label order of an EmotionLabelSet row, instead of a {label: score} JSON object.
+# Batches of dreams decode straight into NumPy matrices with np.frombuffer.
+
+import hashlib
+import json
+import threading
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+DTYPES = {"float16": "<f2", "float32": "<f4"}
+
+_lock = threading.Lock()
+# (labels tuple, dtype name) -> EmotionLabelSet, and id -> EmotionLabelSet
+_by_key = {}
+_by_id = {}
+
+
+def _dtype_name():
+    name = getattr(settings, "DREAM_EMOTION_VECTOR_DTYPE", "float16")
+    if name not in DTYPES:
+        raise ValueError(f"Unknown DREAM_EMOTION_VECTOR_DTYPE {name!r}; expected one of {', '.join(DTYPES)}.")
+    return name
+
+
+def fingerprint(labels, dtype):
+    blob = json.dumps([list(labels), dtype]).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()[:32]
+
+
+def _prepare(label_set):
+    label_set.label_index = {label: i for i, label in enumerate(label_set.labels)}
+    return label_set
+
+
+def _remember(label_set):
+    _by_key[(tuple(label_set.labels), label_set.dtype)] = label_set
+    _by_id[label_set.id] = label_set
+
+
+def _remember_on_commit(label_set):
+    # A row read or created inside a transaction that is rolled back later (an
+    # admin save, a TestCase) must not stay cached under an id that no longer exists
+    transaction.on_commit(lambda: _remember(label_set))
+    return label_set
+
+
+def label_set_for(labels, dtype=None):
+    """The EmotionLabelSet for this label order and dtype, created on first use."""
+    from .models import EmotionLabelSet
+
+    dtype = dtype or _dtype_name()
+    key = (tuple(labels), dtype)
+    label_set = _by_key.get(key)
+    if label_set is None:
+        with _lock:
+            label_set, _ = EmotionLabelSet.objects.get_or_create(
+                fingerprint=fingerprint(labels, dtype), defaults={"labels": list(labels), "dtype": dtype},
+            )
+            _remember_on_commit(_prepare(label_set))
+    return label_set
+
+
+def label_set_by_id(label_set_id):
+    from .models import EmotionLabelSet
+
+    label_set = _by_id.get(label_set_id)
+    if label_set is None:
+        with _lock:
+            label_set = _remember_on_commit(_prepare(EmotionLabelSet.objects.get(pk=label_set_id)))
+    return label_set
+
+
+# --- Packing ---
+def pack(scores):
+    """
+    {label: score} -> (EmotionLabelSet, bytes). Labels are stored sorted (the
+    pipeline returns them ordered by score), so all dreams scored by one model
+    share a label set.
+    """
+    labels = sorted(scores)
+    label_set = label_set_for(labels)
+    vector = np.asarray([scores[label] for label in labels], dtype=DTYPES[label_set.dtype])
+    return label_set, vector.tobytes()
+
+
+def unpack(blob, label_set):
+    """Read-only vector view over the stored bytes (no copy)."""
+    return np.frombuffer(blob, dtype=DTYPES[label_set.dtype])
+
+
+def as_dict(blob, label_set):
+    return {label: round(float(score), 6) for label, score in zip(label_set.labels, unpack(blob, label_set))}
+
+
+# --- Batches ---
+def _columns(label_set, labels):
+    # Column of each target label in this label set, or -1 when it has none
+    return np.array([label_set.label_index.get(label, -1) for label in labels])
+
+
+def _decode_group(blobs, label_set, labels):
+    """Stacks blobs that share a label set into an (N x len(labels)) float32 matrix."""
+    block = np.frombuffer(b"".join(blobs), dtype=DTYPES[label_set.dtype]).reshape(len(blobs), len(label_set.labels))
+    if list(labels) == label_set.labels:
+        return block.astype(np.float32, copy=False)
+    columns = _columns(label_set, labels)
+    matrix = np.zeros((len(blobs), len(labels)), dtype=np.float32)
+    present = columns >= 0
+    matrix[:, present] = block[:, columns[present]]
+    return matrix
+
+
+def stack(dreams, labels=None):
+    """
+    (labels, matrix) for already-loaded dreams: one float32 row per dream in
+    `labels` order (default: the label set of the first scored dream). Dreams
+    without scores get a row of zeros.
+    """
+    scored = [dream for dream in dreams if dream.emotion_vector is not None and dream.emotion_labels_id]
+    if labels is None:
+        labels = label_set_by_id(scored[0].emotion_labels_id).labels if scored else []
+    matrix = np.zeros((len(dreams), len(labels)), dtype=np.float32)
+    groups = {}
+    for row, dream in enumerate(dreams):
+        if dream.emotion_vector is not None and dream.emotion_labels_id:
+            groups.setdefault(dream.emotion_labels_id, []).append((row, bytes(dream.emotion_vector)))
+    for label_set_id, members in groups.items():
+        rows = [row for row, _ in members]
+        matrix[rows] = _decode_group([blob for _, blob in members], label_set_by_id(label_set_id), labels)
+    return list(labels), matrix
+
+
+def load_matrix(queryset, labels=None, chunk_size=5000):
+    """
+    Streams the emotion vectors of a DreamNarration queryset and returns
+    (ids, labels, matrix): dream ids (int64) and a float32 matrix with one row per
+    scored dream, columns in `labels` order (default: the most common label set).
+    Only three columns are read and no JSON is decoded.
+    """
+    rows = (
+        queryset.filter(emotion_vector__isnull=False, emotion_labels__isnull=False)
+        .order_by("id").values_list("id", "emotion_labels_id", "emotion_vector")
+    )
+    groups = {}
+    for dream_id, label_set_id, blob in rows.iterator(chunk_size=chunk_size):
+        ids, blobs = groups.setdefault(label_set_id, ([], []))
+        ids.append(dream_id)
+        blobs.append(bytes(blob))
+    if labels is None:
+        labels = label_set_by_id(max(groups, key=lambda key: len(groups[key][0]))).labels if groups else []
+    if not groups:
+        return np.zeros(0, dtype=np.int64), list(labels), np.zeros((0, len(labels)), dtype=np.float32)
+
+    id_blocks, matrix_blocks = [], []
+    for label_set_id, (ids, blobs) in groups.items():
+        id_blocks.append(np.asarray(ids, dtype=np.int64))
+        matrix_blocks.append(_decode_group(blobs, label_set_by_id(label_set_id), labels))
+    if len(groups) == 1:
+        return id_blocks[0], list(labels), matrix_blocks[0]
+    ids = np.concatenate(id_blocks)
+    order = np.argsort(ids, kind="stable")
+    return ids[order], list(labels), np.vstack(matrix_blocks)[order]
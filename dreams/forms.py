@@ -1,6 +1,10 @@
 from django import forms
+from django.conf import settings
+from django.core.validators import FileExtensionValidator
 from .models import DreamNarration
 
+AUDIO_EXTENSIONS = ["wav", "mp3", "m4a", "ogg", "oga", "flac", "webm", "aac"]
+
 class DreamForm(forms.ModelForm):
     class Meta:
         model = DreamNarration
@@ -9,4 +13,15 @@ class DreamForm(forms.ModelForm):
             "dream_text": forms.Textarea(attrs={"rows":5, "placeholder":"Describe your dream..."}),
         }
 class DreamAudioForm(forms.Form):
-    audio_file = forms.FileField(label="Upload Dream Audio file")
\ No newline at end of file
+    audio_file = forms.FileField(
+        label="Upload Dream Audio file",
+        validators=[FileExtensionValidator(AUDIO_EXTENSIONS)],
+        widget=forms.ClearableFileInput(attrs={"accept": "audio/*"}),
+    )
+
+    def clean_audio_file(self):
+        audio_file = self.cleaned_data["audio_file"]
+        max_mb = getattr(settings, "DREAM_AUDIO_MAX_UPLOAD_MB", 50)
+        if audio_file.size > max_mb * 1024 * 1024:
+            raise forms.ValidationError(f"Audio files must be smaller than {max_mb} MB.")
+        return audio_file
@@ -0,0 +1,84 @@
+# dreams/inference_server.py
+# A single local process that owns the models and serves analysis requests to the
+# web workers (see InferenceClient in ai_pipeline.py).
+
+import json
+import os
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from . import ai_pipeline, metrics
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps client connections alive between requests
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            sentiment_pipe, emotion_pipe = ai_pipeline.get_pipelines()
+            self._send_json(200, {"status": "ok" if sentiment_pipe and emotion_pipe else "models-unavailable"})
+        elif self.path == "/metrics":
+            body = metrics.render(close_connections=True).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", metrics.CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/analyze":
+            # The body is left unread, so the connection can't carry another request
+            self.close_connection = True
+            self._send_json(404, {"error": "Not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            texts = json.loads(self.rfile.read(length))["texts"]
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                raise ValueError("'texts' must be a list of strings")
+        except (ValueError, KeyError, TypeError) as e:
+            # A bad Content-Length may have left part of the body unread
+            self.close_connection = True
+            self._send_json(400, {"error": f"Invalid request: {e}"})
+            return
+        self._send_json(200, {"results": ai_pipeline.analyze_local(texts)})
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            # Tells the client not to reuse the connection
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+
+def make_server(address):
+    """
+    Builds a threaded server for "http://host:port" or "unix:///path/to/socket".
+    """
+    parts = urlsplit(address)
+    if parts.scheme == "unix":
+        return ThreadingUnixHTTPServer(parts.path, InferenceRequestHandler)
+    return ThreadingHTTPServer((parts.hostname or "127.0.0.1", parts.port or 8765), InferenceRequestHandler)
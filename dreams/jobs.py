@@ -0,0 +1,327 @@
+# dreams/jobs.py
+# Database-backed queue that moves dream analysis off the web request path.
+
+import uuid
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from collections import Counter
+from . import audio, embeddings, metrics
+from .ai_pipeline import analyze_dreams, error_result
+from .risk import get_risk_model
+from .models import AnalysisJob, AudioSegment, DreamAudio, DreamNarration, record_changes
+
+MAX_ATTEMPTS = 3
+ANALYSIS_FIELDS = [
+    "sentiment", "emotion", "primary_emotion", "potential_condition", "risk_level", "analysis_json", "text_hash",
+    "emotion_labels", "emotion_vector",
+]
+
+
+def enqueue_analysis(dream):
+    """Queues a saved dream for analysis by the background worker."""
+    return AnalysisJob.objects.create(dream=dream)
+
+
+def enqueue_analysis_bulk(dreams):
+    """Queues many saved dreams with one INSERT."""
+    return AnalysisJob.objects.bulk_create([AnalysisJob(dream=dream) for dream in dreams])
+
+
+def analyze_saved_dreams(dreams):
+    """
+    Analyzes saved dreams in one batched pass within the current process and
+    writes the results back with a bulk update (used when there is no worker).
+    """
+    results = analyze_dreams([dream.dream_text for dream in dreams])
+    for dream, result in zip(dreams, results):
+        dream.apply_analysis(result)
+    with metrics.timed("db_write"), transaction.atomic():
+        DreamNarration.objects.bulk_update(dreams, ANALYSIS_FIELDS)
+        record_changes(dreams)
+    embeddings.record(dreams)
+
+
+def enqueue_transcription(recording):
+    """Queues a saved DreamAudio; the worker plans its segments and transcribes them."""
+    return AnalysisJob.objects.create(dream=recording.dream, kind=AnalysisJob.TRANSCRIBE)
+
+
+def active_job_for(dream):
+    """Returns the dream's pending or running job, if any."""
+    return (
+        dream.analysis_jobs.filter(status__in=[AnalysisJob.PENDING, AnalysisJob.RUNNING])
+        .order_by("-id")
+        .first()
+    )
+
+
+def queue_position(job):
+    """Number of pending jobs of the same kind that will be picked up before this one."""
+    if job.status != AnalysisJob.PENDING:
+        return 0
+    return AnalysisJob.objects.filter(status=AnalysisJob.PENDING, kind=job.kind, id__lt=job.id).count()
+
+
+# Async variants for the async views
+async def aenqueue_analysis(dream):
+    return await AnalysisJob.objects.acreate(dream=dream)
+
+
+async def aactive_job_for(dream):
+    return await (
+        dream.analysis_jobs.filter(status__in=[AnalysisJob.PENDING, AnalysisJob.RUNNING])
+        .order_by("-id")
+        .afirst()
+    )
+
+
+async def aqueue_position(job):
+    if job.status != AnalysisJob.PENDING:
+        return 0
+    return await AnalysisJob.objects.filter(status=AnalysisJob.PENDING, kind=job.kind, id__lt=job.id).acount()
+
+
+def _collect_queue_depth():
+    rows = (
+        AnalysisJob.objects.filter(status__in=[AnalysisJob.PENDING, AnalysisJob.RUNNING])
+        .order_by().values_list("kind", "status").annotate(n=Count("id"))
+    )
+    depth = {
+        (kind, status): 0
+        for kind, _ in AnalysisJob.KIND_CHOICES
+        for status in (AnalysisJob.PENDING, AnalysisJob.RUNNING)
+    }
+    depth.update({(kind, status): n for kind, status, n in rows})
+    return depth
+
+
+metrics.register_collector(
+    "dream_analysis_jobs", "Queued and running background jobs.", "gauge", ["kind", "status"], _collect_queue_depth,
+)
+
+
+def requeue_stale_jobs(older_than_seconds):
+    """Puts back jobs whose worker died mid-batch. Returns how many were requeued."""
+    cutoff = timezone.now() - timedelta(seconds=older_than_seconds)
+    return AnalysisJob.objects.filter(status=AnalysisJob.RUNNING, started_at__lt=cutoff).update(
+        status=AnalysisJob.PENDING, worker=""
+    )
+
+
+def claim_jobs(limit, kind=None):
+    """
+    Atomically claims up to `limit` pending jobs (of one kind, if given) for this worker.
+
+    The conditional UPDATE only succeeds for rows that are still pending, so two
+    workers polling at the same time never receive the same job, on SQLite or
+    PostgreSQL alike.
+    """
+    token = uuid.uuid4().hex
+    pending = AnalysisJob.objects.filter(status=AnalysisJob.PENDING)
+    if kind:
+        pending = pending.filter(kind=kind)
+    candidate_ids = list(pending.order_by("id").values_list("id", flat=True)[:limit])
+    if not candidate_ids:
+        return []
+    AnalysisJob.objects.filter(id__in=candidate_ids, status=AnalysisJob.PENDING).update(
+        status=AnalysisJob.RUNNING,
+        worker=token,
+        started_at=timezone.now(),
+        attempts=F("attempts") + 1,
+    )
+    return list(AnalysisJob.objects.filter(worker=token).select_related("dream", "segment").order_by("id"))
+
+
+def process_jobs(jobs):
+    """
+    Runs claimed jobs: analysis jobs in one batched pass, transcription jobs one
+    by one. Returns (succeeded, failed) counts.
+    """
+    analysis = [job for job in jobs if job.kind == AnalysisJob.ANALYZE]
+    succeeded, failed = _process_analysis_jobs(analysis)
+    for job in jobs:
+        if job.kind == AnalysisJob.TRANSCRIBE:
+            if _process_transcription_job(job):
+                succeeded += 1
+            else:
+                failed += 1
+    return succeeded, failed
+
+
+def _process_analysis_jobs(jobs):
+    """
+    Analyzes the dreams of the claimed jobs in one batched pass and writes the
+    results back with bulk updates.
+    """
+    if not jobs:
+        return 0, 0
+    # A dream can have several jobs in one batch (e.g. re-submitted while queued).
+    # Each job holds its own copy of it, and record_changes() would apply the same
+    # delta once per copy, so all its jobs share the first one.
+    by_id = {}
+    for job in jobs:
+        job.dream = by_id.setdefault(job.dream_id, job.dream)
+    dreams = list(by_id.values())
+    results = dict(zip(by_id, analyze_dreams([dream.dream_text for dream in dreams])))
+
+    finished_at = timezone.now()
+    succeeded = failed = 0
+    for job in jobs:
+        dream, result = job.dream, results[job.dream_id]
+        job.worker = ""
+        if "error" in result and job.attempts < MAX_ATTEMPTS:
+            # Leave the dream as Pending and let a later batch retry it
+            job.status = AnalysisJob.PENDING
+            job.error = result["error"]
+            failed += 1
+            continue
+        dream.apply_analysis(result)
+        job.finished_at = finished_at
+        if "error" in result:
+            job.status = AnalysisJob.FAILED
+            job.error = result["error"]
+            failed += 1
+        else:
+            job.status = AnalysisJob.DONE
+            job.error = ""
+            succeeded += 1
+
+    # One transaction, so the stats deltas are never applied without the jobs being
+    # marked finished (a retry would apply them twice) or the other way round
+    with metrics.timed("db_write"), transaction.atomic():
+        DreamNarration.objects.bulk_update(dreams, ANALYSIS_FIELDS)
+        record_changes(dreams)
+        AnalysisJob.objects.bulk_update(jobs, ["status", "worker", "error", "finished_at"])
+    embeddings.record(dreams)
+    return succeeded, failed
+
+
+# --- Transcription ---
+def _finish_job(job, error=""):
+    """Marks a transcription job done, or failed/pending-for-retry when `error` is set."""
+    job.worker = ""
+    job.error = error
+    if error and job.attempts < MAX_ATTEMPTS:
+        job.status = AnalysisJob.PENDING
+    else:
+        job.status = AnalysisJob.FAILED if error else AnalysisJob.DONE
+        job.finished_at = timezone.now()
+    job.save(update_fields=["status", "worker", "error", "finished_at"])
+    return job.status
+
+
+def _process_transcription_job(job):
+    recording = DreamAudio.objects.select_related("dream").filter(dream=job.dream).first()
+    if recording is None:
+        job.attempts = MAX_ATTEMPTS
+        _finish_job(job, "The dream has no recording.")
+        return False
+    try:
+        if job.segment is None:
+            _plan_segments(recording)
+        else:
+            job.segment.text = audio.transcribe_segment(recording.file.path, job.segment.start, job.segment.end)
+    except Exception as e:
+        error = str(e) or type(e).__name__
+        print(f"Transcription job {job.id} failed: {error}")
+        if _finish_job(job, error) == AnalysisJob.FAILED:
+            if job.segment is None:
+                _fail_recording(recording, error)
+            else:
+                job.segment.status = AudioSegment.FAILED
+                job.segment.save(update_fields=["status"])
+                _assemble_if_complete(recording)
+        return False
+
+    if job.segment is not None:
+        _analyze_segment(job.segment)
+        job.segment.status = AudioSegment.DONE
+        job.segment.save(update_fields=["text", "status", "sentiment", "emotion_scores"])
+        # Queued before this job is marked done, so the dream always has an active job
+        _assemble_if_complete(recording)
+    _finish_job(job)
+    return True
+
+
+def _analyze_segment(segment):
+    """Provisional analysis of one segment's text; failures only cost the preview."""
+    if not segment.text:
+        return
+    result = analyze_dreams([segment.text])[0]
+    if "error" not in result:
+        segment.sentiment = result["sentiment_label"]
+        segment.emotion_scores = result["emotion_summary"]
+
+
+def transcription_progress(recording, top_k=5):
+    """
+    Partial results of a recording that is still being processed: the transcript
+    so far and emotion scores aggregated over the finished segments (weighted by
+    their text length), with the risk level they imply so far.
+    """
+    segments = list(recording.segments.order_by("index"))
+    finished = [segment for segment in segments if segment.status != AudioSegment.PENDING]
+    scored = [segment for segment in finished if segment.emotion_scores]
+
+    emotion_scores = {}
+    total = float(sum(len(segment.text) for segment in scored))
+    for segment in scored:
+        for label, score in segment.emotion_scores.items():
+            emotion_scores[label] = emotion_scores.get(label, 0.0) + score * len(segment.text) / total
+    top = sorted(emotion_scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+    progress = {
+        "segments_total": len(segments),
+        "segments_done": len(finished),
+        "transcript": " ".join(segment.text for segment in finished if segment.text),
+        "top_emotions": [{"label": label, "score": round(score, 4)} for label, score in top],
+        "sentiments": dict(Counter(segment.sentiment for segment in scored)),
+        "risk_level": None,
+    }
+    if emotion_scores:
+        progress["risk_level"] = get_risk_model().classify([emotion_scores])[0]["risk_level"]
+    return progress
+
+
+def _plan_segments(recording):
+    """Splits a recording into segments and queues one transcription job per segment."""
+    recording.duration = audio.probe_duration(recording.file.path)
+    recording.save(update_fields=["duration"])
+    recording.segments.all().delete()
+    segments = AudioSegment.objects.bulk_create([
+        AudioSegment(audio=recording, index=i, start=start, end=end)
+        for i, (start, end) in enumerate(audio.segment_bounds(recording.duration))
+    ])
+    if not segments:
+        raise ValueError("The recording is empty.")
+    AnalysisJob.objects.bulk_create([
+        AnalysisJob(dream=recording.dream, kind=AnalysisJob.TRANSCRIBE, segment=segment) for segment in segments
+    ])
+
+
+def _assemble_if_complete(recording):
+    """
+    Once every segment is finished, joins their text into the dream and queues
+    the regular analysis job. The conditional update lets exactly one worker win.
+    """
+    if recording.segments.filter(status=AudioSegment.PENDING).exists():
+        return
+    if not DreamAudio.objects.filter(id=recording.id, transcribed_at__isnull=True).update(transcribed_at=timezone.now()):
+        return
+    texts = recording.segments.filter(status=AudioSegment.DONE).order_by("index").values_list("text", flat=True)
+    transcript = " ".join(text for text in texts if text)
+    if not transcript:
+        _fail_recording(recording, "No speech could be transcribed from the recording.")
+        return
+    dream = recording.dream
+    dream.dream_text = transcript
+    dream.save(analyze=False)
+    enqueue_analysis(dream)
+
+
+def _fail_recording(recording, error):
+    dream = recording.dream
+    dream.apply_analysis(error_result(f"transcription failed: {error}"))
+    dream.save(analyze=False)
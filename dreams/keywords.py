@@ -0,0 +1,216 @@
+# dreams/keywords.py
+# Keyword extraction for analysis results. The stopword set and tokenizer are
+# built once per process, texts are scored in batches, and TF-IDF weights come
+# from a corpus-wide document-frequency table (KeywordDocumentFrequency) that
+# grows as dreams are analyzed.
+
+import math
+import re
+import threading
+import time
+from collections import Counter
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+
+_NON_ALPHA_RE = re.compile(r"[^a-z\s]+")
+MIN_TOKEN_LENGTH = 3
+MAX_TERM_LENGTH = 64
+# KeywordDocumentFrequency row that holds the number of documents seen
+TOTAL_TERM = ""
+
+_stopwords = None
+
+_df_lock = threading.Lock()
+# ({term: document count}, total documents), or None until first loaded
+_df_snapshot = None
+_df_loaded_at = 0.0
+_df_refreshing = False
+
+
+def stopwords():
+    """English stopwords, loaded once: NLTK's list when available, else scikit-learn's."""
+    global _stopwords
+    if _stopwords is None:
+        try:
+            import nltk
+            try:
+                nltk.data.find("corpora/stopwords")
+            except LookupError:
+                print("NLTK 'stopwords' not found. Downloading...")
+                nltk.download("stopwords", quiet=True)
+            _stopwords = frozenset(nltk.corpus.stopwords.words("english"))
+        except Exception as e:
+            from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+            print(f"NLTK stopwords unavailable ({type(e).__name__}); using scikit-learn's list.")
+            _stopwords = frozenset(ENGLISH_STOP_WORDS)
+    return _stopwords
+
+
+def tokenize(text):
+    """
+    Lowercase alphabetic tokens of at least three letters, without stopwords.
+    Non-letters are dropped before splitting, so "don't" becomes "dont".
+    """
+    stop = stopwords()
+    return [
+        token for token in _NON_ALPHA_RE.sub("", (text or "").lower()).split()
+        if len(token) >= MIN_TOKEN_LENGTH and len(token) <= MAX_TERM_LENGTH and token not in stop
+    ]
+
+
+def _scoring():
+    return getattr(settings, "DREAM_KEYWORD_SCORING", "tfidf")
+
+
+# --- Document Frequencies ---
+def document_frequencies(terms):
+    """
+    Returns ({term: document count}, total documents) for the given terms.
+
+    Keywords are extracted on the inference threads (the micro-batcher, the async
+    executor, the inference server's handlers), where Django never closes or
+    health-checks connections. So they read an in-memory copy of the table instead,
+    loaded on a short-lived thread of its own and reloaded in the background every
+    DREAM_KEYWORD_DF_TTL seconds. Only the first call waits for the load.
+    """
+    global _df_refreshing
+    ttl = float(getattr(settings, "DREAM_KEYWORD_DF_TTL", 300))
+    with _df_lock:
+        first = _df_snapshot is None and not _df_loaded_at
+        start = not _df_refreshing and (first or time.monotonic() - _df_loaded_at > ttl)
+        if start:
+            _df_refreshing = True
+    if start:
+        loader = threading.Thread(target=_refresh_document_frequencies, name="keyword-df", daemon=True)
+        loader.start()
+        if first:
+            loader.join()
+    frequencies, total = _df_snapshot or ({}, 0)
+    return {term: frequencies[term] for term in terms if term in frequencies}, total
+
+
+def _refresh_document_frequencies():
+    global _df_snapshot, _df_loaded_at, _df_refreshing
+    from .models import KeywordDocumentFrequency
+
+    snapshot = None
+    try:
+        rows = dict(KeywordDocumentFrequency.objects.values_list("term", "document_count").iterator(chunk_size=10000))
+        snapshot = rows, rows.pop(TOTAL_TERM, 0)
+    except DatabaseError as e:
+        # Keeps the previous copy (or plain counts) until the next reload
+        print(f"Keyword document frequencies unavailable: {e}")
+    finally:
+        # This thread's connection would otherwise stay open until the process exits
+        connections.close_all()
+        with _df_lock:
+            if snapshot is not None:
+                _df_snapshot = snapshot
+            _df_loaded_at = time.monotonic()
+            _df_refreshing = False
+
+
+def observe_documents(texts):
+    """
+    Adds the texts to the document-frequency table: each distinct term's count
+    and the total go up by one per document, in a few upsert statements.
+    """
+    from .models import KeywordDocumentFrequency
+
+    counts = Counter()
+    documents = 0
+    for text in texts:
+        counts.update(set(tokenize(text)))
+        documents += 1
+    if not documents:
+        return
+    counts[TOTAL_TERM] = documents
+
+    table = connection.ops.quote_name(KeywordDocumentFrequency._meta.db_table)
+    items = list(counts.items())
+    # Two parameters per row keeps each statement under SQLite's variable limit
+    for start in range(0, len(items), 400):
+        chunk = items[start:start + 400]
+        placeholders = ", ".join(["(%s, %s)"] * len(chunk))
+        params = [value for item in chunk for value in item]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (term, document_count) VALUES {placeholders} "
+                f"ON CONFLICT (term) DO UPDATE SET document_count = {table}.document_count + excluded.document_count",
+                params,
+            )
+
+
+def rebuild_document_frequencies(texts, batch_size=1000):
+    """Recomputes the table from scratch from an iterable of texts. Returns documents counted."""
+    from .models import KeywordDocumentFrequency
+
+    batch = []
+    total = 0
+    with transaction.atomic():
+        KeywordDocumentFrequency.objects.all().delete()
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= batch_size:
+                observe_documents(batch)
+                total += len(batch)
+                batch = []
+        observe_documents(batch)
+    return total + len(batch)
+
+
+# --- Extraction ---
+def _pretokenized(tokens):
+    return tokens
+
+
+def extract_keywords_batch(texts, top_k=10):
+    """
+    Top keywords for each text. With DREAM_KEYWORD_SCORING="tfidf" terms are
+    ranked by count x smoothed IDF from the document-frequency table (plain counts
+    until the table has data); "count" ranks by count alone. Ties keep the order
+    in which the terms first appear.
+    """
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    token_lists = [tokenize(text) for text in texts]
+    if not token_lists:
+        return []
+    vectorizer = CountVectorizer(analyzer=_pretokenized)
+    try:
+        counts = vectorizer.fit_transform(token_lists).tocsr()
+    except ValueError:
+        # No text in the batch has a single keyword
+        return [[] for _ in token_lists]
+    vocabulary = vectorizer.get_feature_names_out()
+
+    weights = np.ones(len(vocabulary))
+    if _scoring() == "tfidf":
+        frequencies, total = document_frequencies(vocabulary.tolist())
+        if total:
+            df = np.array([frequencies.get(term, 0) for term in vocabulary], dtype=np.float64)
+            # Same smoothing as scikit-learn's TfidfTransformer(smooth_idf=True)
+            weights = np.log((1.0 + total) / (1.0 + df)) + 1.0
+
+    results = []
+    for row, tokens in enumerate(token_lists):
+        start, end = counts.indptr[row], counts.indptr[row + 1]
+        columns = counts.indices[start:end]
+        if not len(columns):
+            results.append([])
+            continue
+        scores = counts.data[start:end] * weights[columns]
+        first_seen = {}
+        for position, token in enumerate(tokens):
+            first_seen.setdefault(token, position)
+        ranked = sorted(
+            zip(scores, columns),
+            key=lambda item: (-item[0], first_seen.get(vocabulary[item[1]], math.inf)),
+        )
+        results.append([str(vocabulary[column]) for _, column in ranked[:top_k]])
+    return results
+
+
+def extract_keywords(text, top_k=10):
+    return extract_keywords_batch([text], top_k)[0]
@@ -0,0 +1,40 @@
+# dreams/management/commands/check_backend_parity.py
+
+from django.core.management.base import BaseCommand, CommandError
+from dreams import ai_pipeline
+from dreams.models import DreamNarration
+
+SAMPLE_DREAMS = [
+    "I was falling from a tall building and woke up just before I hit the ground.",
+    "My teeth crumbled one by one while everyone at the party kept laughing.",
+    "I was flying over a calm blue ocean and felt completely free.",
+    "Someone was chasing me through a dark forest and I could not scream.",
+    "I was back at school, late for an exam I had never studied for.",
+    "My grandmother, who passed away years ago, hugged me and told me she was proud.",
+]
+
+
+class Command(BaseCommand):
+    help = "Reports the maximum score deviation of an inference backend against the torch backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", default="onnx", choices=[b for b in ai_pipeline.BACKENDS if b != "torch"])
+        parser.add_argument("--limit", type=int, default=0, help="Also compare up to this many stored dreams.")
+        parser.add_argument("--tolerance", type=float, default=0.05, help="Fail if any score deviates by more than this.")
+
+    def handle(self, *args, **options):
+        texts = list(SAMPLE_DREAMS)
+        if options["limit"]:
+            texts += list(DreamNarration.objects.order_by("-id").values_list("dream_text", flat=True)[:options["limit"]])
+
+        try:
+            report = ai_pipeline.compare_backends(texts, options["backend"])
+        except Exception as e:
+            raise CommandError(f"Could not compare backends: {e}")
+
+        for key, value in report.items():
+            self.stdout.write(f"{key}: {value:.6f}" if isinstance(value, float) else f"{key}: {value}")
+        worst = max(report["max_sentiment_deviation"], report["max_emotion_deviation"])
+        if worst > options["tolerance"]:
+            raise CommandError(f"Maximum deviation {worst:.6f} exceeds tolerance {options['tolerance']}.")
+        self.stdout.write(self.style.SUCCESS(f"{options['backend']} matches torch within {options['tolerance']}."))
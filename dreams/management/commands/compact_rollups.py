@@ -0,0 +1,11 @@
+# dreams/management/commands/compact_rollups.py
+
+from django.core.management.base import BaseCommand
+from dreams import rollups
+
+
+class Command(BaseCommand):
+    help = "Drops daily rollups older than DREAM_ROLLUP_DAILY_DAYS and rollups that no longer count any dream."
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Compacted {rollups.compact()} rollup rows."))
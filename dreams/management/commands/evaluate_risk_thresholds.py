@@ -0,0 +1,37 @@
+# dreams/management/commands/evaluate_risk_thresholds.py
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from dreams.emotion_vectors import load_matrix
+from dreams.models import DreamNarration
+from dreams.risk import get_risk_model, load_risk_model
+
+
+class Command(BaseCommand):
+    help = "What-if evaluation: re-scores stored emotion scores under other risk rules or thresholds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rules-file", help="JSON rules/thresholds file to evaluate (defaults to the active rules).")
+        parser.add_argument("--high", type=float, help="Override the High threshold.")
+        parser.add_argument("--moderate", type=float, help="Override the Moderate threshold.")
+        parser.add_argument("--condition", type=float, help="Override the cut-off for reporting a condition.")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        model = load_risk_model(options["rules_file"]) if options["rules_file"] else get_risk_model()
+        overrides = {k: options[k] for k in ("high", "moderate", "condition") if options[k] is not None}
+
+        # The packed emotion vectors are loaded straight into one matrix, in the
+        # risk model's label order, and scored with a single matrix multiply
+        _, _, matrix = load_matrix(DreamNarration.objects.all(), model.labels, options["chunk_size"])
+
+        current = {
+            row["risk_level"] or "None": row["count"]
+            for row in DreamNarration.objects.values("risk_level").annotate(count=Count("id"))
+        }
+        proposed = model.level_counts(matrix, overrides) if len(matrix) else {}
+
+        self.stdout.write(f"Dreams with stored emotion scores: {len(matrix)}")
+        self.stdout.write(f"{'Risk level':<12}{'Stored':>10}{'What-if':>10}")
+        for level in sorted(set(current) | set(proposed)):
+            self.stdout.write(f"{level:<12}{current.get(level, 0):>10}{proposed.get(level, 0):>10}")
@@ -0,0 +1,192 @@
+# dreams/management/commands/reanalyze_dreams.py
+
+import json
+import multiprocessing
+import os
+from datetime import datetime, time
+from functools import partial
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from dreams import embeddings
+from dreams.ai_pipeline import analyze_dreams, model_version
+from dreams.emotion_vectors import stack
+from dreams.jobs import ANALYSIS_FIELDS
+from dreams.models import TRACKED_FIELDS, DreamNarration, record_changes
+from dreams.risk import get_risk_model
+
+
+def _init_worker():
+    # Forked workers must not share the parent's database connections
+    django.setup()
+    connections.close_all()
+
+
+def reanalyze_chunk(ids, risk_only=False):
+    """
+    Re-scores one chunk of dreams and writes the results with bulk_update (save()
+    and its signals are bypassed; the aggregate tables get the deltas). Returns
+    (max_id, updated, failed, skipped).
+
+    With risk_only, only the risk fields are recomputed from the stored emotion
+    scores, so no model is loaded at all; dreams without stored scores are skipped.
+    """
+    if risk_only:
+        return _rescore_risk_chunk(ids)
+    dreams = list(
+        DreamNarration.objects.filter(id__in=ids).only(*TRACKED_FIELDS, "dream_text", "analysis_json")
+        .order_by("id").iterator()
+    )
+    results = analyze_dreams([dream.dream_text for dream in dreams])
+    updated = []
+    for dream, result in zip(dreams, results):
+        # Keep the previous analysis rather than overwriting it with an error
+        if "error" not in result:
+            dream.apply_analysis(result)
+            updated.append(dream)
+    # One transaction, so the aggregate deltas are never applied without the rows
+    with transaction.atomic():
+        DreamNarration.objects.bulk_update(updated, ANALYSIS_FIELDS)
+        record_changes(updated)
+    embeddings.record(updated)
+    return max(ids), len(updated), len(dreams) - len(updated), 0
+
+
+def _rescore_risk_chunk(ids):
+    dreams = [
+        dream for dream in (
+            DreamNarration.objects.filter(id__in=ids).only(*TRACKED_FIELDS, "analysis_json").order_by("id").iterator()
+        )
+        if dream.emotion_vector is not None
+    ]
+    model = get_risk_model()
+    _, matrix = stack(dreams, model.labels)
+    risks = model.classify_matrix(matrix)
+    for dream, risk_details in zip(dreams, risks):
+        # model_version stays as it is: only the risk part of the analysis is current
+        dream.analysis_json["risk_version"] = model.fingerprint
+        dream.analysis_json["risk_scores_by_condition"] = risk_details["risk_scores_by_condition"]
+        dream.analysis_json["top_condition_details"] = risk_details["top_condition_details"]
+        dream.risk_level = risk_details["risk_level"]
+        dream.potential_condition = risk_details["potential_condition"]
+    with transaction.atomic():
+        DreamNarration.objects.bulk_update(dreams, ["risk_level", "potential_condition", "analysis_json"])
+        record_changes(dreams)
+    return max(ids), len(dreams), 0, len(ids) - len(dreams)
+
+
+def _id_chunks(queryset, chunk_size, after_id):
+    """
+    Streams matching ids in ascending chunks using keyset pagination, so no
+    long-lived cursor holds the database while workers write.
+    """
+    ids = queryset.values_list("id", flat=True).order_by("id")
+    while True:
+        chunk = list(ids.filter(id__gt=after_id)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1]
+
+
+class Command(BaseCommand):
+    help = "Re-runs AI analysis over stored dreams in batches, without calling save()."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only dreams of this username.")
+        parser.add_argument("--since", help="Only dreams created on or after this date (YYYY-MM-DD).")
+        parser.add_argument("--until", help="Only dreams created on or before this date (YYYY-MM-DD).")
+        parser.add_argument("--model-version", help="Only dreams analyzed with this model version.")
+        parser.add_argument("--outdated", action="store_true", help="Only dreams not analyzed with the current model version.")
+        parser.add_argument(
+            "--risk-only", action="store_true",
+            help="Only recompute risk levels from stored emotion scores (no model inference). "
+                 "With --outdated, only dreams not scored with the current risk rules.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=500, help="Dreams loaded and written per chunk.")
+        parser.add_argument("--workers", type=int, default=1, help="Worker processes analyzing chunks in parallel.")
+        parser.add_argument("--checkpoint", help="JSON file recording progress; an existing file resumes the run.")
+
+    def _parse_date(self, value, end_of_day=False):
+        try:
+            day = datetime.strptime(value, "%Y-%m-%d").date()
+        except ValueError:
+            raise CommandError(f"Invalid date {value!r}; expected YYYY-MM-DD.")
+        return timezone.make_aware(datetime.combine(day, time.max if end_of_day else time.min))
+
+    def _queryset(self, options):
+        queryset = DreamNarration.objects.exclude(dream_text="")
+        if options["user"]:
+            user = User.objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"Unknown user {options['user']!r}.")
+            queryset = queryset.filter(user=user)
+        if options["since"]:
+            queryset = queryset.filter(created_at__gte=self._parse_date(options["since"]))
+        if options["until"]:
+            queryset = queryset.filter(created_at__lte=self._parse_date(options["until"], end_of_day=True))
+        if options["model_version"]:
+            queryset = queryset.filter(analysis_json__model_version=options["model_version"])
+        if options["outdated"] and options["risk_only"]:
+            current = DreamNarration.objects.filter(analysis_json__risk_version=get_risk_model().fingerprint)
+            queryset = queryset.exclude(id__in=current.values("id"))
+        elif options["outdated"]:
+            current = DreamNarration.objects.filter(analysis_json__model_version=model_version())
+            queryset = queryset.exclude(id__in=current.values("id"))
+        return queryset
+
+    def _load_checkpoint(self, path):
+        if path and os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return {"last_id": 0, "updated": 0, "failed": 0, "skipped": 0}
+
+    def _save_checkpoint(self, path, state):
+        if not path:
+            return
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+
+    def handle(self, *args, **options):
+        queryset = self._queryset(options)
+        state = self._load_checkpoint(options["checkpoint"])
+        state.setdefault("skipped", 0)
+        if state["last_id"]:
+            self.stdout.write(f"Resuming after dream id {state['last_id']}.")
+        chunks = _id_chunks(queryset, options["chunk_size"], state["last_id"])
+        work = partial(reanalyze_chunk, risk_only=options["risk_only"])
+
+        if options["workers"] > 1:
+            connections.close_all()
+            pool = multiprocessing.Pool(options["workers"], initializer=_init_worker)
+            # imap keeps results in order, so the checkpoint only ever moves past
+            # chunks that are completely written
+            results = pool.imap(work, chunks)
+        else:
+            pool = None
+            results = map(work, chunks)
+
+        try:
+            for last_id, updated, failed, skipped in results:
+                state["last_id"] = last_id
+                state["updated"] += updated
+                state["failed"] += failed
+                state["skipped"] += skipped
+                self._save_checkpoint(options["checkpoint"], state)
+                self.stdout.write(f"Up to dream id {last_id}: {self._summary(state)}.")
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        self.stdout.write(self.style.SUCCESS(f"Re-analysis finished: {self._summary(state)}."))
+
+    def _summary(self, state):
+        summary = f"{state['updated']} updated, {state['failed']} failed"
+        if state["skipped"]:
+            summary += f", {state['skipped']} skipped (no stored emotion scores)"
+        return summary
@@ -0,0 +1,73 @@
+# dreams/management/commands/rebuild_embedding_index.py
+
+import shutil
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from dreams import embeddings
+from dreams.ai_pipeline import embed_texts
+from dreams.models import DreamNarration
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the similar-dream embedding index: re-embeds every analyzed dream with the emotion "
+        "model's encoder, drops deleted and superseded rows and trains the IVF lists used by global searches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recluster", action="store_true",
+            help="Keep the indexed vectors; only drop stale rows and retrain the IVF lists (no models needed).",
+        )
+        parser.add_argument(
+            "--lists", type=int, default=None,
+            help="IVF lists to train (default: about sqrt(dreams), none below 20000; 0 disables IVF).",
+        )
+        parser.add_argument("--batch-size", type=int, default=32, help="Dreams embedded per model pass.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Dreams read from the database per query.")
+
+    def handle(self, *args, **options):
+        directory = embeddings.index_dir()
+        work = directory.with_name(f"{directory.name}.rebuild")
+        try:
+            if options["recluster"]:
+                since = embeddings.clone(work, directory)
+                if since is None:
+                    raise CommandError(f"No embedding index at {directory}; run without --recluster to build one.")
+            else:
+                since = embeddings.snapshot(directory)
+                shutil.rmtree(work, ignore_errors=True)
+                self._embed_all(work, options["batch_size"], options["chunk_size"])
+
+            dream_ids = np.fromiter(DreamNarration.objects.values_list("id", flat=True).iterator(), dtype=np.int64)
+            meta = embeddings.compact(work, options["lists"], keep=dream_ids)
+            if meta is None:
+                self.stdout.write("No analyzed dreams to index.")
+                return
+            embeddings.swap_in(work, directory, since)
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+        index = embeddings.EmbeddingIndex(directory)
+        index.refresh()
+        lists = f"{meta['lists']} IVF lists" if meta["lists"] else "no IVF lists (exact search)"
+        self.stdout.write(self.style.SUCCESS(f"Embedding index rebuilt: {len(index)} dream(s), {lists}."))
+
+    def _embed_all(self, work, batch_size, chunk_size):
+        last_id = 0
+        queryset = DreamNarration.objects.exclude(text_hash="").only("id", "user_id", "dream_text").order_by("id")
+        while True:
+            dreams = list(queryset.filter(id__gt=last_id)[:chunk_size])
+            if not dreams:
+                return
+            for start in range(0, len(dreams), batch_size):
+                batch = dreams[start:start + batch_size]
+                try:
+                    vectors = embed_texts([dream.dream_text for dream in batch])
+                except RuntimeError as e:
+                    raise CommandError(str(e))
+                embeddings.append(
+                    [(dream.id, dream.user_id, vector) for dream, vector in zip(batch, vectors)], work,
+                )
+            last_id = dreams[-1].id
+            self.stdout.write(f"Embedded dreams up to id {last_id}.")
@@ -0,0 +1,21 @@
+# dreams/management/commands/rebuild_keyword_stats.py
+
+from django.core.management.base import BaseCommand
+from dreams.keywords import rebuild_document_frequencies
+from dreams.models import DreamNarration
+
+
+class Command(BaseCommand):
+    help = "Recounts the keyword document-frequency table used for TF-IDF keywords from all analyzed dreams."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        texts = (
+            DreamNarration.objects.exclude(text_hash="")
+            .values_list("dream_text", flat=True)
+            .iterator(chunk_size=options["batch_size"])
+        )
+        counted = rebuild_document_frequencies(texts, options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Counted keywords of {counted} dream(s)."))
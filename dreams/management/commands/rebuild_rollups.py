@@ -0,0 +1,36 @@
+# dreams/management/commands/rebuild_rollups.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from dreams import rollups
+
+
+class Command(BaseCommand):
+    help = "Recomputes the daily/weekly trend rollups from the dreams table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Only rebuild this username's rollups (global rows are left alone).")
+        parser.add_argument("--since", help="Only rebuild periods from the week containing this date (YYYY-MM-DD).")
+        parser.add_argument("--compact", action="store_true", help="Run compact_rollups afterwards.")
+
+    def handle(self, *args, **options):
+        user = None
+        if options["user"]:
+            user = User.objects.filter(username=options["user"]).first()
+            if user is None:
+                raise CommandError(f"Unknown user {options['user']!r}.")
+        since = None
+        if options["since"]:
+            try:
+                since = parse_date(options["since"])
+            except ValueError:
+                # Well formed but impossible, e.g. 2024-02-30
+                since = None
+            if since is None:
+                raise CommandError(f"Invalid date {options['since']!r}; expected YYYY-MM-DD.")
+
+        written = rollups.rebuild(user=user, since=since)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {written} rollup rows."))
+        if options["compact"]:
+            self.stdout.write(f"Compacted {rollups.compact()} rollup rows.")
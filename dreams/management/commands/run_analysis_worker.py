@@ -0,0 +1,63 @@
+# dreams/management/commands/run_analysis_worker.py
+
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from dreams import metrics
+from dreams.jobs import claim_jobs, process_jobs, requeue_stale_jobs
+from dreams.models import AnalysisJob
+
+
+class Command(BaseCommand):
+    help = "Runs the background worker that analyzes queued dreams in batches and transcribes recordings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=16, help="Maximum jobs analyzed per batch.")
+        parser.add_argument(
+            "--transcribe-batch", type=int, default=1,
+            help="Transcription segments claimed per poll; keep it small so segments spread across workers.",
+        )
+        parser.add_argument(
+            "--kind", choices=[AnalysisJob.ANALYZE, AnalysisJob.TRANSCRIBE],
+            help="Only process this kind of job (e.g. run several transcription-only workers).",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to sleep when the queue is empty.")
+        parser.add_argument(
+            "--stale-after", type=int, default=600,
+            help="Requeue running jobs older than this many seconds on startup (0 disables).",
+        )
+        parser.add_argument("--once", action="store_true", help="Drain the queue once and exit.")
+        parser.add_argument(
+            "--metrics-port", type=int, default=0,
+            help="Serve Prometheus metrics for this worker on http://0.0.0.0:PORT/metrics (0 disables).",
+        )
+
+    def handle(self, *args, **options):
+        if options["stale_after"]:
+            requeued = requeue_stale_jobs(options["stale_after"])
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        if options["metrics_port"]:
+            metrics.serve(options["metrics_port"])
+            self.stdout.write(f"Serving metrics on port {options['metrics_port']}.")
+
+        self.stdout.write("Analysis worker started.")
+        try:
+            while True:
+                close_old_connections()
+                jobs = []
+                if options["kind"] != AnalysisJob.TRANSCRIBE:
+                    jobs += claim_jobs(options["batch_size"], kind=AnalysisJob.ANALYZE)
+                if options["kind"] != AnalysisJob.ANALYZE:
+                    jobs += claim_jobs(options["transcribe_batch"], kind=AnalysisJob.TRANSCRIBE)
+                if jobs:
+                    succeeded, failed = process_jobs(jobs)
+                    self.stdout.write(f"Processed batch of {len(jobs)}: {succeeded} done, {failed} failed.")
+                    continue
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write("Analysis worker stopped.")
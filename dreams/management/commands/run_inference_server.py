@@ -0,0 +1,32 @@
+# dreams/management/commands/run_inference_server.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from dreams import ai_pipeline
+from dreams.inference_server import make_server
+
+
+class Command(BaseCommand):
+    help = "Serves analyze_dream() from one process that owns the AI models."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--address",
+            default=settings.DREAM_INFERENCE_SERVER or "http://127.0.0.1:8765",
+            help='Listen address, e.g. "http://127.0.0.1:8765" or "unix:///tmp/dream-inference.sock".',
+        )
+
+    def handle(self, *args, **options):
+        sentiment_pipe, emotion_pipe = ai_pipeline.get_pipelines()
+        if not sentiment_pipe or not emotion_pipe:
+            raise CommandError("Could not load the AI models; see the error above.")
+
+        server = make_server(options["address"])
+        self.stdout.write(f"Inference server listening on {options['address']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        self.stdout.write("Inference server stopped.")
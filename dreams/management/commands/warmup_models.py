@@ -0,0 +1,20 @@
+# dreams/management/commands/warmup_models.py
+
+from django.core.management.base import BaseCommand, CommandError
+from dreams import ai_pipeline
+
+
+class Command(BaseCommand):
+    help = "Loads the AI models and runs a dummy analysis, e.g. to check a deployment or time a cold start."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--whisper", action="store_true", help="Also load the Whisper model used for recordings.")
+
+    def handle(self, *args, **options):
+        try:
+            timings = ai_pipeline.warmup(whisper=options["whisper"], models=True)
+        except Exception as e:
+            raise CommandError(f"Warmup failed: {e}")
+        for step, seconds in timings.items():
+            self.stdout.write(f"{step}: {seconds:.2f}s")
+        self.stdout.write(self.style.SUCCESS(f"Models warm ({sum(timings.values()):.2f}s)."))
@@ -0,0 +1,210 @@
+# dreams/metrics.py
+# In-process counters, gauges and histograms for the analysis pipeline, rendered
+# in the Prometheus text exposition format by metrics_view (/dreams/metrics/),
+# the inference server (/metrics) and `run_analysis_worker --metrics-port`.
+#
+# Values are per process: under gunicorn each scrape reports the worker that
+# served it (the `pid` label tells them apart), so scrape the inference server
+# or the analysis worker when they own the models.
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; covers a cached hit (~ms) up to a long narration on CPU
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+_registry = []
+_collectors = []
+_lock = threading.Lock()
+
+
+def _label_text(names, values):
+    pairs = [*zip(names, values), ("pid", str(os.getpid()))]
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount:
+            key = self._key(labels)
+            with _lock:
+                self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with _lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_text(self.labelnames, key)} {value}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with _lock:
+            # [cumulative bucket counts, sum, count]
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        with _lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{self.name}_bucket{_label_text((*self.labelnames, 'le'), (*key, bound))} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_label_text((*self.labelnames, 'le'), (*key, '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_label_text(self.labelnames, key)} {round(total, 6)}")
+            lines.append(f"{self.name}_count{_label_text(self.labelnames, key)} {count}")
+        return lines
+
+
+def register_collector(name, help_text, kind, labelnames, collect):
+    """
+    Adds a metric whose samples are computed at scrape time: `collect()` returns
+    {label values tuple: value}. Used for values owned elsewhere (queue depths,
+    the result cache's counters).
+    """
+    _collectors.append((name, help_text, kind, tuple(labelnames), collect))
+
+
+# --- Pipeline Metrics ---
+STAGE_SECONDS = Histogram(
+    "dream_analysis_stage_seconds", "Time spent in each analysis stage per batch.", ["stage"],
+)
+BATCH_SIZE = Histogram(
+    "dream_analysis_batch_size", "Texts per model pass (run_inference) and per micro-batch.", ["source"],
+    buckets=SIZE_BUCKETS,
+)
+TEXTS = Counter("dream_analysis_texts_total", "Texts run through the models.")
+ERRORS = Counter("dream_analysis_errors_total", "Analyses that returned an error result.", ["reason"])
+
+
+class StageTimer:
+    """
+    Per-call stage durations, summed per stage. finish() records them in
+    STAGE_SECONDS and returns the call's own breakdown (analysis_json["timings_ms"]).
+    Stages running concurrently on different threads each keep their own duration.
+    """
+    def __init__(self):
+        self.seconds = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def finish(self, **extra):
+        for stage, seconds in self.seconds.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+        timings = {stage: round(seconds * 1000, 2) for stage, seconds in self.seconds.items()}
+        timings["total"] = round((time.perf_counter() - self.started) * 1000, 2)
+        timings.update(extra)
+        return timings
+
+
+@contextmanager
+def timed(stage):
+    """Records a stage that isn't part of a StageTimer, e.g. the DB write after analysis."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+# --- Exposition ---
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render(close_connections=False):
+    """
+    All metrics in the Prometheus text format. Servers outside Django's request
+    cycle pass close_connections=True: Django never closes the connections that
+    collectors open on their threads.
+    """
+    try:
+        return _render()
+    finally:
+        if close_connections:
+            from django.db import connections
+            connections.close_all()
+
+
+def _render():
+    lines = []
+    for metric in _registry:
+        samples = metric.render()
+        if samples:
+            lines += metric.header() + samples
+    for name, help_text, kind, labelnames, collect in _collectors:
+        try:
+            samples = collect()
+        except Exception as e:
+            lines.append(f"# {name} unavailable: {type(e).__name__}")
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        lines += [f"{name}{_label_text(labelnames, key)} {value}" for key, value in sorted(samples.items())]
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render(close_connections=True).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port, host="0.0.0.0"):
+    """Serves /metrics from a daemon thread (for processes without a web server)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="dream-metrics", daemon=True).start()
+    return server
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:12
+
+import hashlib
+from django.db import migrations, models
+
+
+def backfill_text_hash(apps, schema_editor):
+    # Rows that were already analyzed keep their results; stamping the hash stops
+    # the next unrelated save (e.g. an admin edit) from re-running the models.
+    DreamNarration = apps.get_model('dreams', 'DreamNarration')
+    batch = []
+    rows = DreamNarration.objects.exclude(analysis_json__isnull=True).only('id', 'dream_text')
+    for dream in rows.iterator(chunk_size=1000):
+        dream.text_hash = hashlib.sha256((dream.dream_text or '').encode('utf-8')).hexdigest()
+        batch.append(dream)
+        if len(batch) >= 1000:
+            DreamNarration.objects.bulk_update(batch, ['text_hash'])
+            batch = []
+    if batch:
+        DreamNarration.objects.bulk_update(batch, ['text_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dreams', '0002_alter_dreamnarration_emotion_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dreamnarration',
+            name='text_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(backfill_text_hash, migrations.RunPython.noop),
+    ]
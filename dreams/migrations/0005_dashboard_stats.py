@@ -0,0 +1,97 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+BATCH_SIZE = 1000
+
+
+def _primary_emotion(emotion):
+    # `emotion` holds either the full score dict (save()) or a capitalized label (views)
+    if isinstance(emotion, dict):
+        scores = {k: v for k, v in emotion.items() if isinstance(v, (int, float))}
+        return max(scores, key=scores.get).lower() if scores else ''
+    if isinstance(emotion, str) and emotion not in ('', 'N/A', 'N/a'):
+        return emotion.lower()
+    return ''
+
+
+def backfill_dashboard_stats(apps, schema_editor):
+    DreamNarration = apps.get_model('dreams', 'DreamNarration')
+    UserDreamStats = apps.get_model('dreams', 'UserDreamStats')
+
+    batch = []
+    rows = DreamNarration.objects.exclude(emotion__isnull=True).only('id', 'emotion').order_by('id')
+    for dream in rows.iterator(chunk_size=BATCH_SIZE):
+        dream.primary_emotion = _primary_emotion(dream.emotion)
+        if dream.primary_emotion:
+            batch.append(dream)
+        if len(batch) >= BATCH_SIZE:
+            DreamNarration.objects.bulk_update(batch, ['primary_emotion'])
+            batch = []
+    if batch:
+        DreamNarration.objects.bulk_update(batch, ['primary_emotion'])
+
+    totals = (
+        DreamNarration.objects.order_by()
+        .values('user_id')
+        .annotate(
+            total=Count('id'),
+            lucid=Count('id', filter=Q(primary_emotion='joy')),
+            nightmares=Count('id', filter=Q(risk_level__iexact='High')),
+        )
+    )
+    UserDreamStats.objects.bulk_create(
+        (
+            UserDreamStats(
+                user_id=row['user_id'],
+                total_dreams=row['total'],
+                lucid_dreams=row['lucid'],
+                nightmare_count=row['nightmares'],
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('dreams', '0004_analysisjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDreamStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='dream_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_dreams', models.PositiveIntegerField(default=0)),
+                ('lucid_dreams', models.PositiveIntegerField(default=0)),
+                ('nightmare_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dreamnarration',
+            name='primary_emotion',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='dreamnarration',
+            index=models.Index(fields=['user', 'created_at'], name='dreams_drea_user_id_2697f9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dreamnarration',
+            index=models.Index(fields=['user', 'risk_level'], name='dreams_drea_user_id_21a485_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dreamnarration',
+            index=models.Index(fields=['user', 'primary_emotion'], name='dreams_drea_user_id_2cf7cc_idx'),
+        ),
+        migrations.RunPython(backfill_dashboard_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dreams', '0005_dashboard_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dreamnarration',
+            index=models.Index(fields=['created_at', 'risk_level'], name='dreams_drea_created_57fdeb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dreamnarration',
+            index=models.Index(fields=['created_at', 'sentiment'], name='dreams_drea_created_977187_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dreamnarration',
+            index=models.Index(fields=['created_at', 'primary_emotion'], name='dreams_drea_created_a2b0d2_idx'),
+        ),
+    ]
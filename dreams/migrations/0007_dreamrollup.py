@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dreams', '0006_dashboard_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DreamRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Day'), ('week', 'Week')], max_length=4)),
+                ('period_start', models.DateField()),
+                ('dream_count', models.PositiveIntegerField(default=0)),
+                ('risk_counts', models.JSONField(default=dict)),
+                ('sentiment_counts', models.JSONField(default=dict)),
+                ('emotion_counts', models.JSONField(default=dict)),
+                ('scored_count', models.PositiveIntegerField(default=0)),
+                ('emotion_score_sums', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='dream_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('period', 'user', 'period_start'), name='dreams_rollup_unique_user_period'), models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('period', 'period_start'), name='dreams_rollup_unique_global_period')],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dreams', '0007_dreamrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('start', models.FloatField()),
+                ('end', models.FloatField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('text', models.TextField(blank=True, default='')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DreamAudio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='dream_audio/%Y/%m/')),
+                ('duration', models.FloatField(blank=True, null=True)),
+                ('transcribed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='analysisjob',
+            name='dreams_anal_status_001b9a_idx',
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='kind',
+            field=models.CharField(choices=[('analyze', 'Analyze'), ('transcribe', 'Transcribe')], default='analyze', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='analysisjob',
+            name='segment',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='dreams.audiosegment'),
+        ),
+        migrations.AddIndex(
+            model_name='analysisjob',
+            index=models.Index(fields=['status', 'kind', 'id'], name='dreams_anal_status_2f53bd_idx'),
+        ),
+        migrations.AddField(
+            model_name='dreamaudio',
+            name='dream',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='audio', to='dreams.dreamnarration'),
+        ),
+        migrations.AddField(
+            model_name='audiosegment',
+            name='audio',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='dreams.dreamaudio'),
+        ),
+        migrations.AddConstraint(
+            model_name='audiosegment',
+            constraint=models.UniqueConstraint(fields=('audio', 'index'), name='dreams_audio_segment_unique_index'),
+        ),
+    ]
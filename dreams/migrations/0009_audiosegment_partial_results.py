@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dreams', '0008_audio_transcription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiosegment',
+            name='emotion_scores',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audiosegment',
+            name='sentiment',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dreams', '0009_audiosegment_partial_results'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KeywordDocumentFrequency',
+            fields=[
+                ('term', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('document_count', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:15
+
+import hashlib
+import json
+
+import django.db.models.deletion
+import numpy as np
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+DTYPES = {'float16': '<f2', 'float32': '<f4'}
+
+
+def _fingerprint(labels, dtype):
+    # Same as dreams.emotion_vectors.fingerprint()
+    return hashlib.sha256(json.dumps([list(labels), dtype]).encode('utf-8')).hexdigest()[:32]
+
+
+def _stored_scores(dream):
+    # Scores were kept in analysis_json["emotion_scores"] and, for dreams saved
+    # through save(), also as the whole `emotion` dict
+    analysis = dream.analysis_json if isinstance(dream.analysis_json, dict) else {}
+    for scores in (analysis.get('emotion_scores'), dream.emotion):
+        if isinstance(scores, dict):
+            scores = {k: v for k, v in scores.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+            if scores:
+                return scores
+    return None
+
+
+def _chunks(queryset):
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+
+def pack_emotion_scores(apps, schema_editor):
+    EmotionLabelSet = apps.get_model('dreams', 'EmotionLabelSet')
+    DreamNarration = apps.get_model('dreams', 'DreamNarration')
+    dtype = getattr(settings, 'DREAM_EMOTION_VECTOR_DTYPE', 'float16')
+    if dtype not in DTYPES:
+        dtype = 'float16'
+
+    label_sets = {}
+    rows = DreamNarration.objects.only('id', 'emotion', 'analysis_json')
+    for chunk in _chunks(rows):
+        changed = []
+        for dream in chunk:
+            scores = _stored_scores(dream)
+            analysis = dream.analysis_json if isinstance(dream.analysis_json, dict) else None
+            if scores is None and not (analysis and 'emotion_scores' in analysis):
+                continue
+            if scores:
+                labels = tuple(sorted(scores))
+                if labels not in label_sets:
+                    label_sets[labels], _ = EmotionLabelSet.objects.get_or_create(
+                        fingerprint=_fingerprint(labels, dtype), defaults={'labels': list(labels), 'dtype': dtype},
+                    )
+                dream.emotion_labels_id = label_sets[labels].id
+                dream.emotion_vector = np.asarray([scores[label] for label in labels], dtype=DTYPES[dtype]).tobytes()
+                if isinstance(dream.emotion, dict):
+                    # `emotion` now only holds the primary emotion's name, as the views store it
+                    dream.emotion = max(scores, key=scores.get).lower().capitalize()
+            if analysis is not None:
+                analysis.pop('emotion_scores', None)
+            changed.append(dream)
+        DreamNarration.objects.bulk_update(changed, ['emotion', 'analysis_json', 'emotion_labels', 'emotion_vector'])
+
+
+def unpack_emotion_scores(apps, schema_editor):
+    EmotionLabelSet = apps.get_model('dreams', 'EmotionLabelSet')
+    DreamNarration = apps.get_model('dreams', 'DreamNarration')
+
+    label_sets = {row.id: row for row in EmotionLabelSet.objects.all()}
+    rows = DreamNarration.objects.filter(emotion_vector__isnull=False).only('id', 'analysis_json', 'emotion_labels', 'emotion_vector')
+    for chunk in _chunks(rows):
+        for dream in chunk:
+            label_set = label_sets[dream.emotion_labels_id]
+            vector = np.frombuffer(bytes(dream.emotion_vector), dtype=DTYPES[label_set.dtype])
+            analysis = dream.analysis_json if isinstance(dream.analysis_json, dict) else {}
+            analysis['emotion_scores'] = {label: round(float(score), 6) for label, score in zip(label_set.labels, vector)}
+            dream.analysis_json = analysis
+        DreamNarration.objects.bulk_update(chunk, ['analysis_json'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dreams', '0010_keyword_document_frequency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmotionLabelSet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, unique=True)),
+                ('labels', models.JSONField()),
+                ('dtype', models.CharField(max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='dreamnarration',
+            name='emotion_vector',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='dreamnarration',
+            name='emotion_labels',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='dreams.emotionlabelset'),
+        ),
+        migrations.RunPython(pack_emotion_scores, unpack_emotion_scores),
+    ]
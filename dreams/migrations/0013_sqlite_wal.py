@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def enable_wal(apps, schema_editor):
+    """
+    Switches an SQLite database to the WAL journal. The mode is stored in the
+    database file, so it is set once here rather than on every connection.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite" or not getattr(settings, "DREAM_SQLITE_TUNING", True):
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        if cursor.fetchone()[0].lower() not in ("wal", "memory"):
+            cursor.execute("PRAGMA journal_mode=WAL")
+
+
+class Migration(migrations.Migration):
+    # The journal mode cannot be changed inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('dreams', '0012_ingest_batches'),
+    ]
+
+    operations = [
+        migrations.RunPython(enable_wal, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,42 @@
 # dreams/models.py
+import hashlib
+from collections import defaultdict
 from django.db import models
-from .ai_pipeline import analyze_dream
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+# What the dashboard counts as a lucid dream / a nightmare
+LUCID_EMOTION = "joy"
+NIGHTMARE_RISK = "High"
+# Fields the aggregate tables (UserDreamStats, DreamRollup) are derived from; load
+# them (e.g. with .only(*TRACKED_FIELDS)) before changing dreams in bulk
+TRACKED_FIELDS = (
+    "id", "user_id", "created_at", "sentiment", "primary_emotion", "risk_level", "text_hash",
+    "emotion_labels_id", "emotion_vector",
+)
+# Snapshot marker for rows loaded without some of the tracked fields
+UNKNOWN_SNAPSHOT = object()
+
+
+def hash_dream_text(text):
+    """Stable fingerprint of a narration, used to skip re-analysis of unchanged text."""
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class EmotionLabelSet(models.Model):
+    """
+    Label order and dtype of packed emotion vectors (see dreams/emotion_vectors.py).
+    One row per emotion model output layout; rows are never changed once written.
+    """
+    fingerprint = models.CharField(max_length=32, unique=True)
+    labels = models.JSONField()
+    dtype = models.CharField(max_length=10)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{len(self.labels)} labels ({self.dtype})"
 
 
 class DreamNarration(models.Model):
@@ -13,26 +49,417 @@ class DreamNarration(models.Model):
     potential_condition = models.CharField(max_length=100, blank=True, null=True)
     risk_level = models.CharField(max_length=20, blank=True, null=True)
     analysis_json = models.JSONField(blank=True, null=True)
+    # Top emotion label (lowercase), denormalized from the emotion scores so it can be indexed
+    primary_emotion = models.CharField(max_length=50, blank=True, default="")
+    # Hash of the dream_text the analysis fields were computed from
+    text_hash = models.CharField(max_length=64, blank=True, default="", editable=False)
+    # Emotion scores packed as one float vector in emotion_labels' label order; read
+    # them with emotion_scores() or, for many dreams, emotion_vectors.load_matrix()
+    emotion_labels = models.ForeignKey(
+        EmotionLabelSet, on_delete=models.PROTECT, blank=True, null=True, related_name="+",
+    )
+    emotion_vector = models.BinaryField(blank=True, null=True, editable=False)
+    # Set for dreams submitted through the bulk ingestion API (dreams/api.py)
+    ingest_batch = models.ForeignKey(
+        "IngestBatch", on_delete=models.SET_NULL, blank=True, null=True, editable=False, related_name="dreams",
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
-        if self.dream_text:
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at"]),
+            models.Index(fields=["user", "risk_level"]),
+            models.Index(fields=["user", "primary_emotion"]),
+            # Admin dashboard GROUP BYs, optionally over a created_at range
+            models.Index(fields=["created_at", "risk_level"]),
+            models.Index(fields=["created_at", "sentiment"]),
+            models.Index(fields=["created_at", "primary_emotion"]),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what this row currently contributes to the aggregate tables so
+        # later saves only apply the difference; unknown when fields were deferred
+        if all(name in instance.__dict__ for name in TRACKED_FIELDS):
+            instance._snapshot = instance._raw_tracked_state()
+        else:
+            instance._snapshot = UNKNOWN_SNAPSHOT
+        return instance
+
+    def emotion_scores(self):
+        """{label: score} decoded from the packed vector, or None when the dream has none."""
+        from . import emotion_vectors
+
+        if self.emotion_vector is None or not self.emotion_labels_id:
+            return None
+        return emotion_vectors.as_dict(bytes(self.emotion_vector), emotion_vectors.label_set_by_id(self.emotion_labels_id))
+
+    def tracked_state(self):
+        """The values of this dream that the aggregate tables are derived from."""
+        return decode_tracked_state(self._raw_tracked_state())
+
+    def _raw_tracked_state(self):
+        # tracked_state() with the emotion scores still packed, so that loading a
+        # dream does not decode its vector; record_changes() decodes on a change
+        return {
+            "user_id": self.user_id,
+            "day": timezone.localdate(self.created_at) if self.created_at else timezone.localdate(),
+            "sentiment": self.sentiment or "",
+            "primary_emotion": self.primary_emotion or "",
+            "risk_level": self.risk_level or "",
+            "emotion_vector": (
+                self.emotion_labels_id, None if self.emotion_vector is None else bytes(self.emotion_vector),
+            ),
+            "text_hash": self.text_hash,
+        }
+
+    def needs_analysis(self):
+        return bool(self.dream_text) and self.text_hash != hash_dream_text(self.dream_text)
+
+    def apply_analysis(self, result):
+        """
+        Copies an analyze_dream() result onto the instance without saving it and
+        records which text it belongs to. The emotion scores are stored once, as a
+        packed vector; `emotion` keeps only the primary emotion's name.
+        """
+        from . import emotion_vectors
+        from .ai_pipeline import primary_emotion
+
+        self.sentiment = result["sentiment_label"]
+        top_emotion = primary_emotion(result["emotion_summary"])
+        self.primary_emotion = "" if top_emotion == "N/A" else top_emotion.lower()
+        self.emotion = self.primary_emotion.capitalize() or "N/A"
+        scores = result["emotion_summary"]
+        if isinstance(scores, dict) and scores:
+            self.emotion_labels, self.emotion_vector = emotion_vectors.pack(scores)
+        else:
+            self.emotion_labels, self.emotion_vector = None, None
+        self.potential_condition = result["potential_condition"]
+        self.risk_level = result["risk_level"]
+        analysis = dict(result["analysis_json"] or {})
+        analysis.pop("emotion_scores", None)
+        self.analysis_json = analysis
+        # Failed analyses are not stamped so the next save retries them
+        self.text_hash = "" if "error" in result else hash_dream_text(self.dream_text)
+        # Indexed by embeddings.record() once the dream is saved
+        self._embedding = result.get("embedding")
+
+    def save(self, *args, analysis=None, analyze=None, **kwargs):
+        """
+        Saves the dream, running the models only when needed.
+
+        `analysis` is an already-computed analyze_dream() result to store as-is.
+        `analyze=True` forces re-analysis, `analyze=False` skips it; by default the
+        models only run when dream_text changed since the last analysis.
+        """
+        if analysis is not None:
+            self.apply_analysis(analysis)
+        elif analyze or (analyze is None and self.needs_analysis()):
+            # Imported here so loading the models module (migrate, admin, shell)
+            # never pulls in the analysis stack
+            from .ai_pipeline import analyze_dream
             try:
-                result = analyze_dream(self.dream_text)
-                self.sentiment = result["sentiment_label"]
-                self.emotion = result["emotion_summary"]
-                self.potential_condition = result["potential_condition"]
-                self.risk_level = result["risk_level"]
-                self.analysis_json = result["analysis_json"]
+                self.apply_analysis(analyze_dream(self.dream_text))
             except Exception as e:
                 # Fallback so migrations/admin don't break
                 self.sentiment = "Error"
                 self.emotion = {"error": str(e)}
+                self.primary_emotion = ""
+                self.emotion_labels, self.emotion_vector = None, None
                 self.potential_condition = "Unknown"
                 self.risk_level = "Low"
                 self.analysis_json = {}
         super().save(*args, **kwargs)
+        record_changes([self])
+        if getattr(self, "_embedding", None):
+            from .embeddings import record
+            record([self])
 
     def __str__(self):
         return f"Dream by {self.user} on {self.created_at:%Y-%m-%d}"
+
+
+class DreamAudio(models.Model):
+    """An uploaded recording of a dream; its transcript becomes the dream_text."""
+    dream = models.OneToOneField(DreamNarration, on_delete=models.CASCADE, related_name="audio")
+    file = models.FileField(upload_to="dream_audio/%Y/%m/")
+    duration = models.FloatField(blank=True, null=True)
+    # Set by the worker that assembles the transcript, so it happens exactly once
+    transcribed_at = models.DateTimeField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Recording for dream {self.dream_id}"
+
+
+class AudioSegment(models.Model):
+    """A fixed-length slice of a recording, transcribed by its own job."""
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(PENDING, "Pending"), (DONE, "Done"), (FAILED, "Failed")]
+
+    audio = models.ForeignKey(DreamAudio, on_delete=models.CASCADE, related_name="segments")
+    index = models.PositiveIntegerField()
+    start = models.FloatField()
+    end = models.FloatField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    text = models.TextField(blank=True, default="")
+    # Provisional analysis of this segment alone, shown while the rest is transcribed
+    sentiment = models.CharField(max_length=50, blank=True, default="")
+    emotion_scores = models.JSONField(blank=True, null=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["audio", "index"], name="dreams_audio_segment_unique_index")]
+
+    def __str__(self):
+        return f"Segment {self.index} of recording {self.audio_id} ({self.status})"
+
+
+class AnalysisJob(models.Model):
+    """
+    A queued request to analyze a dream outside the web request.
+
+    Jobs are picked up in batches by the `run_analysis_worker` management command.
+    Transcription jobs either plan a recording's segments (segment is null) or
+    transcribe one segment.
+    """
+    ANALYZE = "analyze"
+    TRANSCRIBE = "transcribe"
+    KIND_CHOICES = [(ANALYZE, "Analyze"), (TRANSCRIBE, "Transcribe")]
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    dream = models.ForeignKey(DreamNarration, on_delete=models.CASCADE, related_name="analysis_jobs")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default=ANALYZE)
+    segment = models.ForeignKey(AudioSegment, on_delete=models.CASCADE, blank=True, null=True, related_name="jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Claim token of the worker currently processing the job
+    worker = models.CharField(max_length=64, blank=True, default="")
+    error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "kind", "id"])]
+
+    @property
+    def is_active(self):
+        return self.status in (self.PENDING, self.RUNNING)
+
+    def __str__(self):
+        return f"{self.get_kind_display()} job {self.id} for dream {self.dream_id} ({self.status})"
+
+
+class IngestBatch(models.Model):
+    """
+    One request to the bulk ingestion API. Its dreams point back to it, so the
+    status endpoint can report how far their analysis has got.
+    """
+    user = models.ForeignKey("auth.User", on_delete=models.CASCADE, related_name="ingest_batches")
+    received = models.PositiveIntegerField(default=0)
+    created = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Ingest batch {self.id} by {self.user} ({self.created} dreams)"
+
+
+class UserDreamStats(models.Model):
+    """
+    Pre-aggregated dashboard counters, one row per user.
+
+    Kept up to date incrementally by record_changes(): every save (and bulk
+    analysis write) applies only the difference between a dream's old and new
+    contribution.
+    """
+    user = models.OneToOneField("auth.User", on_delete=models.CASCADE, primary_key=True, related_name="dream_stats")
+    total_dreams = models.PositiveIntegerField(default=0)
+    lucid_dreams = models.PositiveIntegerField(default=0)
+    nightmare_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    COUNTERS = ("total_dreams", "lucid_dreams", "nightmare_count")
+
+    @classmethod
+    def for_user(cls, user):
+        """The user's stats row, or an unsaved all-zero row if they have no dreams yet."""
+        return cls.objects.filter(user=user).first() or cls(user=user)
+
+    @classmethod
+    async def afor_user(cls, user):
+        return await cls.objects.filter(user=user).afirst() or cls(user=user)
+
+    @staticmethod
+    def contribution(state):
+        """(total, lucid, nightmares) one dream's tracked_state() adds to its owner's row."""
+        return (
+            1,
+            int(state["primary_emotion"] == LUCID_EMOTION),
+            int(state["risk_level"].lower() == NIGHTMARE_RISK.lower()),
+        )
+
+    @classmethod
+    def apply_changes(cls, changes, deleted=False):
+        """Applies (before, after) tracked-state pairs with atomic F() updates."""
+        deltas = defaultdict(lambda: [0, 0, 0])
+        for before, after in changes:
+            for state, sign in ((before, -1), (after, 1)):
+                if state is not None:
+                    delta = deltas[state["user_id"]]
+                    for i, value in enumerate(cls.contribution(state)):
+                        delta[i] += sign * value
+
+        for user_id, delta in deltas.items():
+            if not any(delta):
+                continue
+            updates = {name: F(name) + value for name, value in zip(cls.COUNTERS, delta)}
+            # update() skips auto_now; the admin dashboard cache is keyed on this
+            updates["updated_at"] = timezone.now()
+            if not cls.objects.filter(user_id=user_id).update(**updates) and not deleted:
+                # No row yet: count from scratch (the change is already in the table)
+                cls.rebuild([user_id])
+
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        """Recomputes stats rows from DreamNarration with one GROUP BY query."""
+        rows = (
+            DreamNarration.objects.order_by()
+            .values("user_id")
+            .annotate(
+                total=Count("id"),
+                lucid=Count("id", filter=Q(primary_emotion=LUCID_EMOTION)),
+                nightmares=Count("id", filter=Q(risk_level__iexact=NIGHTMARE_RISK)),
+            )
+        )
+        if user_ids is not None:
+            rows = rows.filter(user_id__in=user_ids)
+        for row in rows:
+            cls.objects.update_or_create(
+                user_id=row["user_id"],
+                defaults={"total_dreams": row["total"], "lucid_dreams": row["lucid"], "nightmare_count": row["nightmares"]},
+            )
+
+    def __str__(self):
+        return f"Dream stats for {self.user}"
+
+
+class DreamRollup(models.Model):
+    """
+    Daily or weekly aggregate of dreams for one user, or for everyone when user
+    is null. Trend charts read these instead of scanning DreamNarration; see
+    dreams/rollups.py for how they are maintained.
+    """
+    DAY = "day"
+    WEEK = "week"
+    PERIOD_CHOICES = [(DAY, "Day"), (WEEK, "Week")]
+
+    period = models.CharField(max_length=4, choices=PERIOD_CHOICES)
+    # First day of the period (Monday for weeks), in the site time zone
+    period_start = models.DateField()
+    user = models.ForeignKey("auth.User", on_delete=models.CASCADE, blank=True, null=True, related_name="dream_rollups")
+
+    dream_count = models.PositiveIntegerField(default=0)
+    risk_counts = models.JSONField(default=dict)
+    sentiment_counts = models.JSONField(default=dict)
+    emotion_counts = models.JSONField(default=dict)
+    # Sums of the dreams' emotion scores over the `scored_count` dreams that have them
+    scored_count = models.PositiveIntegerField(default=0)
+    emotion_score_sums = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["period", "user", "period_start"], condition=Q(user__isnull=False),
+                name="dreams_rollup_unique_user_period",
+            ),
+            models.UniqueConstraint(
+                fields=["period", "period_start"], condition=Q(user__isnull=True),
+                name="dreams_rollup_unique_global_period",
+            ),
+        ]
+
+    def mean_emotion_scores(self):
+        if not self.scored_count:
+            return {}
+        return {label: round(total / self.scored_count, 4) for label, total in self.emotion_score_sums.items()}
+
+    def __str__(self):
+        return f"{self.get_period_display()} of {self.period_start} for {self.user or 'all users'}"
+
+
+def decode_tracked_state(state):
+    """A raw tracked state with its packed emotion vector decoded into emotion_scores."""
+    from . import emotion_vectors
+
+    state = dict(state)
+    label_set_id, blob = state.pop("emotion_vector")
+    state["emotion_scores"] = (
+        emotion_vectors.as_dict(blob, emotion_vectors.label_set_by_id(label_set_id))
+        if blob is not None and label_set_id else None
+    )
+    return state
+
+
+def record_changes(dreams, deleted=False):
+    """
+    Updates UserDreamStats, DreamRollup and the keyword document frequencies for
+    dreams that were just saved (or deleted). save() calls this itself; call it
+    after bulk_update(), which bypasses save(), with dreams loaded with at least
+    TRACKED_FIELDS (plus dream_text when the analysis changed).
+    """
+    from . import keywords, rollups
+
+    changes = []
+    new_documents = []
+    for dream in dreams:
+        before = getattr(dream, "_snapshot", None)
+        if before is UNKNOWN_SNAPSHOT:
+            continue
+        after = None if deleted else dream._raw_tracked_state()
+        dream._snapshot = after
+        if before != after:
+            changes.append(tuple(state and decode_tracked_state(state) for state in (before, after)))
+        # A newly analyzed text is a new document for keyword IDF. Edited or
+        # deleted texts are not subtracted; rebuild_keyword_stats recounts exactly.
+        if after and after["text_hash"] and (before is None or before["text_hash"] != after["text_hash"]):
+            new_documents.append(dream.dream_text)
+    if changes:
+        UserDreamStats.apply_changes(changes, deleted)
+        rollups.apply_changes(changes, deleted)
+    if new_documents:
+        keywords.observe_documents(new_documents)
+
+
+class KeywordDocumentFrequency(models.Model):
+    """
+    Number of analyzed dreams containing each keyword term, for TF-IDF keyword
+    scoring (see dreams/keywords.py). The row with an empty term holds the total
+    number of dreams counted.
+    """
+    term = models.CharField(max_length=64, primary_key=True)
+    document_count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.term or '<total>'}: {self.document_count}"
+
+
+@receiver(post_delete, sender=DreamNarration)
+def _forget_deleted_dream(sender, instance, **kwargs):
+    record_changes([instance], deleted=True)
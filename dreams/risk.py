@@ -0,0 +1,154 @@
+# dreams/risk.py
+# Risk scoring over emotion scores, compiled into a weight matrix so a whole batch
+# of dreams is scored with a single matrix multiply.
+
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from django.conf import settings
+
+# --- Default Risk Rules ---
+RISK_RULES = {
+    "PTSD": {"fear": 0.6, "sadness": 0.3, "surprise": 0.2, "disgust": 0.1},
+    "Depression": {"sadness": 0.7, "grief": 0.4, "remorse": 0.2, "neutral": 0.1},
+    "Anxiety": {"fear": 0.7, "nervousness": 0.5, "confusion": 0.2, "surprise": 0.1},
+}
+
+RISK_THRESHOLDS = {
+    # Top condition score at or above which a dream is "High" / "Moderate" risk
+    "high": 0.5,
+    "moderate": 0.25,
+    # Top condition score above which the condition is reported at all
+    "condition": 0.25,
+}
+
+
+class RiskModel:
+    """
+    RISK_RULES compiled into a (labels x conditions) weight matrix.
+
+    `labels` fixes the column order of emotion matrices passed to score_matrix()
+    (normally the emotion model's label order); emotions that only appear in the
+    rules are appended to it.
+    """
+    def __init__(self, rules, thresholds=None, labels=None):
+        self.rules = rules
+        self.thresholds = {**RISK_THRESHOLDS, **(thresholds or {})}
+        self.conditions = list(rules)
+        self.labels = list(labels or [])
+        for weights in rules.values():
+            for emotion in weights:
+                if emotion not in self.labels:
+                    self.labels.append(emotion)
+        self.label_index = {label: i for i, label in enumerate(self.labels)}
+        self.weights = np.zeros((len(self.labels), len(self.conditions)))
+        for column, condition in enumerate(self.conditions):
+            for emotion, weight in rules[condition].items():
+                self.weights[self.label_index[emotion], column] = weight
+
+    @property
+    def fingerprint(self):
+        blob = json.dumps({"rules": self.rules, "thresholds": self.thresholds}, sort_keys=True)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+    def vectorize(self, emotion_dicts):
+        """Stacks {label: score} dicts into an (N x labels) matrix in self.labels order."""
+        matrix = np.zeros((len(emotion_dicts), len(self.labels)))
+        for row, scores in enumerate(emotion_dicts):
+            for label, score in (scores or {}).items():
+                column = self.label_index.get(label)
+                if column is not None:
+                    matrix[row, column] = score
+        return matrix
+
+    def score_matrix(self, emotion_matrix):
+        """(N x labels) emotion scores -> (N x conditions) risk scores, rounded like before."""
+        return np.round(np.asarray(emotion_matrix, dtype=np.float64) @ self.weights, 4)
+
+    def levels(self, risk_matrix, thresholds=None):
+        """
+        Vectorized classification: returns (top condition index, top score, risk
+        level, reported condition) arrays for each row.
+        """
+        thresholds = {**self.thresholds, **(thresholds or {})}
+        top_index = risk_matrix.argmax(axis=1)
+        top_score = risk_matrix[np.arange(len(risk_matrix)), top_index]
+        risk_level = np.where(
+            top_score >= thresholds["high"], "High",
+            np.where(top_score >= thresholds["moderate"], "Moderate", "Low"),
+        )
+        conditions = np.asarray(self.conditions, dtype=object)
+        potential = np.where(top_score > thresholds["condition"], conditions[top_index], "None")
+        return top_index, top_score, risk_level, potential
+
+    def classify_matrix(self, emotion_matrix, thresholds=None):
+        """Scores an emotion matrix and returns one risk dict per row."""
+        risk_matrix = self.score_matrix(emotion_matrix)
+        top_index, top_score, risk_level, potential = self.levels(risk_matrix, thresholds)
+        results = []
+        for row in range(len(risk_matrix)):
+            results.append({
+                "risk_scores_by_condition": {c: float(s) for c, s in zip(self.conditions, risk_matrix[row])},
+                "top_condition_details": {"name": self.conditions[top_index[row]], "score": float(top_score[row])},
+                "risk_level": str(risk_level[row]),
+                "potential_condition": str(potential[row]),
+            })
+        return results
+
+    def classify(self, emotion_dicts, thresholds=None):
+        """Scores a batch of {label: score} dicts; see classify_matrix()."""
+        return self.classify_matrix(self.vectorize(emotion_dicts), thresholds)
+
+    def level_counts(self, emotion_matrix, thresholds=None):
+        """What-if helper: how many rows would land in each risk level under `thresholds`."""
+        _, _, risk_level, _ = self.levels(self.score_matrix(emotion_matrix), thresholds)
+        labels, counts = np.unique(risk_level, return_counts=True)
+        return {str(label): int(count) for label, count in zip(labels, counts)}
+
+
+def load_risk_model(path=None, labels=None):
+    """
+    Builds a RiskModel from a JSON file of the form
+    {"rules": {...}, "thresholds": {...}}, or from the built-in defaults.
+    """
+    if not path:
+        return RiskModel(RISK_RULES, RISK_THRESHOLDS, labels)
+    with open(path) as f:
+        config = json.load(f)
+    return RiskModel(config.get("rules", RISK_RULES), config.get("thresholds"), labels)
+
+
+_lock = threading.Lock()
+_models = {}
+
+
+def get_risk_model(labels=None):
+    """
+    Returns the RiskModel for DREAM_RISK_RULES_FILE, rebuilding it only when the file
+    (or the requested label order) changes, so edited rules take effect without
+    reloading the AI models.
+    """
+    path = getattr(settings, "DREAM_RISK_RULES_FILE", "")
+    try:
+        mtime = os.stat(path).st_mtime_ns if path else None
+    except OSError:
+        mtime = None
+    key = (path, mtime, tuple(labels or ()))
+    with _lock:
+        if key not in _models:
+            if path and mtime is None:
+                print(f"Risk rules file {path!r} not found; using the built-in RISK_RULES.")
+            # Drop models built from an older version of the rules file
+            for stale in [k for k in _models if k[:2] != key[:2]]:
+                del _models[stale]
+            _models[key] = load_risk_model(path if mtime is not None else None, labels)
+        return _models[key]
+
+
+def score_risk(emotion_dicts, thresholds=None):
+    """
+    Standalone batch entry point: one risk dict per {label: score} emotion dict.
+    """
+    return get_risk_model().classify(list(emotion_dicts), thresholds)
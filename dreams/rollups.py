@@ -0,0 +1,226 @@
+# dreams/rollups.py
+# Daily and weekly aggregates of dreams, per user and global (DreamRollup).
+# Analysis writes apply deltas incrementally; rebuild() and compact() are run by
+# the rebuild_rollups / compact_rollups management commands.
+
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import TRACKED_FIELDS, DreamNarration, DreamRollup
+
+PERIODS = (DreamRollup.DAY, DreamRollup.WEEK)
+COUNT_FIELDS = (
+    # (DreamRollup JSON field, tracked_state() key)
+    ("risk_counts", "risk_level"),
+    ("sentiment_counts", "sentiment"),
+    ("emotion_counts", "primary_emotion"),
+)
+
+
+def period_start(day, period):
+    """First day of the day/week containing `day` (weeks start on Monday)."""
+    return day - timedelta(days=day.weekday()) if period == DreamRollup.WEEK else day
+
+
+class RollupDelta:
+    """Pending change to one DreamRollup row."""
+    def __init__(self):
+        self.dream_count = 0
+        self.scored_count = 0
+        self.counts = {name: Counter() for name, _ in COUNT_FIELDS}
+        self.score_sums = Counter()
+
+    def add(self, state, sign=1):
+        self.dream_count += sign
+        for name, key in COUNT_FIELDS:
+            self.counts[name][state[key] or "Unknown"] += sign
+        if state["emotion_scores"]:
+            self.scored_count += sign
+            for label, score in state["emotion_scores"].items():
+                self.score_sums[label] += sign * score
+
+    def is_empty(self):
+        return not self.dream_count and not self.scored_count and not any(
+            any(counter.values()) for counter in [*self.counts.values(), self.score_sums]
+        )
+
+    def apply_to(self, row):
+        # Clamped so rows that predate the rollups (see rebuild_rollups) never go negative
+        row.dream_count = max(0, row.dream_count + self.dream_count)
+        row.scored_count = max(0, row.scored_count + self.scored_count)
+        for name, counter in self.counts.items():
+            setattr(row, name, _merge(getattr(row, name), counter))
+        row.emotion_score_sums = _merge(row.emotion_score_sums, self.score_sums, digits=6)
+        if not row.scored_count:
+            row.emotion_score_sums = {}
+
+
+def _merge(stored, counter, digits=None):
+    merged = Counter(stored or {})
+    for key, value in counter.items():
+        merged[key] += value
+    if digits is not None:
+        merged = {key: round(value, digits) for key, value in merged.items()}
+    # Entries that dropped back to zero are removed rather than kept as noise
+    return {key: value for key, value in merged.items() if value > 0}
+
+
+def daily_cutoff():
+    """Daily rows before this date are compacted away; weekly rows are kept forever."""
+    return timezone.localdate() - timedelta(days=int(getattr(settings, "DREAM_ROLLUP_DAILY_DAYS", 90)))
+
+
+def _bucket_keys(state, cutoff):
+    for period in PERIODS:
+        start = period_start(state["day"], period)
+        if period == DreamRollup.DAY and start < cutoff:
+            continue
+        yield period, start, state["user_id"]
+        yield period, start, None
+
+
+def collect_deltas(changes):
+    """Groups (before, after) tracked-state pairs into one RollupDelta per rollup row."""
+    deltas = defaultdict(RollupDelta)
+    cutoff = daily_cutoff()
+    for before, after in changes:
+        for state, sign in ((before, -1), (after, 1)):
+            if state is not None:
+                for key in _bucket_keys(state, cutoff):
+                    deltas[key].add(state, sign)
+    return deltas
+
+
+def apply_changes(changes, deleted=False):
+    """
+    Applies (before, after) tracked-state pairs from models.record_changes().
+    Each affected row is locked while it is read, merged and written, so
+    concurrent workers cannot lose each other's updates. Deletes never create
+    rows (the user may be being deleted along with their rollups).
+    """
+    for (period, start, user_id), delta in sorted(collect_deltas(changes).items(), key=_row_order):
+        if delta.is_empty():
+            continue
+        with transaction.atomic():
+            rows = DreamRollup.objects.select_for_update()
+            if deleted:
+                row = rows.filter(period=period, period_start=start, user_id=user_id).first()
+                if row is None:
+                    continue
+            else:
+                row, _ = rows.get_or_create(period=period, period_start=start, user_id=user_id)
+            delta.apply_to(row)
+            row.save()
+
+
+def _row_order(item):
+    # A fixed locking order keeps two workers from deadlocking on the same rows
+    period, start, user_id = item[0]
+    return period, start, user_id or 0
+
+
+def rebuild(user=None, since=None, batch_size=2000):
+    """
+    Recomputes rollups from DreamNarration. With `user` only that user's rows are
+    rebuilt (global rows are left alone); with `since` only periods from the week
+    containing that date onwards. Returns the number of rows written.
+
+    Each user's rows are replaced in a transaction of their own, and the global
+    rows last, so the write lock is only held for one user at a time and web saves
+    and the analysis worker keep going. Per-user rows stay exact; a dream saved
+    while the rebuild runs can be missing from the global rows until the next one.
+    """
+    rows = DreamRollup.objects.all()
+    dreams = DreamNarration.objects.only(*TRACKED_FIELDS).order_by("created_at", "id")
+    if user is not None:
+        rows = rows.filter(user=user)
+        dreams = dreams.filter(user=user)
+    if since is not None:
+        since = period_start(since, DreamRollup.WEEK)
+        rows = rows.filter(period_start__gte=since)
+        dreams = dreams.filter(created_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+
+    # Users with rows but no dreams left are rebuilt too, which deletes their rows
+    user_ids = set(dreams.order_by().values_list("user_id", flat=True).distinct())
+    user_ids.update(rows.filter(user__isnull=False).order_by().values_list("user_id", flat=True).distinct())
+
+    global_deltas = defaultdict(RollupDelta)
+    cutoff = daily_cutoff()
+    written = 0
+    for user_id in sorted(user_ids):
+        user_deltas = defaultdict(RollupDelta)
+        with transaction.atomic():
+            rows.filter(user_id=user_id).delete()
+            for dream in dreams.filter(user_id=user_id).iterator(chunk_size=batch_size):
+                state = dream.tracked_state()
+                for key in _bucket_keys(state, cutoff):
+                    if key[2] is not None:
+                        user_deltas[key].add(state)
+                    elif user is None:
+                        global_deltas[key].add(state)
+            written += _create_rows(user_deltas, batch_size)
+    if user is None:
+        with transaction.atomic():
+            rows.filter(user__isnull=True).delete()
+            written += _create_rows(global_deltas, batch_size)
+    return written
+
+
+def _create_rows(deltas, batch_size):
+    rows = []
+    for (period, start, user_id), delta in deltas.items():
+        row = DreamRollup(period=period, period_start=start, user_id=user_id)
+        delta.apply_to(row)
+        rows.append(row)
+    DreamRollup.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def compact():
+    """
+    Deletes daily rollups older than DREAM_ROLLUP_DAILY_DAYS (weekly rows keep
+    the history) and rows that no longer count any dream. Returns rows deleted.
+    """
+    cutoff = daily_cutoff()
+    deleted, _ = DreamRollup.objects.filter(period=DreamRollup.DAY, period_start__lt=cutoff).delete()
+    empty, _ = DreamRollup.objects.filter(dream_count=0).delete()
+    return deleted + empty
+
+
+def _trend_rows(user, period, since, until, limit):
+    rows = DreamRollup.objects.filter(period=period)
+    rows = rows.filter(user=user) if user is not None else rows.filter(user__isnull=True)
+    if since is not None:
+        rows = rows.filter(period_start__gte=period_start(since, period))
+    if until is not None:
+        rows = rows.filter(period_start__lte=until)
+    rows = rows.order_by("-period_start")
+    return rows[:limit] if limit else rows
+
+
+def _trend_point(row):
+    return {
+        "period_start": row.period_start,
+        "dream_count": row.dream_count,
+        "risk_counts": row.risk_counts,
+        "sentiment_counts": row.sentiment_counts,
+        "emotion_counts": row.emotion_counts,
+        "top_emotion": max(row.emotion_counts, key=row.emotion_counts.get) if row.emotion_counts else "",
+        "mean_emotion_scores": row.mean_emotion_scores(),
+    }
+
+
+def trend(user=None, period=DreamRollup.WEEK, since=None, until=None, limit=None):
+    """
+    Rollup rows for one user (or globally), oldest first, as plain dicts for
+    charts and templates. `limit` keeps only the most recent periods.
+    """
+    return [_trend_point(row) for row in reversed(list(_trend_rows(user, period, since, until, limit)))]
+
+
+async def atrend(user=None, period=DreamRollup.WEEK, since=None, until=None, limit=None):
+    """Async trend() on the async ORM."""
+    rows = [row async for row in _trend_rows(user, period, since, until, limit)]
+    return [_trend_point(row) for row in reversed(rows)]
@@ -0,0 +1,144 @@
+# dreams/sqlite_cache.py
+# Django cache backend storing entries in one table of a dedicated SQLite file,
+# used as the persistent tier of the analysis result cache (CACHES["dream_analysis"]).
+#
+# Unlike FileBasedCache, whose cull lists the whole cache directory on every set,
+# every operation here is an indexed lookup: keys are the primary key and entries
+# are culled by insertion order (rowid). The file is separate from the main
+# database so cache writes never wait for, or hold, its write lock, and it is
+# opened with plain sqlite3 connections (one per thread and process) because it
+# is used from the inference threads as well as from requests.
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+BUSY_TIMEOUT_S = 5.0
+
+
+class SQLiteCache(BaseCache):
+    """
+    LOCATION is the path of the SQLite file (created on first use). Holds at most
+    OPTIONS["MAX_ENTRIES"] entries; beyond that the oldest writes are dropped.
+    """
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            # Connections must not cross a fork
+            os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=BUSY_TIMEOUT_S, isolation_level=None)
+            if conn.execute("PRAGMA journal_mode").fetchone()[0].lower() != "wal":
+                conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry ("
+                "id INTEGER PRIMARY KEY, key TEXT NOT NULL UNIQUE, value BLOB NOT NULL, expires REAL)"
+            )
+            local.conn, local.pid = conn, os.getpid()
+        return local.conn
+
+    def _load(self, rows, now):
+        return {key: pickle.loads(value) for key, value, expires in rows if expires is None or expires > now}
+
+    # --- Reads ---
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._get_many_raw([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys_by_raw = {self.make_and_validate_key(key, version=version): key for key in keys}
+        found = self._get_many_raw(list(keys_by_raw))
+        return {keys_by_raw[raw]: value for raw, value in found.items()}
+
+    def _get_many_raw(self, keys):
+        conn = self._connection()
+        found = {}
+        now = time.time()
+        # Stays under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute(
+                f"SELECT key, value, expires FROM cache_entry WHERE key IN ({', '.join('?' * len(chunk))})", chunk,
+            ).fetchall()
+            found.update(self._load(rows, now))
+        return found
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        row = self._connection().execute("SELECT expires FROM cache_entry WHERE key = ?", [key]).fetchone()
+        return row is not None and (row[0] is None or row[0] > time.time())
+
+    # --- Writes ---
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (self.make_and_validate_key(key, version=version), pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+            for key, value in data.items()
+        ]
+        if not rows:
+            return []
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # REPLACE deletes the old row, so a rewritten key moves to the newest id
+            conn.executemany("INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)", rows)
+            self._cull(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        expires = self.get_backend_timeout(timeout)
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache_entry WHERE key = ? AND expires <= ?", [key, time.time()])
+            added = conn.execute(
+                "INSERT OR IGNORE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)",
+                [key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires],
+            ).rowcount == 1
+            self._cull(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute(
+            "UPDATE cache_entry SET expires = ? WHERE key = ? AND (expires IS NULL OR expires > ?)",
+            [self.get_backend_timeout(timeout), key, time.time()],
+        ).rowcount == 1
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._connection().execute("DELETE FROM cache_entry WHERE key = ?", [key]).rowcount == 1
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entry")
+
+    def _cull(self, conn):
+        # Ids only grow, so max(id) - MAX_ENTRIES bounds the table without counting it
+        if self._max_entries > 0:
+            conn.execute(
+                "DELETE FROM cache_entry WHERE id <= (SELECT max(id) FROM cache_entry) - ?", [self._max_entries],
+            )
+
+    def close(self, **kwargs):
+        # Connections are per thread and reused for the life of the process
+        pass
@@ -0,0 +1,11 @@
+def analysis_result(emotion="joy", risk_level="Low"):
+    """A stand-in analyze_dream() result, so no model is loaded."""
+    scores = {"anger": 0.1, "fear": 0.2, "joy": 0.3, "sadness": 0.15}
+    scores[emotion] = 0.9
+    return {
+        "sentiment_label": "Positive",
+        "emotion_summary": scores,
+        "potential_condition": "None",
+        "risk_level": risk_level,
+        "analysis_json": {"keywords": []},
+    }
@@ -0,0 +1,19 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        self.url = reverse("admin:dreams_dreamnarration_dashboard")
+
+    def test_date_range(self):
+        response = self.client.get(self.url, {"start": "2024-02-01", "end": "2024-02-29"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context["start"], response.context["end"]), ("2024-02-01", "2024-02-29"))
+
+    def test_impossible_dates_are_ignored(self):
+        response = self.client.get(self.url, {"start": "2024-02-30", "end": "not-a-date"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.context["start"], response.context["end"]), ("", ""))
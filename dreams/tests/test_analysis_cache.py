@@ -0,0 +1,57 @@
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from dreams import ai_pipeline, analysis_cache
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "analysis-test": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "analysis-test"},
+}
+
+
+@override_settings(CACHES=CACHES, DREAM_ANALYSIS_CACHE="analysis-test", DREAM_CACHE_ENABLED=True)
+class AnalysisCacheTests(SimpleTestCase):
+    def setUp(self):
+        analysis_cache._memory.clear()
+        analysis_cache._persistent().clear()
+        self.computed = []
+
+    def compute(self, texts):
+        self.computed.append(list(texts))
+        return [{"text": text, "analysis_json": {}} for text in texts]
+
+    def test_keys_ignore_whitespace_and_unicode_form(self):
+        key = analysis_cache.cache_key("I was flying  over\tthe café\n", "v1")
+        self.assertEqual(key, analysis_cache.cache_key(" I was flying over the café", "v1"))
+        self.assertNotEqual(key, analysis_cache.cache_key("I was flying over the Café", "v1"))
+        self.assertNotEqual(key, analysis_cache.cache_key("I was flying over the café", "v2"))
+
+    def test_each_text_is_computed_once(self):
+        first = analysis_cache.get_or_compute(["a dream", "a  dream", "another"], "v1", self.compute)
+        self.assertEqual(self.computed, [["a dream", "another"]])
+        self.assertEqual(first[0], first[1])
+        second = analysis_cache.get_or_compute(["another", "a dream "], "v1", self.compute)
+        self.assertEqual(len(self.computed), 1)
+        self.assertEqual(second, [first[2], first[0]])
+
+    def test_persistent_tier_survives_a_cleared_memory(self):
+        analysis_cache.get_or_compute(["a dream"], "v1", self.compute)
+        analysis_cache._memory.clear()
+        analysis_cache.get_or_compute(["a dream"], "v1", self.compute)
+        self.assertEqual(len(self.computed), 1)
+
+    def test_errors_are_not_cached(self):
+        failing = lambda texts: [{"error": "boom"} for _ in texts]
+        analysis_cache.get_or_compute(["a dream"], "v1", failing)
+        analysis_cache.get_or_compute(["a dream"], "v1", self.compute)
+        self.assertEqual(self.computed, [["a dream"]])
+
+    def test_new_model_version_invalidates_results(self):
+        with mock.patch.object(ai_pipeline, "_analyze_uncached", side_effect=self.compute), \
+                mock.patch.object(ai_pipeline, "model_version", return_value="v1"):
+            ai_pipeline.analyze_dreams(["a dream"])
+            ai_pipeline.analyze_dreams(["a dream"])
+            self.assertEqual(len(self.computed), 1)
+        with mock.patch.object(ai_pipeline, "_analyze_uncached", side_effect=self.compute), \
+                mock.patch.object(ai_pipeline, "model_version", return_value="v2"):
+            ai_pipeline.analyze_dreams(["a dream"])
+        self.assertEqual(self.computed, [["a dream"], ["a dream"]])
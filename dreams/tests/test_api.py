@@ -0,0 +1,76 @@
+import io
+import json
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.exceptions import ParseError
+from rest_framework.test import APIClient
+from dreams import api
+from dreams.models import AnalysisJob, DreamNarration
+
+
+@override_settings(DREAM_ANALYSIS_ASYNC=True)
+class BulkIngestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="partner")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse("dreams:api_bulk_ingest")
+
+    def post(self, body, content_type):
+        return self.client.post(self.url, body, content_type=content_type)
+
+    def test_ndjson_rejects_bad_lines_and_keeps_the_rest(self):
+        body = "\n".join([
+            json.dumps({"dream_text": "First", "ref": "a"}),
+            "{not json",
+            "",
+            json.dumps({"dream_text": "  "}),
+            json.dumps(["not", "an", "object"]),
+            json.dumps({"dream_text": "Last", "ref": True}),
+            json.dumps({"dream_text": "Second", "ref": 7}),
+        ])
+        response = self.post(body, "application/x-ndjson")
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data["received"], 6)
+        self.assertEqual([item["ref"] for item in data["items"]], ["a", 7])
+        self.assertEqual([item["index"] for item in data["rejected"]], [1, 2, 3, 4])
+        self.assertIn("Line 2 is not valid JSON", data["rejected"][0]["error"])
+        self.assertEqual(AnalysisJob.objects.filter(dream__user=self.user).count(), 2)
+
+    def test_truncated_json_array_keeps_items_before_the_error(self):
+        response = self.post('[{"dream_text": "Kept"}, {"dream_text": ', "application/json")
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data["created"], 1)
+        self.assertIn("error", data)
+
+    def test_body_that_is_not_an_array(self):
+        response = self.post('{"dream_text": "Alone"}', "application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(DreamNarration.objects.count(), 0)
+
+    def test_empty_body(self):
+        self.assertEqual(self.post("", "application/json").status_code, 400)
+
+    @override_settings(DREAM_INGEST_MAX_ITEMS=2)
+    def test_reports_where_to_resume(self):
+        body = json.dumps([{"dream_text": f"Dream {i}"} for i in range(3)])
+        data = self.post(body, "application/json").json()
+        self.assertEqual((data["created"], data["next_index"]), (2, 2))
+
+    def test_json_array_elements_split_across_reads(self):
+        items = [{"dream_text": "é" * 5, "ref": 1.5}, {"dream_text": "x", "ref": 12345}]
+        with mock.patch.object(api, "READ_SIZE", 3):
+            parsed = list(api._iter_json_array(io.BytesIO(json.dumps(items, ensure_ascii=False).encode("utf-8"))))
+        self.assertEqual(parsed, items)
+
+    def test_invalid_utf8(self):
+        with self.assertRaises(ParseError):
+            list(api._iter_json_array(io.BytesIO(b'[{"dream_text": "\xff"}]')))
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+        self.assertIn(self.post("[]", "application/json").status_code, (401, 403))
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+from django.test import SimpleTestCase
+from dreams.ai_pipeline import AsyncBatcher, MicroBatcher
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+
+    def handler(self, texts):
+        self.batches.append(list(texts))
+        return [{"text": text} for text in texts]
+
+    def submit_concurrently(self, batcher, texts):
+        results = [None] * len(texts)
+        start = threading.Barrier(len(texts))
+
+        def call(i):
+            start.wait()
+            results[i] = batcher.submit(texts[i])
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(len(texts))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        return results
+
+    def test_concurrent_calls_share_one_batch(self):
+        texts = [f"dream {i}" for i in range(8)]
+        # The window is far longer than it takes the threads to submit, and the
+        # batch is sent as soon as it is full
+        results = self.submit_concurrently(MicroBatcher(self.handler, 2000, 8), texts)
+        self.assertEqual(len(self.batches), 1)
+        self.assertCountEqual(self.batches[0], texts)
+        # Each caller gets the result of its own text, whatever its batch position
+        self.assertEqual(results, [{"text": text} for text in texts])
+
+    def test_batches_are_capped(self):
+        texts = [f"dream {i}" for i in range(7)]
+        results = self.submit_concurrently(MicroBatcher(self.handler, 200, 3), texts)
+        self.assertTrue(all(len(batch) <= 3 for batch in self.batches))
+        self.assertCountEqual([text for batch in self.batches for text in batch], texts)
+        self.assertEqual(results, [{"text": text} for text in texts])
+
+    def test_handler_errors_reach_every_caller(self):
+        def failing(texts):
+            raise RuntimeError("model exploded")
+
+        results = self.submit_concurrently(MicroBatcher(failing, 50, 4), ["a", "b"])
+        self.assertTrue(all("model exploded" in result["error"] for result in results))
+        self.assertTrue(all(result["risk_level"] == "Unknown" for result in results))
+
+
+class AsyncBatcherTests(SimpleTestCase):
+    def setUp(self):
+        self.batches = []
+
+    def handler(self, texts):
+        self.batches.append(list(texts))
+        return [{"text": text} for text in texts]
+
+    def submit_all(self, batcher, texts):
+        async def run():
+            return await asyncio.gather(*(batcher.submit(text) for text in texts))
+        return asyncio.run(run())
+
+    def test_identical_texts_are_analyzed_once(self):
+        texts = ["fog", "rain", "fog", "snow", "rain", "fog"]
+        results = self.submit_all(AsyncBatcher(self.handler, 200, 16, 1, 64), texts)
+        self.assertEqual(self.batches, [["fog", "rain", "snow"]])
+        self.assertEqual(results, [{"text": text} for text in texts])
+
+    def test_batches_are_capped(self):
+        texts = [f"dream {i}" for i in range(7)]
+        results = self.submit_all(AsyncBatcher(self.handler, 50, 3, 1, 64), texts)
+        self.assertTrue(all(len(batch) <= 3 for batch in self.batches))
+        self.assertCountEqual([text for batch in self.batches for text in batch], texts)
+        self.assertEqual(results, [{"text": text} for text in texts])
+
+    def test_handler_errors_reach_every_caller(self):
+        def failing(texts):
+            raise RuntimeError("model exploded")
+
+        results = self.submit_all(AsyncBatcher(failing, 50, 4, 1, 64), ["a", "b", "a"])
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all("model exploded" in result["error"] for result in results))
+        self.assertTrue(all(result["risk_level"] == "Unknown" for result in results))
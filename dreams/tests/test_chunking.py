@@ -0,0 +1,68 @@
+import re
+from django.test import SimpleTestCase, override_settings
+from dreams import ai_pipeline
+
+
+class WordTokenizer:
+    """One token per word; adds two special tokens ([CLS] and [SEP]) per window."""
+    def num_special_tokens_to_add(self):
+        return 2
+
+    def __call__(self, texts, add_special_tokens=False, return_offsets_mapping=False):
+        matches = [list(re.finditer(r"\S+", text)) for text in texts]
+        encoded = {"input_ids": [[len(m.group()) for m in words] for words in matches]}
+        if return_offsets_mapping:
+            encoded["offset_mapping"] = [[m.span() for m in words] for words in matches]
+        return encoded
+
+
+@override_settings(DREAM_MAX_TOKENS=12, DREAM_CHUNK_STRIDE=3, DREAM_CHUNKING=True)
+class TokenWindowTests(SimpleTestCase):
+    def test_spans_cover_every_token_with_the_stride_overlap(self):
+        self.assertEqual(ai_pipeline._window_spans(10, 10, 3), [(0, 10)])
+        self.assertEqual(ai_pipeline._window_spans(11, 10, 3), [(0, 10), (7, 11)])
+        self.assertEqual(ai_pipeline._window_spans(25, 10, 3), [(0, 10), (7, 17), (14, 24), (21, 25)])
+
+    def test_windows_leave_room_for_special_tokens(self):
+        texts = [" ".join(f"w{i}" for i in range(15)), "a short dream"]
+        windows, owners, weights = ai_pipeline._split_into_windows(WordTokenizer(), texts)
+        self.assertEqual(windows, [
+            " ".join(f"w{i}" for i in range(10)),
+            " ".join(f"w{i}" for i in range(7, 15)),
+            "a short dream",
+        ])
+        self.assertEqual(owners, [0, 0, 1])
+        self.assertEqual(weights, [10, 8, 3])
+
+    def test_token_windows_match_the_text_windows(self):
+        texts = [" ".join("x" * (i % 4 + 1) for i in range(23)), ""]
+        windows, owners, weights = ai_pipeline._split_into_token_windows(WordTokenizer(), texts)
+        ids = WordTokenizer()(texts)["input_ids"][0]
+        self.assertEqual(windows, [ids[0:10], ids[7:17], ids[14:23], []])
+        self.assertEqual(owners, [0, 0, 0, 1])
+        # An empty text still counts as one token so its weight is never zero
+        self.assertEqual(weights, [10, 10, 9, 1])
+
+    @override_settings(DREAM_CHUNKING=False)
+    def test_without_chunking_texts_are_truncated(self):
+        texts = [" ".join("x" for _ in range(23))]
+        windows, owners, weights = ai_pipeline._split_into_token_windows(WordTokenizer(), texts)
+        self.assertEqual((len(windows), len(windows[0]), owners, weights), (1, 10, [0], [10]))
+
+
+class AggregateScoresTests(SimpleTestCase):
+    windows = [
+        [{"label": "joy", "score": 0.8}, {"label": "fear", "score": 0.2}],
+        [{"label": "joy", "score": 0.2}, {"label": "fear", "score": 0.6}],
+    ]
+
+    def test_mean_is_weighted_by_window_tokens(self):
+        combined = ai_pipeline._aggregate_scores(self.windows, [3, 1], "mean")
+        self.assertAlmostEqual(combined["joy"], (0.8 * 3 + 0.2) / 4)
+        self.assertAlmostEqual(combined["fear"], (0.2 * 3 + 0.6) / 4)
+
+    def test_max_takes_each_label_peak(self):
+        self.assertEqual(ai_pipeline._aggregate_scores(self.windows, [3, 1], "max"), {"joy": 0.8, "fear": 0.6})
+
+    def test_single_window_is_passed_through(self):
+        self.assertEqual(ai_pipeline._aggregate_scores(self.windows[:1], [7], "mean"), {"joy": 0.8, "fear": 0.2})
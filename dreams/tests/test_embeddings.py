@@ -0,0 +1,77 @@
+import shutil
+import tempfile
+from pathlib import Path
+import numpy as np
+from django.test import SimpleTestCase
+from dreams import embeddings
+
+
+class EmbeddingIndexTests(SimpleTestCase):
+    dim = 16
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, True)
+        # The writers' lock file goes next to the index directory
+        self.directory = Path(root) / "index"
+        rng = np.random.default_rng(3)
+        # Clustered like real embeddings, so the IVF lists have something to find
+        centers = rng.normal(size=(20, self.dim))
+        self.vectors = embeddings.normalize(
+            centers[rng.integers(0, len(centers), 2000)] + rng.normal(scale=0.3, size=(2000, self.dim))
+        )
+        self.queries = embeddings.normalize(centers + rng.normal(scale=0.3, size=centers.shape))
+        self.ids = np.arange(1, len(self.vectors) + 1)
+        self.users = self.ids % 3
+        embeddings.append(zip(self.ids.tolist(), self.users.tolist(), self.vectors), self.directory)
+
+    def brute_force(self, query, k, mask=None):
+        scores = self.vectors @ query
+        candidates = np.flatnonzero(mask if mask is not None else np.ones(len(scores), dtype=bool))
+        top = candidates[np.argsort(-scores[candidates], kind="stable")[:k]]
+        return self.ids[top], scores[top]
+
+    def test_exact_search_matches_brute_force(self):
+        index = embeddings.EmbeddingIndex(self.directory)
+        for query in self.queries[:5]:
+            dream_ids, scores = index.search(query, k=10)
+            expected_ids, expected_scores = self.brute_force(query, 10)
+            np.testing.assert_array_equal(dream_ids, expected_ids)
+            np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+    def test_user_scope_and_exclusions(self):
+        index = embeddings.EmbeddingIndex(self.directory)
+        query = self.queries[0]
+        expected_ids, _ = self.brute_force(query, 6, self.users == 2)
+        dream_ids, _ = index.search(query, k=5, user_id=2, exclude=[expected_ids[0]])
+        np.testing.assert_array_equal(dream_ids, expected_ids[1:])
+
+    def test_latest_row_of_a_dream_wins(self):
+        index = embeddings.EmbeddingIndex(self.directory)
+        query = self.queries[0]
+        best = self.brute_force(query, 1)[0][0]
+        embeddings.append([(int(best), 0, -query)], self.directory)
+        self.assertEqual(len(index), len(self.ids))
+        self.assertNotIn(best, index.search(query, k=10)[0])
+        np.testing.assert_allclose(index.vector_for(best), -query, rtol=1e-6)
+
+    def test_ivf_recall_against_brute_force(self):
+        embeddings.compact(self.directory, lists=20)
+        index = embeddings.EmbeddingIndex(self.directory)
+        found = 0
+        for query in self.queries:
+            expected_ids, _ = self.brute_force(query, 10)
+            found += len(np.intersect1d(index.search(query, k=10, nprobe=4)[0], expected_ids))
+        self.assertGreaterEqual(found / (10 * len(self.queries)), 0.9)
+        # Probing every list is exhaustive
+        for query in self.queries[:5]:
+            np.testing.assert_array_equal(index.search(query, k=10, nprobe=20)[0], self.brute_force(query, 10)[0])
+
+    def test_rows_appended_after_a_rebuild_are_searched(self):
+        embeddings.compact(self.directory, lists=20)
+        index = embeddings.EmbeddingIndex(self.directory)
+        query = self.queries[0]
+        embeddings.append([(99999, 1, query)], self.directory)
+        dream_ids, scores = index.search(query, k=1, nprobe=1)
+        self.assertEqual(dream_ids.tolist(), [99999])
+        self.assertAlmostEqual(float(scores[0]), 1.0, places=5)
@@ -0,0 +1,60 @@
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from dreams import emotion_vectors
+from dreams.models import DreamNarration
+from . import analysis_result
+
+
+class EmotionVectorTests(TestCase):
+    scores = {"joy": 0.5, "anger": 0.25, "fear": 0.125}
+
+    def test_pack_round_trip(self):
+        label_set, blob = emotion_vectors.pack(self.scores)
+        self.assertEqual(label_set.labels, ["anger", "fear", "joy"])
+        self.assertEqual(label_set.dtype, "float16")
+        self.assertEqual(len(blob), 3 * 2)
+        self.assertEqual(emotion_vectors.as_dict(blob, label_set), self.scores)
+
+    def test_float16_precision(self):
+        scores = {"joy": 0.123456, "fear": 0.987654}
+        label_set, blob = emotion_vectors.pack(scores)
+        for label, value in emotion_vectors.as_dict(blob, label_set).items():
+            self.assertAlmostEqual(value, scores[label], places=3)
+
+    @override_settings(DREAM_EMOTION_VECTOR_DTYPE="float32")
+    def test_float32(self):
+        scores = {"joy": 0.123456, "fear": 0.987654}
+        label_set, blob = emotion_vectors.pack(scores)
+        self.assertEqual(len(blob), 2 * 4)
+        np.testing.assert_allclose(emotion_vectors.unpack(blob, label_set), [0.987654, 0.123456], rtol=1e-6)
+
+    @override_settings(DREAM_EMOTION_VECTOR_DTYPE="float8")
+    def test_unknown_dtype(self):
+        with self.assertRaises(ValueError):
+            emotion_vectors.pack(self.scores)
+
+    def test_same_labels_share_a_label_set(self):
+        first, _ = emotion_vectors.pack(self.scores)
+        second, _ = emotion_vectors.pack({label: 0.0 for label in self.scores})
+        self.assertEqual(first.id, second.id)
+
+    def test_stack_aligns_label_sets(self):
+        user = User.objects.create(username="stacker")
+        dreams = []
+        for scores in (self.scores, {"joy": 0.75, "surprise": 0.5}, None):
+            dream = DreamNarration(user=user, dream_text="text")
+            if scores:
+                dream.emotion_labels, dream.emotion_vector = emotion_vectors.pack(scores)
+            dreams.append(dream)
+        labels, matrix = emotion_vectors.stack(dreams, ["joy", "fear", "surprise"])
+        self.assertEqual(labels, ["joy", "fear", "surprise"])
+        np.testing.assert_array_equal(matrix, [[0.5, 0.125, 0.0], [0.75, 0.0, 0.5], [0.0, 0.0, 0.0]])
+
+    def test_saved_dream_decodes_its_scores(self):
+        user = User.objects.create(username="decoder")
+        dream = DreamNarration(user=user, dream_text="I flew over the sea.")
+        dream.save(analysis=analysis_result("joy"))
+        dream = DreamNarration.objects.get(pk=dream.pk)
+        self.assertEqual(dream.primary_emotion, "joy")
+        self.assertAlmostEqual(dream.emotion_scores()["joy"], 0.9, places=3)
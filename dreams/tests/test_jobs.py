@@ -0,0 +1,79 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from dreams import jobs
+from dreams.models import AnalysisJob, DreamNarration, UserDreamStats, record_changes
+from . import analysis_result
+
+
+class ClaimJobsTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="sleeper")
+        self.dreams = [DreamNarration(user=user, dream_text=f"dream {i}", risk_level="Pending") for i in range(4)]
+        DreamNarration.objects.bulk_create(self.dreams)
+        jobs.enqueue_analysis_bulk(self.dreams)
+
+    def test_claims_are_marked_running(self):
+        claimed = jobs.claim_jobs(3)
+        self.assertEqual(len(claimed), 3)
+        self.assertTrue(all(job.status == AnalysisJob.RUNNING and job.attempts == 1 for job in claimed))
+        self.assertEqual(len({job.worker for job in claimed}), 1)
+        self.assertEqual([job.id for job in jobs.claim_jobs(3)], [AnalysisJob.objects.order_by("id").last().id])
+        self.assertEqual(jobs.claim_jobs(3), [])
+
+    def test_concurrent_claim_gets_no_job_twice(self):
+        # A second worker claims the same candidates between the first worker's
+        # SELECT and its conditional UPDATE
+        real_now = timezone.now
+        competing = []
+
+        def now():
+            if not competing:
+                # Marked first: the competing claim_jobs() calls now() too
+                competing.append(None)
+                competing[0] = jobs.claim_jobs(2)
+            return real_now()
+
+        with mock.patch.object(jobs.timezone, "now", side_effect=now):
+            first = jobs.claim_jobs(4)
+        second = competing[0]
+        self.assertEqual(len(second), 2)
+        self.assertEqual(len(first), 2)
+        self.assertFalse({job.id for job in first} & {job.id for job in second})
+
+    def test_filters_by_kind(self):
+        AnalysisJob.objects.create(dream=self.dreams[0], kind=AnalysisJob.TRANSCRIBE)
+        claimed = jobs.claim_jobs(10, kind=AnalysisJob.TRANSCRIBE)
+        self.assertEqual([job.kind for job in claimed], [AnalysisJob.TRANSCRIBE])
+
+
+class ProcessJobsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="worker")
+        self.dreams = [DreamNarration(user=self.user, dream_text=f"dream {i}", risk_level="Pending") for i in range(2)]
+        DreamNarration.objects.bulk_create(self.dreams)
+        record_changes(self.dreams)
+
+    def analyze(self, texts):
+        return [analysis_result("joy", "High") for _ in texts]
+
+    def test_dream_with_two_jobs_in_a_batch_is_counted_once(self):
+        jobs.enqueue_analysis_bulk([self.dreams[0], self.dreams[0], self.dreams[1]])
+        with mock.patch.object(jobs, "analyze_dreams", side_effect=self.analyze) as analyze:
+            self.assertEqual(jobs.process_jobs(jobs.claim_jobs(10)), (3, 0))
+        self.assertEqual(len(analyze.call_args.args[0]), 2)
+        stats = UserDreamStats.objects.get(user=self.user)
+        self.assertEqual((stats.total_dreams, stats.lucid_dreams, stats.nightmare_count), (2, 2, 2))
+        self.assertEqual(set(AnalysisJob.objects.values_list("status", flat=True)), {AnalysisJob.DONE})
+
+    def test_failed_analysis_is_retried_then_marked_failed(self):
+        jobs.enqueue_analysis(self.dreams[0])
+        error = {**analysis_result(risk_level="Unknown"), "error": "boom"}
+        with mock.patch.object(jobs, "analyze_dreams", return_value=[error]):
+            for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+                self.assertEqual(jobs.process_jobs(jobs.claim_jobs(10)), (0, 1))
+                job = AnalysisJob.objects.get()
+                expected = AnalysisJob.FAILED if attempt == jobs.MAX_ATTEMPTS else AnalysisJob.PENDING
+                self.assertEqual((job.attempts, job.status), (attempt, expected))
+        self.assertEqual(DreamNarration.objects.get(pk=self.dreams[0].pk).risk_level, "Unknown")
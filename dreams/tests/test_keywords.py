@@ -0,0 +1,43 @@
+import time
+from django.test import TestCase, override_settings
+from dreams import keywords
+from dreams.models import KeywordDocumentFrequency
+
+
+class KeywordTests(TestCase):
+    text = "The house, the house and the dragon. A dragon in the house!"
+
+    def setUp(self):
+        self.saved = keywords._df_snapshot, keywords._df_loaded_at
+        self.addCleanup(self.restore)
+
+    def restore(self):
+        keywords._df_snapshot, keywords._df_loaded_at = self.saved
+
+    def use_frequencies(self, frequencies, total):
+        # The table is read on a separate thread, which can't see this test's transaction
+        keywords._df_snapshot = frequencies, total
+        keywords._df_loaded_at = time.monotonic()
+
+    def test_rare_terms_outrank_common_ones(self):
+        self.use_frequencies({"house": 90, "dragon": 1}, 100)
+        self.assertEqual(keywords.extract_keywords(self.text), ["dragon", "house"])
+
+    @override_settings(DREAM_KEYWORD_SCORING="count")
+    def test_count_scoring_ignores_the_table(self):
+        self.use_frequencies({"house": 90, "dragon": 1}, 100)
+        self.assertEqual(keywords.extract_keywords(self.text), ["house", "dragon"])
+
+    def test_plain_counts_until_the_table_has_data(self):
+        self.use_frequencies({}, 0)
+        self.assertEqual(keywords.extract_keywords(self.text), ["house", "dragon"])
+
+    def test_ties_keep_first_appearance(self):
+        self.use_frequencies({"house": 5, "dragon": 5}, 10)
+        self.assertEqual(keywords.extract_keywords("dragon house house dragon"), ["dragon", "house"])
+
+    def test_observed_documents_are_counted_once_each(self):
+        keywords.observe_documents(["house house dragon", "house", "it was over, and then"])
+        keywords.observe_documents(["dragon"])
+        counts = dict(KeywordDocumentFrequency.objects.values_list("term", "document_count"))
+        self.assertEqual(counts, {keywords.TOTAL_TERM: 4, "house": 2, "dragon": 2})
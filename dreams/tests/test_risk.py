@@ -0,0 +1,98 @@
+from io import StringIO
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+from dreams.models import DreamNarration
+from dreams.risk import RISK_RULES, RISK_THRESHOLDS, RiskModel, get_risk_model
+from . import analysis_result
+
+
+class RiskOnlyReanalysisTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username="sleeper")
+        self.scored = DreamNarration(user=user, dream_text="a chase through the woods")
+        self.scored.apply_analysis({**analysis_result("fear", "Low"), "analysis_json": {"model_version": "old"}})
+        self.unscored = DreamNarration(user=user, dream_text="nothing came back")
+        self.unscored.apply_analysis({**analysis_result(), "emotion_summary": {}})
+        for dream in (self.scored, self.unscored):
+            dream.save(analyze=False)
+
+    def reanalyze(self):
+        out = StringIO()
+        call_command("reanalyze_dreams", "--risk-only", "--outdated", stdout=out)
+        return out.getvalue()
+
+    def test_rescores_risk_without_touching_the_model_version(self):
+        self.assertIn("1 updated, 0 failed, 1 skipped", self.reanalyze())
+        dream = DreamNarration.objects.get(pk=self.scored.pk)
+        self.assertEqual(dream.risk_level, "High")
+        self.assertEqual(dream.analysis_json["risk_version"], get_risk_model().fingerprint)
+        self.assertEqual(dream.analysis_json["model_version"], "old")
+        # Already scored with the current rules, so only the unscorable dream is left
+        self.assertIn("0 updated, 0 failed, 1 skipped", self.reanalyze())
+
+
+def classify_one(emo_scores, rules, thresholds):
+    """The per-rule loop analyze_dream() used before the rules became a matrix."""
+    risks = {}
+    for cond, weights in rules.items():
+        score = 0.0
+        for emo, w in weights.items():
+            score += emo_scores.get(emo, 0.0) * w
+        risks[cond] = round(score, 4)
+    top_condition = max(risks.items(), key=lambda kv: kv[1])[0]
+    top_score = risks[top_condition]
+    if top_score >= thresholds["high"]: risk_level = "High"
+    elif top_score >= thresholds["moderate"]: risk_level = "Moderate"
+    else: risk_level = "Low"
+    potential_condition = top_condition if top_score > thresholds["condition"] else "None"
+    return {
+        "risk_scores_by_condition": risks,
+        "top_condition_details": {"name": top_condition, "score": top_score},
+        "risk_level": risk_level,
+        "potential_condition": potential_condition,
+    }
+
+
+class RiskModelTests(SimpleTestCase):
+    def setUp(self):
+        # The emotion model's label order differs from the order the rules name them in
+        self.model = RiskModel(RISK_RULES, RISK_THRESHOLDS, labels=["joy", "neutral", "sadness", "fear", "love"])
+
+    def assert_matches_loop(self, emotion_dicts):
+        expected = [classify_one(scores, RISK_RULES, RISK_THRESHOLDS) for scores in emotion_dicts]
+        self.assertEqual(self.model.classify(emotion_dicts), expected)
+
+    def test_matches_the_per_rule_loop(self):
+        rng = np.random.default_rng(7)
+        labels = self.model.labels + ["unknown"]
+        emotion_dicts = [
+            {label: float(score) for label, score in zip(labels, rng.random(len(labels))) if score > 0.3}
+            for _ in range(200)
+        ]
+        self.assert_matches_loop(emotion_dicts)
+
+    def test_threshold_edges(self):
+        edges = [
+            {"sadness": 0.5 / 0.7},   # Depression exactly at "high"
+            {"fear": 0.5 / 0.7},      # Anxiety exactly at "high"
+            {"sadness": 0.25 / 0.7},  # exactly at "moderate" and "condition"
+            {"sadness": 0.2499 / 0.7},
+            {"fear": 0.2501 / 0.7},
+            {},                       # all scores tie at zero
+            {"sadness": 0.5, "fear": 0.5},
+        ]
+        self.assert_matches_loop(edges)
+        self.assertEqual(
+            [(r["risk_level"], r["potential_condition"]) for r in self.model.classify(edges[:4])],
+            [("High", "Depression"), ("High", "Anxiety"), ("Moderate", "None"), ("Low", "None")],
+        )
+
+    def test_thresholds_can_be_overridden_per_call(self):
+        scores = [{"sadness": 0.25 / 0.7}]
+        thresholds = {**RISK_THRESHOLDS, "moderate": 0.3, "condition": 0.2}
+        self.assertEqual(
+            self.model.classify(scores, {"moderate": 0.3, "condition": 0.2}),
+            [classify_one(scores[0], RISK_RULES, thresholds)],
+        )
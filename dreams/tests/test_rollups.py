@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from dreams import rollups
+from dreams.models import DreamNarration, DreamRollup
+from . import analysis_result
+
+
+class RollupTests(TestCase):
+    def test_rollups_match_a_rebuild(self):
+        user = User.objects.create(username="dreamer")
+        for emotion, risk_level in (("joy", "High"), ("fear", "Low"), ("joy", "Low")):
+            DreamNarration(user=user, dream_text=f"{emotion} {risk_level}").save(
+                analysis=analysis_result(emotion, risk_level),
+            )
+        DreamNarration.objects.filter(primary_emotion="fear").get().delete()
+
+        def snapshot():
+            return sorted(
+                (row.period, row.period_start, row.user_id or 0, row.dream_count, row.risk_counts, row.emotion_counts)
+                for row in DreamRollup.objects.all()
+            )
+        incremental = snapshot()
+        rollups.rebuild()
+        self.assertEqual(snapshot(), incremental)
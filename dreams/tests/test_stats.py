@@ -0,0 +1,37 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from dreams.models import DreamNarration, UserDreamStats
+from . import analysis_result
+
+
+class StatsDeltaTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username="dreamer")
+
+    def stats(self):
+        row = UserDreamStats.for_user(self.user)
+        return row.total_dreams, row.lucid_dreams, row.nightmare_count
+
+    def test_save_update_and_delete_apply_deltas(self):
+        dream = DreamNarration(user=self.user, dream_text="I flew over the sea.")
+        dream.save(analysis=analysis_result("joy", "High"))
+        self.assertEqual(self.stats(), (1, 1, 1))
+
+        other = DreamNarration(user=self.user, dream_text="A quiet walk.")
+        other.save(analysis=analysis_result("sadness", "Low"))
+        self.assertEqual(self.stats(), (2, 1, 1))
+
+        dream = DreamNarration.objects.get(pk=dream.pk)
+        dream.save(analysis=analysis_result("fear", "Low"))
+        self.assertEqual(self.stats(), (2, 0, 0))
+
+        dream.delete()
+        self.assertEqual(self.stats(), (1, 0, 0))
+
+    def test_unchanged_save_applies_nothing(self):
+        dream = DreamNarration(user=self.user, dream_text="I flew over the sea.")
+        dream.save(analysis=analysis_result("joy"))
+        with mock.patch.object(UserDreamStats, "apply_changes") as apply_changes:
+            DreamNarration.objects.get(pk=dream.pk).save(analyze=False)
+        apply_changes.assert_not_called()
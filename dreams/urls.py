@@ -1,13 +1,30 @@
 # dreams/urls.py
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
 
 # The app_name is essential for namespacing
 app_name = 'dreams'
 
+# The async views replace these under ASGI (DREAM_ASYNC_VIEWS)
+if settings.DREAM_ASYNC_VIEWS:
+    dashboard_view, add_dream_view, dream_results_view = (
+        views.adashboard_view, views.aadd_dream_view, views.adream_results_view
+    )
+else:
+    dashboard_view, add_dream_view, dream_results_view = (
+        views.dashboard_view, views.add_dream_view, views.dream_results_view
+    )
+
 urlpatterns = [
-    path('', views.dashboard_view, name='dreams_index'),  # Add this line
-    path('dashboard/', views.dashboard_view, name='dashboard'),
-    path('add/', views.add_dream_view, name='add_dream'),
-    path('results/<int:dream_id>/', views.dream_results_view, name='dream_results'),
+    path('', dashboard_view, name='dreams_index'),  # Add this line
+    path('dashboard/', dashboard_view, name='dashboard'),
+    path('add/', add_dream_view, name='add_dream'),
+    path('add/audio/', views.add_dream_audio_view, name='add_dream_audio'),
+    path('results/<int:dream_id>/', dream_results_view, name='dream_results'),
+    path('results/<int:dream_id>/status/', views.dream_status_view, name='dream_status'),
+    path('results/<int:dream_id>/similar/', views.similar_dreams_view, name='similar_dreams'),
+    path('metrics/', views.metrics_view, name='metrics'),
+    path('api/dreams/bulk/', api.bulk_ingest_view, name='api_bulk_ingest'),
+    path('api/batches/<int:batch_id>/', api.ingest_batch_view, name='api_ingest_batch'),
 ]
\ No newline at end of file
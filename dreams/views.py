@@ -1,11 +1,24 @@
 # dreams/views.py
 
-from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.shortcuts import render, redirect, aget_object_or_404, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from asgiref.sync import sync_to_async
 from .forms import DreamForm, DreamAudioForm
-from .models import DreamNarration
-from .ai_pipeline import analyze_dream
+from .models import AnalysisJob, DreamAudio, DreamNarration, UserDreamStats
+from .rollups import atrend, trend
+from .ai_pipeline import aanalyze_dream, analyze_dream
+from . import embeddings, metrics
+from .jobs import (
+    enqueue_analysis, enqueue_transcription, active_job_for, queue_position, transcription_progress,
+    aactive_job_for, aenqueue_analysis, aqueue_position,
+)
+import asyncio
 import json
+import weakref
 
 @login_required
 def home(request):
@@ -16,22 +29,18 @@ def dashboard_view(request):
     """
     Displays a dashboard with correctly calculated statistics about the user's dreams.
     """
-    user_dreams = DreamNarration.objects.filter(user=request.user)
-
-    # Total dreams
-    total_dreams_count = user_dreams.count()
-
-    # Lucid dreams (define as emotion == 'Joy')
-    lucid_dreams_count = user_dreams.filter(emotion__iexact='Joy').count()
-
-    # Nightmares (define as risk_level == 'High')
-    nightmare_count = user_dreams.filter(risk_level__iexact='High').count()
+    # Counters are kept up to date as dreams are analyzed, so this is a single-row read
+    stats = UserDreamStats.for_user(request.user)
 
     context = {
-        'total_dreams': total_dreams_count,
-        'lucid_dreams': lucid_dreams_count,
-        'nightmare_count': nightmare_count,
-        'dreams': user_dreams.order_by('-created_at')[:10],  # Show 10 most recent dreams
+        'total_dreams': stats.total_dreams,
+        # Lucid dreams: primary emotion is joy; nightmares: risk level High
+        'lucid_dreams': stats.lucid_dreams,
+        'nightmare_count': stats.nightmare_count,
+        # Served by the (user, created_at) index
+        'dreams': DreamNarration.objects.filter(user=request.user).order_by('-created_at')[:10],  # Show 10 most recent dreams
+        # Last 8 weeks from the user's weekly rollups
+        'weekly_trend': trend(user=request.user, limit=8),
     }
     return render(request, 'dreams/dashboard.html', context)
 
@@ -46,21 +55,19 @@ def add_dream_view(request):
             dream = form.save(commit=False)
             dream.user = request.user
 
-            analysis_output = analyze_dream(dream.dream_text)
-
-            # Get the dictionary of emotion scores and find the primary emotion
-            emotion_summary = analysis_output.get("emotion_summary", {})
-            primary_emotion = "N/A"
-            if isinstance(emotion_summary, dict) and emotion_summary:
-                primary_emotion = max(emotion_summary, key=emotion_summary.get)
+            if settings.DREAM_ANALYSIS_ASYNC:
+                # Hand the dream to the background worker; the results page polls for it
+                dream.risk_level = "Pending"
+                dream.save(analyze=False)
+                enqueue_analysis(dream)
+                return redirect('dreams:dream_results', dream_id=dream.id)
 
-            dream.sentiment = analysis_output.get("sentiment_label", "N/A")
-            dream.emotion = primary_emotion.capitalize()
-            dream.potential_condition = analysis_output.get("potential_condition", "N/A")
-            dream.risk_level = analysis_output.get("risk_level", "N/A")
-            dream.analysis_json = analysis_output.get("analysis_json", {})
+            analysis_output = analyze_dream(dream.dream_text)
+            dream.apply_analysis(analysis_output)
 
-            dream.save()
+            # The analysis is already attached, so save() must not run the models again
+            with metrics.timed("db_write"):
+                dream.save(analyze=False)
             return redirect('dreams:dream_results', dream_id=dream.id)
     else:
         form = DreamForm()
@@ -74,8 +81,17 @@ def add_dream_audio_view(request):
     if request.method == 'POST':
         form = DreamAudioForm(request.POST, request.FILES)
         if form.is_valid():
-            dream_text = f"Audio file uploaded: {request.FILES['audio_file'].name}. Transcription pending."
-            dream = DreamNarration.objects.create(user=request.user, dream_text=dream_text, risk_level="Pending")
+            upload = request.FILES['audio_file']
+            dream = DreamNarration(
+                user=request.user,
+                dream_text=f"Audio file uploaded: {upload.name}. Transcription pending.",
+                risk_level="Pending",
+            )
+            dream.save(analyze=False)
+            # The storage backend copies the upload to MEDIA_ROOT chunk by chunk;
+            # decoding and transcription happen in the analysis worker
+            recording = DreamAudio.objects.create(dream=dream, file=upload)
+            enqueue_transcription(recording)
             return redirect('dreams:dream_results', dream_id=dream.id)
     else:
         form = DreamAudioForm()
@@ -87,18 +103,189 @@ def dream_results_view(request, dream_id):
     Displays the full analysis results for a specific dream.
     """
     dream = get_object_or_404(DreamNarration, id=dream_id, user=request.user)
+    job = active_job_for(dream)
+    context = {
+        'dream': dream,
+        'pretty_json': _pretty_analysis(dream),
+        'job': job,
+        'queue_position': queue_position(job) if job else 0,
+        'partial': _partial_results(dream, job),
+        'similar_enabled': embeddings.enabled(),
+    }
+    return render(request, 'dreams/dream_results.html', context)
 
-    pretty_json = ""
-    if dream.analysis_json:
-        try:
-            json_data = dream.analysis_json if isinstance(dream.analysis_json, dict) else json.loads(str(dream.analysis_json))
-            pretty_json = json.dumps(json_data, indent=4)
-        except (TypeError, json.JSONDecodeError):
-            pretty_json = str(dream.analysis_json)
+@login_required
+def dream_status_view(request, dream_id):
+    """
+    Lightweight JSON endpoint polled by the results page while analysis is queued.
+    For recordings it also carries the partial transcript and emotion scores of
+    the segments finished so far.
+    """
+    dream = get_object_or_404(DreamNarration.objects.only('id', 'user_id', 'risk_level'), id=dream_id, user=request.user)
+    job = active_job_for(dream)
+    return JsonResponse({
+        'dream_id': dream.id,
+        'status': job.status if job else 'done',
+        'stage': job.kind if job else None,
+        'queue_position': queue_position(job) if job else 0,
+        'risk_level': dream.risk_level,
+        'partial': _partial_results(dream, job),
+    })
+
+@login_required
+def similar_dreams_view(request, dream_id):
+    """
+    JSON list of the dreams most similar to this one by embedding (see
+    dreams/embeddings.py). Users search their own dreams; staff can pass
+    ?scope=all to search everyone's.
+    """
+    if not embeddings.enabled():
+        raise Http404
+    dream = get_object_or_404(DreamNarration.objects.only('id', 'user_id'), id=dream_id, user=request.user)
+    scope = 'all' if request.GET.get('scope') == 'all' and request.user.is_staff else 'user'
+    try:
+        k = min(max(int(request.GET.get('k', 5)), 1), 50)
+    except ValueError:
+        k = 5
+    with metrics.timed("similarity_search"):
+        # Over-fetch: deleted dreams keep their index rows until the next rebuild
+        matches = embeddings.similar_dreams(dream, k * 2, scope)
+    if matches is None:
+        return JsonResponse({'dream_id': dream.id, 'scope': scope, 'indexed': False, 'results': []})
+    found = DreamNarration.objects.only('id', 'user_id', 'dream_text', 'primary_emotion', 'created_at').in_bulk(
+        [dream_id for dream_id, _ in matches]
+    )
+    results = []
+    for match_id, score in matches:
+        match = found.get(match_id)
+        if match is None:
+            continue
+        results.append({
+            'dream_id': match.id,
+            'score': score,
+            'created_at': match.created_at.isoformat(),
+            'primary_emotion': match.primary_emotion,
+            'excerpt': match.dream_text[:200],
+            'url': reverse('dreams:dream_results', args=[match.id]) if match.user_id == request.user.id else None,
+        })
+        if len(results) == k:
+            break
+    return JsonResponse({'dream_id': dream.id, 'scope': scope, 'indexed': True, 'results': results})
+
+def _pretty_analysis(dream):
+    """analysis_json with the emotion scores, indented for the results page."""
+    if not dream.analysis_json:
+        return ""
+    try:
+        json_data = dream.analysis_json if isinstance(dream.analysis_json, dict) else json.loads(str(dream.analysis_json))
+        scores = dream.emotion_scores()
+        if scores:
+            # Stored packed rather than in analysis_json; shown alongside it
+            json_data = {**json_data, "emotion_scores": scores}
+        return json.dumps(json_data, indent=4)
+    except (TypeError, json.JSONDecodeError):
+        return str(dream.analysis_json)
 
+def _partial_results(dream, job):
+    """Progress of a recording that is still being transcribed or analyzed, else None."""
+    if job is None:
+        return None
+    recording = DreamAudio.objects.filter(dream=dream).first()
+    return transcription_progress(recording) if recording else None
+
+# --- Async Views ---
+# Served instead of the views above when DREAM_ASYNC_VIEWS is on (dream_analyzer/asgi.py
+# turns it on). Inference goes through aanalyze_dream(), which runs the models on a
+# bounded thread pool and coalesces concurrent requests into shared forward passes.
+
+_write_limits = weakref.WeakKeyDictionary()
+
+def _write_limit():
+    """
+    Caps the dream saves in flight on this event loop at DREAM_ASYNC_DB_WRITERS.
+    Each ASGI request runs its sync ORM code on its own thread and connection, so
+    without a cap every waiting request contends for SQLite's single write lock.
+    """
+    loop = asyncio.get_running_loop()
+    limit = _write_limits.get(loop)
+    if limit is None:
+        limit = _write_limits[loop] = asyncio.Semaphore(max(1, settings.DREAM_ASYNC_DB_WRITERS))
+    return limit
+
+def _save_analyzed(dream, analysis_output):
+    dream.apply_analysis(analysis_output)
+    # The analysis is already attached, so save() must not run the models again
+    with metrics.timed("db_write"):
+        dream.save(analyze=False)
+
+@login_required
+async def adashboard_view(request):
+    """dashboard_view on the async ORM."""
+    user = await request.auser()
+    stats = await UserDreamStats.afor_user(user)
+    context = {
+        'total_dreams': stats.total_dreams,
+        'lucid_dreams': stats.lucid_dreams,
+        'nightmare_count': stats.nightmare_count,
+        'dreams': [dream async for dream in DreamNarration.objects.filter(user=user).order_by('-created_at')[:10]],
+        'weekly_trend': await atrend(user=user, limit=8),
+    }
+    return render(request, 'dreams/dashboard.html', context)
+
+@login_required
+async def aadd_dream_view(request):
+    """add_dream_view without blocking the event loop on the models."""
+    if request.method == 'POST':
+        form = DreamForm(request.POST)
+        if form.is_valid():
+            dream = form.save(commit=False)
+            dream.user = await request.auser()
+
+            if settings.DREAM_ANALYSIS_ASYNC:
+                dream.risk_level = "Pending"
+                async with _write_limit():
+                    # Model.asave() does not pass on save()'s analyze flag
+                    await sync_to_async(dream.save)(analyze=False)
+                    await aenqueue_analysis(dream)
+                return redirect('dreams:dream_results', dream_id=dream.id)
+
+            analysis_output = await aanalyze_dream(dream.dream_text)
+            async with _write_limit():
+                await sync_to_async(_save_analyzed)(dream, analysis_output)
+            return redirect('dreams:dream_results', dream_id=dream.id)
+    else:
+        form = DreamForm()
+    return render(request, 'dreams/add_dream.html', {'form': form})
+
+@login_required
+async def adream_results_view(request, dream_id):
+    """dream_results_view on the async ORM."""
+    dream = await aget_object_or_404(DreamNarration, id=dream_id, user=await request.auser())
+    job = await aactive_job_for(dream)
+    partial = None
+    if job is not None:
+        recording = await DreamAudio.objects.filter(dream=dream).afirst()
+        partial = await sync_to_async(transcription_progress)(recording) if recording else None
     context = {
         'dream': dream,
-        'pretty_json': pretty_json
+        # Decoding the emotion scores may load their EmotionLabelSet
+        'pretty_json': await sync_to_async(_pretty_analysis)(dream),
+        'job': job,
+        'queue_position': await aqueue_position(job) if job else 0,
+        'partial': partial,
+        'similar_enabled': embeddings.enabled(),
     }
     return render(request, 'dreams/dream_results.html', context)
 
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint for this process (see dreams/metrics.py). Disabled
+    unless DREAM_METRICS_ENABLED; with DREAM_METRICS_TOKEN set, scrapers must send
+    it as a bearer token.
+    """
+    if not getattr(settings, "DREAM_METRICS_ENABLED", False):
+        raise Http404
+    token = getattr(settings, "DREAM_METRICS_TOKEN", "")
+    if token and not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,78 @@
+# gunicorn.conf.py
+# Picked up automatically when gunicorn is started from the project root.
+#
+# Two ways to run the models:
+#   DREAM_PRELOAD_MODELS=0 (default)  each worker loads its own copy (lazily, or
+#                                      during warmup below)
+#   DREAM_PRELOAD_MODELS=1            the master loads them once before forking and
+#                                      workers share the weights copy-on-write
+#
+# DREAM_ASGI=1 serves dream_analyzer.asgi with uvicorn workers instead of the sync
+# WSGI workers: one event loop per worker runs the async views, and inference is
+# coalesced across concurrent requests on a bounded thread pool.
+
+import os
+
+DREAM_ASGI = os.environ.get("DREAM_ASGI", "0") == "1"
+wsgi_app = "dream_analyzer.asgi:application" if DREAM_ASGI else "dream_analyzer.wsgi:application"
+if DREAM_ASGI:
+    worker_class = "uvicorn_worker.UvicornWorker"
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+# Loading the models during warmup can take a while on a cold disk
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+# Split the cores between workers unless a per-process thread count is given.
+# Set before the app (and so settings.py) is imported, in the master or a worker.
+os.environ.setdefault("DREAM_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // workers)))
+
+DREAM_PRELOAD_MODELS = os.environ.get("DREAM_PRELOAD_MODELS", "0") == "1"
+preload_app = DREAM_PRELOAD_MODELS
+
+# Warm each worker before it accepts traffic ("0" leaves loading to the first request).
+# The models are only loaded when the workers analyze dreams inline
+# (DREAM_ANALYSIS_ASYNC=0); otherwise run_analysis_worker holds the only copy.
+DREAM_WARMUP = os.environ.get("DREAM_WARMUP", "1") == "1"
+DREAM_WARMUP_WHISPER = os.environ.get("DREAM_WARMUP_WHISPER", "0") == "1"
+
+
+def when_ready(server):
+    """Runs in the master after the app is preloaded and before any worker is forked."""
+    if not DREAM_PRELOAD_MODELS:
+        return
+    from dreams import ai_pipeline
+
+    if ai_pipeline.preload():
+        server.log.info("AI models preloaded in the master; workers will share them.")
+    else:
+        server.log.warning("AI models were not preloaded; workers load their own copies.")
+
+
+def post_fork(server, worker):
+    if DREAM_PRELOAD_MODELS:
+        from dreams import ai_pipeline
+
+        ai_pipeline.after_fork()
+
+
+def post_worker_init(worker):
+    """
+    Runs in each worker after the Django app is loaded and before it accepts
+    connections (unlike post_fork, which runs before the app is imported unless
+    it was preloaded). A failed warmup is logged and the worker still starts,
+    falling back to loading the models on the first request.
+    """
+    if not DREAM_WARMUP:
+        return
+    from dreams import ai_pipeline
+
+    try:
+        timings = ai_pipeline.warmup(whisper=DREAM_WARMUP_WHISPER)
+    except Exception as e:
+        worker.log.warning("Model warmup failed in worker %s: %s", worker.pid, e)
+        return
+    worker.log.info(
+        "Worker %s warm in %.2fs (%s)", worker.pid, sum(timings.values()),
+        ", ".join(f"{step} {seconds:.2f}s" for step, seconds in timings.items()),
+    )